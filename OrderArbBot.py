@@ -26,6 +26,7 @@ from solders.pubkey import Pubkey
 from solders.message import MessageV0
 from solders.transaction import VersionedTransaction
 
+from clients.blockhash import blockhash_service
 from clients.jito import jito_client
 from clients.jupiter import jupiter_client
 from clients.rpc import connection
@@ -95,6 +96,7 @@ async def main():
     symbol2 = await Token.get_symbol(str(TARGET_MINT))
     logger.info(f'套利路线 {symbol1} => {symbol2}')
     await connection.initialize()
+    await blockhash_service.start()
     await wallet.initialize()
     await jupiter_client.initialize()
     # await jito_client.initialize()
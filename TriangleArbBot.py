@@ -13,7 +13,7 @@ Change Log  :
 import asyncio
 import os
 import traceback
-from typing import List
+from typing import List, Set
 
 from rich.console import Console
 from rich.prompt import Prompt
@@ -27,10 +27,17 @@ from solders.pubkey import Pubkey
 from solders.message import MessageV0
 from solders.transaction import VersionedTransaction
 
+from clients.account_stream import account_stream
+from clients.blockhash import blockhash_service
 from clients.jito import jito_client
 from clients.jupiter import jupiter_client
 from clients.rpc import connection
-from core.constants import JITO, BASE_MINT, TARGET_MINT
+from core.constants import JITO, BASE_MINT, TARGET_MINT, QUOTE
+from core.sizing import QuoteSizer
+from core.transaction_template import TransactionTemplate, TransactionTemplateCache, TRANSFER_LAMPORTS_OFFSET
+from core.worker import worker
+from dex.loader import dex_loader
+from dex.local_quote import local_quoter, RouteChangeFeed
 from dex.lookup_table_provider import lookup_table_provider
 from flashloan import flashloan
 from logger import logger
@@ -95,6 +102,7 @@ async def main():
     symbol2 = await Token.get_symbol(str(TARGET_MINT))
     logger.info(f'套利路线 {symbol1} => {symbol2}')
     await connection.initialize()
+    await blockhash_service.start()
     await wallet.initialize()
     await jupiter_client.initialize()
     await jito_client.initialize()
@@ -118,171 +126,201 @@ async def main():
     min_out_amount = in_amount + gas_value + flash_loan_free + min_tip_value
     logger.info(f'套利额度 {in_amount:.1f} {symbol1}')
     logger.info(f'最低输出 {min_out_amount} {symbol1}')
+    use_local_quote = False
+    route_feed = None
+    if QUOTE.LOCAL:
+        # 仅本地报价模式需要加载Pool
+        from dex.raydium import raydium
+        # 加载Pool时通过worker执行账户更新任务
+        await worker.start()
+        dex_loader.dexs.append(raydium)
+        dex_loader.bind_wallet(wallet)
+        await dex_loader.initialize()
+        # 只订阅往返路由涉及的Pool，保证本地报价使用最新的Pool状态
+        route_pools = local_quoter.route_pools(str(BASE_MINT), str(TARGET_MINT))
+        account_stream.add_handler(dex_loader.apply_account_updates)
+        await account_stream.start(account for pool in route_pools for account in pool.accounts_for_update)
+        use_local_quote = local_quoter.covers(str(BASE_MINT), str(TARGET_MINT), in_amount)
+        logger.info(f'本地报价 {"已启用" if use_local_quote else "无可用路由，使用Jupiter报价"} '
+                    f'路由Pool数:{len(route_pools)}')
+        if use_local_quote:
+            # 路由上的Pool储备变化时才重新报价
+            route_feed = RouteChangeFeed(route_pools)
+            dex_loader.add_pools_handler(route_feed.on_pools_updated)
     Prompt.ask("请确认以上信息！")
-    while True:
-        try:
-            await asyncio.sleep(1)
-            routes = []
-            i = 0
-            buy_amount = int(in_amount * utilization_rate)
-            routes.append([str(i), symbol1, str(buy_amount)])
-            buy_resp = await jupiter_client.quote(
-                input_mint=str(BASE_MINT),
-                output_mint=str(TARGET_MINT),
-                amount=in_amount,
-                slippage_bps=100,
-            )
-            sell_amount = int(buy_resp['outAmount'])
-            sell_resp = await jupiter_client.quote(
-                input_mint=str(TARGET_MINT),
-                output_mint=str(BASE_MINT),
-                amount=sell_amount,
-                slippage_bps=100,
-            )
-            _routes = [*buy_resp['routePlan'], *sell_resp['routePlan']]
-            for route in _routes:
-                i += 1
-                swap_info = route['swapInfo']
-                token = await Token.get_symbol(swap_info['outputMint'])
-                routes.append([str(i), token, swap_info['outAmount']])
-            out_amount = int(sell_resp['outAmount']) + (1 - utilization_rate) * in_amount
-            expected_profit = int(out_amount - min_out_amount)
-            extra_tip_amount = max(JITO.MIN_TIP_LAMPORTS, jupiter_client.base_mint_2_sol(
-                expected_profit * JITO.TIP_PERCENT
-            )) - JITO.MIN_TIP_LAMPORTS
-            tip_amount = JITO.MIN_TIP_LAMPORTS + extra_tip_amount
-            profit = expected_profit - jupiter_client.sol_2_base_mint(expected_profit)
-            get_swap_task = asyncio.create_task(
-                jupiter_client.multiple_swap(
+    # 闪电贷和转账步骤的账户集合固定，只编译一次，之后只改写区块哈希和数额
+    def compile_template(instructions: List[Instruction], amount_slots=()) -> TransactionTemplate:
+        return TransactionTemplate(
+            wallet.payer,
+            instructions,
+            lookup_table_provider.compute_ideal_lookup_tables_for_instructions(instructions),
+            amount_slots
+        )
+
+    step1_template = compile_template([flash_borrow_instruction])
+    step4_template = compile_template([flash_repay_instruction])
+    # 小费账户随机选取，转账步骤按小费账户缓存
+    step5_templates = TransactionTemplateCache()
+    # 闪电贷固定借入 in_amount，实际交易数额按往返报价拟合的最优值在上限内调整
+    sizer = QuoteSizer(max_amount=int(in_amount * utilization_rate), min_amount=int(in_amount * 0.1))
+    # 捆绑包状态由 bundle_tracker 统一查询，允许多个机会同时在途
+    inflight_bundles: Set[asyncio.Future] = set()
+
+    def track_bundle(bundle_id: str):
+        future = jito_client.bundle_tracker.track(bundle_id)
+        inflight_bundles.add(future)
+        future.add_done_callback(inflight_bundles.discard)
+
+    try:
+        while True:
+            try:
+                if route_feed is not None:
+                    await route_feed.wait()
+                else:
+                    await asyncio.sleep(1)
+                if len(inflight_bundles) >= JITO.MAX_INFLIGHT_BUNDLES:
+                    logger.warning(f'在途捆绑包已达上限 {JITO.MAX_INFLIGHT_BUNDLES}，跳过本次机会')
+                    continue
+                routes = []
+                i = 0
+                buy_amount = sizer.next_amount()
+                local_routes = local_quoter.quote_round_trip(str(BASE_MINT), str(TARGET_MINT), buy_amount) \
+                    if use_local_quote else None
+                if local_routes is not None:
+                    # 本地往返报价判断是否有利润，有利润时才请求Jupiter报价和交易指令
+                    local_out_amount = local_routes[1][-1].trade_output_override.estimated_out
+                    sizer.observe(buy_amount, local_out_amount)
+                    local_quoter.maybe_cross_check(str(BASE_MINT), str(TARGET_MINT), buy_amount, local_out_amount)
+                    if local_out_amount + in_amount - buy_amount <= min_out_amount:
+                        continue
+                buy_resp = await jupiter_client.quote(
+                    input_mint=str(BASE_MINT),
+                    output_mint=str(TARGET_MINT),
+                    amount=buy_amount,
+                    slippage_bps=100,
+                )
+                # 缓存的报价输入数额可能略小于请求数额，以报价为准
+                buy_amount = int(buy_resp['inAmount'])
+                routes.append([str(i), symbol1, str(buy_amount)])
+                sell_amount = int(buy_resp['outAmount'])
+                sell_resp = await jupiter_client.quote(
+                    input_mint=str(TARGET_MINT),
+                    output_mint=str(BASE_MINT),
+                    amount=sell_amount,
+                    slippage_bps=100,
+                )
+                _routes = [*buy_resp['routePlan'], *sell_resp['routePlan']]
+                for route in _routes:
+                    i += 1
+                    swap_info = route['swapInfo']
+                    token = await Token.get_symbol(swap_info['outputMint'])
+                    routes.append([str(i), token, swap_info['outAmount']])
+                if local_routes is None:
+                    sizer.observe(buy_amount, int(sell_resp['outAmount']))
+                out_amount = int(sell_resp['outAmount']) + in_amount - buy_amount
+                expected_profit = int(out_amount - min_out_amount)
+                extra_tip_amount = max(JITO.MIN_TIP_LAMPORTS, jupiter_client.base_mint_2_sol(
+                    expected_profit * JITO.TIP_PERCENT
+                )) - JITO.MIN_TIP_LAMPORTS
+                tip_amount = JITO.MIN_TIP_LAMPORTS + extra_tip_amount
+                profit = expected_profit - jupiter_client.sol_2_base_mint(expected_profit)
+                swap_resp = await jupiter_client.multiple_swap(
                     quote_responses=[buy_resp, sell_resp],
                     payer=wallet.public_key,
                     wrap_and_unwrap_sol=False
                 )
-            )
-            get_recent_block_hash_task = asyncio.create_task(
-                connection.get_recent_block_hash()
-            )
-            down_tasks, _ = await asyncio.wait([get_swap_task, get_recent_block_hash_task])
-            recent_block_hash, swap_resp = None, None
-            for task in down_tasks:
-                result = task.result()
-                if isinstance(result, Hash):
-                    recent_block_hash = result
-                else:
-                    swap_resp = result
-            [buy_instructions, sell_instructions], address_lookup_table_addresses = swap_resp
-            await lookup_table_provider.batch_update(address_lookup_table_addresses)
+                [buy_instructions, sell_instructions], address_lookup_table_addresses = swap_resp
+                # 未缓存的路由表在后台获取，本次只使用已缓存的路由表
+                lookup_table_provider.prefetch(address_lookup_table_addresses)
+                recent_block_hash = blockhash_service.blockhash
 
-            step1_instructions = [
-                flash_borrow_instruction,
-            ]
-            step2_instructions = [
-                *buy_instructions
-            ]
-            step3_instructions = [
-                *sell_instructions
-            ]
-            step4_instructions = [
-                flash_repay_instruction
-            ]
-            tip_instruction = wallet.transfer(jito_client.tip_account, tip_amount)
-            storage_amount = max(int(profit * 0.8), jupiter_client.sol_2_base_mint(tip_amount + JITO.FEES_LAMPORTS))
-            storage_instruction = wallet.transfer(storage_account, storage_amount)
-            step5_instructions = [
-                storage_instruction,
-                tip_instruction
-            ]
+                step1_instructions = [
+                    flash_borrow_instruction,
+                ]
+                step2_instructions = [
+                    *buy_instructions
+                ]
+                step3_instructions = [
+                    *sell_instructions
+                ]
+                step4_instructions = [
+                    flash_repay_instruction
+                ]
+                tip_account = jito_client.tip_account
+                storage_amount = max(int(profit * 0.8), jupiter_client.sol_2_base_mint(tip_amount + JITO.FEES_LAMPORTS))
+                step5_instructions = [
+                    wallet.transfer(storage_account, storage_amount),
+                    wallet.transfer(tip_account, tip_amount)
+                ]
+                step5_template = step5_templates.get(tip_account, lambda: compile_template(
+                    [wallet.transfer(storage_account, 0), wallet.transfer(tip_account, 0)],
+                    [(0, TRANSFER_LAMPORTS_OFFSET), (1, TRANSFER_LAMPORTS_OFFSET)]
+                ))
 
-            step1_lookup_tables = lookup_table_provider.compute_ideal_lookup_tables_for_instructions(
-                step1_instructions
-            )
-            step2_lookup_tables = lookup_table_provider.compute_ideal_lookup_tables_for_instructions(
-                step2_instructions
-            )
-            step3_lookup_tables = lookup_table_provider.compute_ideal_lookup_tables_for_instructions(
-                step3_instructions
-            )
-            step4_lookup_tables = lookup_table_provider.compute_ideal_lookup_tables_for_instructions(
-                step4_instructions
-            )
-            step5_lookup_tables = lookup_table_provider.compute_ideal_lookup_tables_for_instructions(
-                step5_instructions
-            )
+                step2_lookup_tables = lookup_table_provider.compute_ideal_lookup_tables_for_instructions(
+                    step2_instructions
+                )
+                step3_lookup_tables = lookup_table_provider.compute_ideal_lookup_tables_for_instructions(
+                    step3_instructions
+                )
 
-            step1_message = MessageV0.try_compile(
-                payer=wallet.public_key,
-                recent_blockhash=recent_block_hash,
-                instructions=step1_instructions,
-                address_lookup_table_accounts=step1_lookup_tables
-            )
-            step2_message = MessageV0.try_compile(
-                payer=wallet.public_key,
-                recent_blockhash=recent_block_hash,
-                instructions=step2_instructions,
-                address_lookup_table_accounts=step2_lookup_tables
-            )
-            step3_message = MessageV0.try_compile(
-                payer=wallet.public_key,
-                recent_blockhash=recent_block_hash,
-                instructions=step3_instructions,
-                address_lookup_table_accounts=step3_lookup_tables
-            )
-            step4_message = MessageV0.try_compile(
-                payer=wallet.public_key,
-                recent_blockhash=recent_block_hash,
-                instructions=step4_instructions,
-                address_lookup_table_accounts=step4_lookup_tables
-            )
-            step5_message = MessageV0.try_compile(
-                payer=wallet.public_key,
-                recent_blockhash=recent_block_hash,
-                instructions=step5_instructions,
-                address_lookup_table_accounts=step5_lookup_tables
-            )
+                step2_message = MessageV0.try_compile(
+                    payer=wallet.public_key,
+                    recent_blockhash=recent_block_hash,
+                    instructions=step2_instructions,
+                    address_lookup_table_accounts=step2_lookup_tables
+                )
+                step3_message = MessageV0.try_compile(
+                    payer=wallet.public_key,
+                    recent_blockhash=recent_block_hash,
+                    instructions=step3_instructions,
+                    address_lookup_table_accounts=step3_lookup_tables
+                )
 
-            step1_tx = VersionedTransaction(
-                message=step1_message,
-                keypairs=[wallet.payer]
-            )
-            step2_tx = VersionedTransaction(
-                message=step2_message,
-                keypairs=[wallet.payer]
-            )
-            step3_tx = VersionedTransaction(
-                message=step3_message,
-                keypairs=[wallet.payer]
-            )
-            step4_tx = VersionedTransaction(
-                message=step4_message,
-                keypairs=[wallet.payer]
-            )
-            step5_tx = VersionedTransaction(
-                message=step5_message,
-                keypairs=[wallet.payer]
-            )
-            simulate_instructions = [
-                *step1_instructions,
-                *step2_instructions,
-                *step3_instructions,
-                *step4_instructions,
-                *step5_instructions
-            ]
-            simulate_task = asyncio.create_task(
-                simulate_arb(simulate_instructions, wallet.payer, recent_block_hash)
-            )
-            ConsoleManager.print_table(['Step', '代币', '数额'], routes)
-            profit_amount = await Token.to_amount(str(BASE_MINT), profit)
-            logger.info(f'预计收益: {profit_amount:.6f}{symbol1} 燃油费:'
-                        f'{JITO.FEES_LAMPORTS / 10 ** 9:.6f}SOL '
-                        f'小费: {tip_amount / 10 ** 9:.6f}SOL ')
-            bundle_id = await jito_client.send_bundle(
-                [step1_tx, step2_tx, step3_tx, step4_tx, step5_tx]
-            )
-            await jito_client.wait_down(bundle_id)
+                step1_tx = step1_template.build(recent_block_hash)
+                step2_tx = VersionedTransaction(
+                    message=step2_message,
+                    keypairs=[wallet.payer]
+                )
+                step3_tx = VersionedTransaction(
+                    message=step3_message,
+                    keypairs=[wallet.payer]
+                )
+                step4_tx = step4_template.build(recent_block_hash)
+                step5_tx = step5_template.build(recent_block_hash, [storage_amount, tip_amount])
+                simulate_instructions = [
+                    *step1_instructions,
+                    *step2_instructions,
+                    *step3_instructions,
+                    *step4_instructions,
+                    *step5_instructions
+                ]
+                simulate_task = asyncio.create_task(
+                    simulate_arb(simulate_instructions, wallet.payer, recent_block_hash)
+                )
+                ConsoleManager.print_table(['Step', '代币', '数额'], routes)
+                profit_amount = await Token.to_amount(str(BASE_MINT), profit)
+                logger.info(f'预计收益: {profit_amount:.6f}{symbol1} 燃油费:'
+                            f'{JITO.FEES_LAMPORTS / 10 ** 9:.6f}SOL '
+                            f'小费: {tip_amount / 10 ** 9:.6f}SOL ')
+                bundle_id = await jito_client.send_bundle(
+                    [step1_tx, step2_tx, step3_tx, step4_tx, step5_tx]
+                )
+                track_bundle(bundle_id)
 
-        except Exception as e:
-            traceback.print_exc()
-            logger.error(e)
+            except Exception as e:
+                traceback.print_exc()
+                logger.error(e)
+    finally:
+        await local_quoter.close()
+        if QUOTE.LOCAL:
+            await account_stream.close()
+            await worker.stop()
+        await jito_client.close()
+        await jupiter_client.close()
+        await lookup_table_provider.close()
+        await blockhash_service.close()
+        await connection.close()
 
 
 asyncio.run(main())
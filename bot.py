@@ -17,30 +17,61 @@ import uvicorn
 from fastapi import FastAPI, Request
 
 from clients.rpc import connection
+from clients.account_stream import account_stream
 from clients.jito import jito_client
 from db import DB
 from clients.helius import helius_client
 from dex.raydium import raydium
 from dex.loader import dex_loader
 from core.worker import worker
+from core.constants import RPC, SHARD
+from core.webhook_queue import WebhookQueue
+from core.shard_router import ShardRouter
 from strategy import triangle_strategy as strategy
 from wallet import Wallet
 
 dex_loader.dexs.append(raydium)
 dex_loader.bind_wallet(Wallet.local())
 
+# 分片数大于1时，未指定分片序号的进程作为路由进程，只负责启动分片和转发webhook
+IS_ROUTER = SHARD.COUNT > 1 and SHARD.INDEX < 0
+IS_SHARD = SHARD.COUNT > 1 and SHARD.INDEX >= 0
+router = ShardRouter() if IS_ROUTER else None
+webhook_queue = WebhookQueue(strategy.pre_execute)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    if IS_ROUTER:
+        await connection.initialize()
+        await helius_client.initialize()
+        # 分片进程只读启动快照，由路由进程在启动分片前统一构建或校验
+        await dex_loader.prepare()
+        await router.start(__file__)
+        yield
+        await router.close()
+        await helius_client.close()
+        await connection.close()
+        return
     await DB.initialize()
     await worker.start()
     await jito_client.initialize()
     await connection.initialize()
     await helius_client.initialize()
+    if IS_SHARD:
+        dex_loader.bind_shard(SHARD.INDEX, SHARD.COUNT)
     await dex_loader.initialize()
-    await strategy.start()
+    if RPC.USE_ACCOUNT_STREAM:
+        account_stream.add_handler(dex_loader.apply_account_updates)
+        await account_stream.start(
+            account for pool in dex_loader.get_all_pools() for account in pool.accounts_for_update
+        )
+    await webhook_queue.start()
+    await strategy.start(create_webhook=not IS_SHARD)
     yield
     await strategy.stop()
+    await webhook_queue.close()
+    await account_stream.close()
     await dex_loader.close()
     await helius_client.close()
     await connection.close()
@@ -55,9 +86,27 @@ app = FastAPI(lifespan=lifespan)
 @app.post('/webhook')
 async def webhook(request: Request):
     data = await request.json()
-    await strategy.pre_execute(data)
-    # await triangle_strategy.pre_execute(data)
+    if IS_ROUTER:
+        return await router.dispatch(data)
+    # 只入队不等待处理，避免Helius等待超时重试
+    return webhook_queue.put(data)
+
+
+@app.get('/stats')
+async def stats():
+    if IS_ROUTER:
+        return router.stats()
+    return {'webhook': webhook_queue.stats(), 'worker': worker.stats()}
+
+
+@app.get('/subscription')
+async def subscription():
+    # 分片进程向路由进程报告需要监听的账户和事件
+    return {'addresses': strategy.addresses, 'event_types': [i.name for i in strategy.event_types]}
 
 
 if __name__ == '__main__':
-    uvicorn.run(app, host='0.0.0.0', port=8888, log_config=None)
+    if IS_SHARD:
+        uvicorn.run(app, host='127.0.0.1', port=SHARD.BASE_PORT + SHARD.INDEX, log_config=None)
+    else:
+        uvicorn.run(app, host='0.0.0.0', port=8888, log_config=None)
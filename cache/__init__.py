@@ -60,6 +60,18 @@ class Cache:
             else:
                 self._obj = func(*args, **kwargs)
         if self._obj:
-            with open(osp.join(temp_dir, f'{self._name}.obj'), 'wb') as file:
-                pickle.dump(self._obj, file)
+            self.write()
         return self
+
+    def write(self):
+        # 先写临时文件再替换，写入中途退出不会损坏已有缓存
+        path = osp.join(temp_dir, f'{self._name}.obj')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as file:
+                pickle.dump(self._obj, file)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if osp.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
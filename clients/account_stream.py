@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 17:10
+@Author     : lkkings
+@FileName:  : account_stream.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+from typing import List, Callable, Iterable, Dict
+
+from solana.rpc.commitment import Commitment, Processed
+from solana.rpc.websocket_api import connect, SolanaWsClientProtocol
+from solders.pubkey import Pubkey
+from solders.rpc.responses import AccountNotification
+
+from clients.rpc import connection
+from core.constants import RPC
+from core.types.dex import AccountInfoMap
+from logger import logger
+
+# 参数为同一slot的一批账户数据及该slot
+AccountHandler = Callable[[AccountInfoMap, int], None]
+
+MAX_RECONNECT_DELAY = 30
+
+
+class AccountStream:
+    """
+    基于websocket accountSubscribe的账户推送
+    账户按 WS_MAX_SUBSCRIPTIONS 分片到多个连接，每个连接断开后指数退避重连、重新订阅，
+    并用一次HTTP快照补齐断线期间错过的更新。同一事件循环轮次内收到的推送合并后交给处理函数
+    """
+
+    def __init__(self, endpoint: str = RPC.WS_HOST, max_subscriptions: int = RPC.WS_MAX_SUBSCRIPTIONS,
+                 commitment: Commitment = Processed):
+        self.endpoint = endpoint
+        self.max_subscriptions = max_subscriptions
+        self.commitment = commitment
+        self._addresses: List[str] = []
+        self._handlers: List[AccountHandler] = []
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Dict[int, AccountInfoMap] = {}
+        self._flush_scheduled = False
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def add_handler(self, handler: AccountHandler):
+        self._handlers.append(handler)
+
+    async def start(self, addresses: Iterable[str]):
+        self._addresses = sorted(set(addresses))
+        self._running = True
+        for i in range(0, len(self._addresses), self.max_subscriptions):
+            shard = [Pubkey.from_string(address) for address in self._addresses[i:i + self.max_subscriptions]]
+            self._tasks.append(asyncio.create_task(self._run_shard(len(self._tasks), shard)))
+        logger.info(f'订阅 {len(self._addresses)} 个账户，使用 {len(self._tasks)} 个websocket连接')
+
+    async def _run_shard(self, index: int, addresses: List[Pubkey]):
+        delay = 1
+        while self._running:
+            try:
+                async with connect(self.endpoint, max_size=None) as websocket:
+                    await self._subscribe(websocket, addresses)
+                    await self._resync(addresses)
+                    logger.info(f'websocket连接[{index}]已订阅 {len(addresses)} 个账户')
+                    delay = 1
+                    while self._running:
+                        for message in await websocket.recv():
+                            if isinstance(message, AccountNotification):
+                                self._on_notification(websocket, message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f'websocket连接[{index}]断开=>{e}，{delay}秒后重连')
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    async def _subscribe(self, websocket: SolanaWsClientProtocol, addresses: List[Pubkey]):
+        for address in addresses:
+            await websocket.account_subscribe(address, self.commitment, 'base64')
+        # 等待全部订阅确认，订阅ID与账户的对应关系记录在 websocket.subscriptions
+        while len(websocket.subscriptions) < len(addresses):
+            await websocket.recv()
+
+    async def _resync(self, addresses: List[Pubkey]):
+        for account_info_map, slot in await connection.get_accounts_info_with_slot(
+                [str(address) for address in addresses]):
+            self._emit(account_info_map, slot)
+
+    def _on_notification(self, websocket: SolanaWsClientProtocol, message: AccountNotification):
+        subscription = websocket.subscriptions.get(message.subscription)
+        if subscription is None:
+            return
+        self._emit({str(subscription.account): message.result.value}, message.result.context.slot)
+
+    def _emit(self, account_info_map: AccountInfoMap, slot: int):
+        self._pending.setdefault(slot, {}).update(account_info_map)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_event_loop().call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, {}
+        for slot, account_info_map in pending.items():
+            for handler in self._handlers:
+                try:
+                    handler(account_info_map, slot)
+                except Exception as e:
+                    logger.error(f'处理账户推送错误=>{e}')
+
+    async def close(self):
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+account_stream = AccountStream()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 20:10
+@Author     : lkkings
+@FileName:  : blockhash.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+import time
+from typing import Optional
+
+from solana.rpc.commitment import Commitment, Confirmed
+from solders.hash import Hash
+
+from clients.rpc import connection
+from core.constants import RPC
+from logger import logger
+
+# 区块哈希约150个区块(60秒左右)后失效，超过该时间未刷新成功则不再提供
+BLOCKHASH_MAX_AGE = 45
+
+
+class BlockhashService:
+    """
+    后台定时刷新最新区块哈希，构建交易时同步读取，不在关键路径上等待网络
+    """
+
+    def __init__(self, refresh_interval: float = RPC.BLOCKHASH_REFRESH_MS / 1000, commitment: Commitment = Confirmed):
+        self.refresh_interval = refresh_interval
+        self.commitment = commitment
+        self._blockhash: Optional[Hash] = None
+        self._last_valid_block_height = 0
+        self._updated_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self._updated_at
+
+    @property
+    def blockhash(self) -> Hash:
+        if self._blockhash is None:
+            raise Exception('区块哈希服务未启动')
+        if self.age > BLOCKHASH_MAX_AGE:
+            raise Exception(f'区块哈希已 {self.age:.1f} 秒未更新')
+        return self._blockhash
+
+    @property
+    def last_valid_block_height(self) -> int:
+        return self._last_valid_block_height
+
+    async def start(self):
+        if self.running:
+            return
+        await self._refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def _refresh(self):
+        resp = await connection.get_latest_blockhash(commitment=self.commitment)
+        if resp.value.last_valid_block_height >= self._last_valid_block_height:
+            self._blockhash = resp.value.blockhash
+            self._last_valid_block_height = resp.value.last_valid_block_height
+            self._updated_at = time.monotonic()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self._refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f'刷新区块哈希失败=>{e}')
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+blockhash_service = BlockhashService()
@@ -15,9 +15,11 @@ import base64
 import os
 import random
 import time
-from typing import Dict, List, Union
+from dataclasses import dataclass
+from typing import Dict, List, Union, Optional, Tuple
 from urllib.parse import urljoin
 
+import aiohttp
 import based58
 from solders.instruction import Instruction
 from solders.pubkey import Pubkey
@@ -35,6 +37,181 @@ BLOCK_ENGINE_URLS = {
     '东京': 'https://tokyo.mainnet.block-engine.jito.wtf',
     '盐湖城': 'https://slc.mainnet.block-engine.jito.wtf'
 }
+# getInflightBundleStatuses 单次最多查询的捆绑包数
+BUNDLE_STATUS_BATCH_SIZE = 5
+# 刚发送的捆绑包可能短暂查询不到，超过该时间(秒)仍为Invalid才视为无效
+BUNDLE_INVALID_GRACE = 2
+# 落地延迟直方图的分桶上界(毫秒)
+BUNDLE_LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+# 记录的已发送但尚未登记跟踪的捆绑包数上限
+MAX_ACCEPTED_ENGINES = 1024
+# 区块引擎延迟和错误率的指数加权系数
+ENGINE_EWMA_ALPHA = 0.3
+# 错误率超过该值的区块引擎排在其他引擎之后
+ENGINE_UNHEALTHY_ERROR_RATE = 0.5
+ENGINE_PROBE_TIMEOUT = 5
+
+
+class BlockEngine:
+    """
+    单个区块引擎，统计探测和发送请求延迟、错误率的指数加权移动平均
+    """
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.latency = float('inf')
+        self.error_rate = 0.0
+        self.samples = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.error_rate < ENGINE_UNHEALTHY_ERROR_RATE
+
+    def observe(self, latency: float, error: bool):
+        if error:
+            self.error_rate += ENGINE_EWMA_ALPHA * (1 - self.error_rate)
+            return
+        if self.samples == 0 or self.latency == float('inf'):
+            self.latency = latency
+        else:
+            self.latency += ENGINE_EWMA_ALPHA * (latency - self.latency)
+        self.error_rate -= ENGINE_EWMA_ALPHA * self.error_rate
+        self.samples += 1
+
+
+@dataclass
+class BundleResult:
+    bundle_id: str
+    # Landed / Failed / Invalid / Timeout
+    status: str
+    landed_slot: Optional[int]
+    # 从登记到得出结果的秒数
+    latency: float
+
+
+@dataclass
+class TrackedBundle:
+    bundle_id: str
+    submitted_at: float
+    future: asyncio.Future
+    # 接受该捆绑包的区块引擎，状态只能在该引擎查询
+    url: str
+
+
+class BundleTracker:
+    """
+    捆绑包状态跟踪
+    登记的捆绑包每次按 BUNDLE_STATUS_BATCH_SIZE 个一批轮流查询，状态无变化时逐步放慢查询间隔，
+    每个捆绑包对应一个 future，得出结果时完成并记录落地延迟
+    """
+
+    def __init__(self, client: 'JitoClient', min_interval: float = JITO.BUNDLE_POLL_MS / 1000,
+                 max_interval: float = JITO.BUNDLE_POLL_MAX_MS / 1000, timeout: float = JITO.BUNDLE_TIMEOUT):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self._interval = min_interval
+        self._pending: Dict[str, TrackedBundle] = {}
+        self._task: Optional[asyncio.Task] = None
+        # 状态 -> 各延迟分桶的数量，最后一个分桶为超过最大上界的部分
+        self.latency_histogram: Dict[str, List[int]] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def track(self, bundle_id: str, url: Optional[str] = None) -> asyncio.Future:
+        """
+        :param url: 接受该捆绑包的区块引擎，未指定时使用发送时记录的引擎
+        """
+        bundle = self._pending.get(bundle_id)
+        if bundle is not None:
+            return bundle.future
+        future = asyncio.get_running_loop().create_future()
+        url = url or self.client.accepted_engine(bundle_id)
+        self._pending[bundle_id] = TrackedBundle(bundle_id, time.monotonic(), future, url)
+        self._interval = self.min_interval
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return future
+
+    async def _run(self):
+        while self._pending:
+            await asyncio.sleep(self._interval)
+            try:
+                changed = await self._poll(self._next_batch())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 单次查询出错不能结束跟踪任务，否则所有未完成的 future 都不会再完成
+                logger.error(f'跟踪捆绑包状态出错=>{e}')
+                changed = False
+            self._interval = self.min_interval if changed else min(self._interval * 1.5, self.max_interval)
+
+    def _next_batch(self) -> List[TrackedBundle]:
+        # 取最早的捆绑包及同一引擎接受的其他捆绑包组成一批并移到队尾，超过一批时轮流查询
+        url = next(iter(self._pending.values())).url
+        bundle_ids = [bundle.bundle_id for bundle in self._pending.values() if bundle.url == url]
+        batch = [self._pending.pop(bundle_id) for bundle_id in bundle_ids[:BUNDLE_STATUS_BATCH_SIZE]]
+        for bundle in batch:
+            self._pending[bundle.bundle_id] = bundle
+        return batch
+
+    async def _poll(self, batch: List[TrackedBundle]) -> bool:
+        try:
+            result = await self.client.get_inflight_bundle_statuses([bundle.bundle_id for bundle in batch],
+                                                                    url=batch[0].url)
+            statuses = {item['bundle_id']: item for item in result['value'] if item}
+        except Exception as e:
+            # 查询失败时仍检查超时，避免状态接口异常时捆绑包一直处于待定
+            logger.warning(f'查询捆绑包状态失败=>{e}')
+            statuses = None
+        now = time.monotonic()
+        changed = False
+        for bundle in batch:
+            age = now - bundle.submitted_at
+            # 查询失败时状态未知，只检查超时
+            item = (statuses.get(bundle.bundle_id) or {}) if statuses is not None else {}
+            status = item.get('status', 'Invalid') if statuses is not None else None
+            if status in ('Landed', 'Failed') or (status == 'Invalid' and age > BUNDLE_INVALID_GRACE):
+                self._resolve(bundle, status, item.get('landed_slot'), age)
+                changed = True
+            elif age > self.timeout:
+                self._resolve(bundle, 'Timeout', None, age)
+                changed = True
+        return changed
+
+    def _resolve(self, bundle: TrackedBundle, status: str, landed_slot: Optional[int], latency: float):
+        self._pending.pop(bundle.bundle_id, None)
+        histogram = self.latency_histogram.setdefault(status, [0] * (len(BUNDLE_LATENCY_BUCKETS_MS) + 1))
+        latency_ms = latency * 1000
+        histogram[next((i for i, bound in enumerate(BUNDLE_LATENCY_BUCKETS_MS) if latency_ms <= bound),
+                       len(BUNDLE_LATENCY_BUCKETS_MS))] += 1
+        if status == 'Landed':
+            logger.info(f'打包成功=>{bundle.bundle_id} slot:{landed_slot} 耗时:{latency:.2f}s')
+        else:
+            logger.error(f'打包{status}=>{bundle.bundle_id} 耗时:{latency:.2f}s')
+        if not bundle.future.done():
+            bundle.future.set_result(BundleResult(bundle.bundle_id, status, landed_slot, latency))
+
+    def stats(self) -> Dict:
+        labels = [f'<={bound}ms' for bound in BUNDLE_LATENCY_BUCKETS_MS] + [f'>{BUNDLE_LATENCY_BUCKETS_MS[-1]}ms']
+        return {
+            'pending': len(self._pending),
+            'interval': self._interval,
+            'latency_histogram': {status: dict(zip(labels, counts)) for status, counts in self.latency_histogram.items()}
+        }
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for bundle in self._pending.values():
+            bundle.future.cancel()
+        self._pending.clear()
 
 
 class JitoClient(Client):
@@ -43,25 +220,61 @@ class JitoClient(Client):
     捆绑交易
     """
 
+    def __init__(self, fanout: int = JITO.FANOUT):
+        super().__init__()
+        self.fanout = max(1, fanout)
+        self.engines = [BlockEngine(name, url) for name, url in BLOCK_ENGINE_URLS.items()]
+        # 捆绑包ID -> 接受该捆绑包的区块引擎，登记跟踪时取出
+        self._accepted_engines: Dict[str, str] = {}
+        self.bundle_tracker = BundleTracker(self)
+
     async def initialize(self):
         await super().initialize()
-        self._url = await self._get_best_node()
+        logger.info(f'正在测试主网区块引擎节点的连通性...')
+        await self._probe_engines()
+        for engine in self.ranked:
+            logger.info(f'{engine.name}=>{engine.url} {engine.latency * 1000:.0f} ms')
+        self._select_best_engine()
         await self._flush_tip_accounts()
         task = asyncio.create_task(self._flush_tip_accounts_task())
         self._background_tasks.append(task)
+        self._background_tasks.append(asyncio.create_task(self._probe_engines_task()))
 
-    async def _get_best_node(self):
-        logger.info(f'正在测试主网区块引擎节点的连通性...')
-        best_delay, best_node = float('inf'), None
-        for name, url in BLOCK_ENGINE_URLS.items():
-            delay = await self.ping(url)
-            if delay < best_delay:
-                best_node = name
-                best_delay = delay
-            logger.info(f'{name}=>{url} {delay} ms')
-        best_block_engine_url = BLOCK_ENGINE_URLS.get(best_node)
-        logger.info(f'选取最佳节点{best_node}=>{best_block_engine_url}')
-        return best_block_engine_url
+    @property
+    def ranked(self) -> List[BlockEngine]:
+        """
+        健康的区块引擎在前，同组内按延迟升序
+        """
+        return sorted(self.engines, key=lambda engine: (not engine.healthy, engine.latency))
+
+    async def _probe_engine(self, engine: BlockEngine):
+        start = time.monotonic()
+        try:
+            async with self._session.get(engine.url, proxy=os.getenv('PROXY'),
+                                         timeout=aiohttp.ClientTimeout(total=ENGINE_PROBE_TIMEOUT)):
+                pass
+        except Exception:
+            engine.observe(time.monotonic() - start, True)
+        else:
+            engine.observe(time.monotonic() - start, False)
+
+    async def _probe_engines(self):
+        await asyncio.gather(*[self._probe_engine(engine) for engine in self.engines])
+
+    def _select_best_engine(self):
+        best = self.ranked[0]
+        if best.url != self._url:
+            logger.info(f'选取最佳节点{best.name}=>{best.url} {best.latency * 1000:.0f} ms')
+            self._url = best.url
+
+    async def _probe_engines_task(self):
+        while True:
+            await asyncio.sleep(JITO.PROBE_SECONDS)
+            try:
+                await self._probe_engines()
+                self._select_best_engine()
+            except Exception as e:
+                logger.warning(f'探测区块引擎失败=>{e}')
 
     @property
     def tip_account(self) -> Pubkey:
@@ -82,7 +295,7 @@ class JitoClient(Client):
             await asyncio.sleep(10)
             await self._flush_tip_accounts()
 
-    async def send_rpc_json(self, method: str, params: List, path=None) -> Union[Dict, List, str]:
+    async def send_rpc_json(self, method: str, params: List, path=None, url: str = None) -> Union[Dict, List, str]:
         headers = {'Content-Type': 'application/json'}
         data = {
             'jsonrpc': '2.0',
@@ -90,7 +303,7 @@ class JitoClient(Client):
             'method': method,
             'params': params,
         }
-        endpoint_url = urljoin(self._url, '/api/v1/bundles?bundleOnly=true')
+        endpoint_url = urljoin(url or self._url, '/api/v1/bundles?bundleOnly=true')
         data = await self.make_request(endpoint_url, method='POST', json=data, headers=headers,
                                        proxy=os.getenv('PROXY'))
         try:
@@ -99,13 +312,14 @@ class JitoClient(Client):
             raise Exception(data['error'])
 
     @catch_exceptions(option='获取飞行中捆绑包状态')
-    async def get_inflight_bundle_statuses(self, param: List[str]) -> Dict:
+    async def get_inflight_bundle_statuses(self, param: List[str], url: str = None) -> Dict:
         """
             api文档参考：https://jito-labs.gitbook.io/mev/searcher-resources/json-rpc-api-reference/bundles/getinflightbundlestatuses
         :param param: REQUIRED需要确认的 bundle ID 数组（最多 5 个）
+        :param url: 查询的区块引擎，应为接受这些捆绑包的引擎
         :return:
         """
-        return await self.send_rpc_json('getInflightBundleStatuses', [param])
+        return await self.send_rpc_json('getInflightBundleStatuses', [param], url=url)
 
     @catch_exceptions(option='获取已提交捆绑包状态')
     async def get_bundle_statuses(self, param: List[str]) -> Dict:
@@ -155,17 +369,76 @@ class JitoClient(Client):
         for bundle in bundles:
             assert len(bytes(bundle)) < 1232, f'数据太大{len(bytes(bundle))}'
         param = [based58.b58encode(bytes(bundle)).decode() for bundle in bundles]
-        return await self.send_rpc_json('sendBundle', [param])
+        if self.fanout == 1:
+            url = self._url
+            bundle_id = await self.send_rpc_json('sendBundle', [param], url=url)
+        else:
+            url, bundle_id = await self._send_bundle_fanout(param, self.ranked[:self.fanout])
+        self._accepted_engines[bundle_id] = url
+        while len(self._accepted_engines) > MAX_ACCEPTED_ENGINES:
+            self._accepted_engines.pop(next(iter(self._accepted_engines)))
+        return bundle_id
 
-    async def wait_down(self, bundle_id: str):
-        while True:
-            result = await self.get_inflight_bundle_statuses([bundle_id])
-            if result['value'][0]['status'] == 'Failed':
-                logger.error(f'打包失败')
-                break
-            if result['value'][0]['status'] == 'Landed':
-                logger.error(f'打包成功=>{bundle_id}')
+    def accepted_engine(self, bundle_id: str) -> str:
+        """
+        接受该捆绑包的区块引擎，没有记录时返回当前选取的引擎
+        """
+        return self._accepted_engines.pop(bundle_id, None) or self._url
+
+    async def _send_bundle_to(self, engine: BlockEngine, param: List[str]) -> Tuple[str, str]:
+        start = time.monotonic()
+        try:
+            bundle_id = await self.send_rpc_json('sendBundle', [param], url=engine.url)
+        except Exception:
+            engine.observe(time.monotonic() - start, True)
+            raise
+        engine.observe(time.monotonic() - start, False)
+        return engine.url, bundle_id
+
+    async def _send_bundle_fanout(self, param: List[str], engines: List[BlockEngine]) -> Tuple[str, str]:
+        """
+        同一捆绑包并发发送到多个区块引擎，捆绑包ID由交易签名决定，各引擎接受的是同一个捆绑包
+        以最先接受的引擎返回的ID为准，其余引擎重复接受或拒绝重复提交都不影响结果
+        :return: (最先接受的引擎, 捆绑包ID)
+        """
+        tasks = [asyncio.create_task(self._send_bundle_to(engine, param)) for engine in engines]
+        errors = []
+        url, bundle_id = None, None
+        for future in asyncio.as_completed(tasks):
+            try:
+                url, bundle_id = await future
                 break
+            except Exception as e:
+                errors.append(e)
+        for task in tasks:
+            if not task.done():
+                task.add_done_callback(self._on_fanout_done(bundle_id))
+            elif bundle_id is not None and not task.exception() and task.result()[1] != bundle_id:
+                logger.warning(f'区块引擎返回的捆绑包ID不一致=>{task.result()[1]} {bundle_id}')
+        if bundle_id is None:
+            raise errors[0]
+        return url, bundle_id
+
+    @staticmethod
+    def _on_fanout_done(bundle_id: str):
+        def callback(task: asyncio.Task):
+            if task.cancelled():
+                return
+            if task.exception() is not None:
+                logger.debug(f'区块引擎未接受重复提交的捆绑包=>{task.exception()}')
+            elif task.result()[1] != bundle_id:
+                logger.warning(f'区块引擎返回的捆绑包ID不一致=>{task.result()[1]} {bundle_id}')
+        return callback
+
+    async def wait_down(self, bundle_id: str) -> BundleResult:
+        """
+        等待捆绑包得出结果，状态查询与其他在途捆绑包合并进行
+        """
+        return await self.bundle_tracker.track(bundle_id)
+
+    async def close(self):
+        await self.bundle_tracker.close()
+        await super().close()
 
     @catch_exceptions(option='发送交易')
     async def send_transaction(self, tx: str):
@@ -12,7 +12,9 @@ Change Log  :
 """
 import asyncio
 import base64
-from typing import Dict, Any, Tuple, List
+import math
+import time
+from typing import Dict, Any, Tuple, List, Hashable, Iterable, Optional, Set
 from urllib.parse import urljoin
 
 from solders.instruction import Instruction, AccountMeta
@@ -22,7 +24,7 @@ from solders.transaction import VersionedTransaction
 from spl.token.constants import WRAPPED_SOL_MINT
 
 from core.base_client import Client
-from core.constants import JUPITER, BASE_MINT
+from core.constants import JUPITER, BASE_MINT, QUOTE
 
 from logger import catch_exceptions, logger
 
@@ -39,11 +41,116 @@ def deserialize_instruction(instruction: Dict) -> Instruction:
     )
 
 
+def route_amm_keys(quote_response: Dict) -> Tuple[str, ...]:
+    return tuple(route['swapInfo']['ammKey'] for route in quote_response.get('routePlan', []))
+
+
+class QuoteCache:
+    """
+    Jupiter报价和交换指令的短时缓存
+    报价按 (代币对, 数额分桶, 滑点) 缓存，交换指令按报价内容缓存；
+    条目在 ttl 到期或路由涉及的Pool状态发生变化时失效
+    """
+    MAX_ENTRIES = 1024
+
+    def __init__(self, ttl: float = QUOTE.CACHE_TTL_MS / 1000, bucket_bps: float = QUOTE.CACHE_BUCKET_BPS):
+        self.ttl = ttl
+        self._bucket_width = math.log1p(bucket_bps / 10000) if bucket_bps > 0 else 0
+        # 键 -> (过期时间, 响应, 路由涉及的Pool)
+        self._entries: Dict[Hashable, Tuple[float, Dict, Tuple[str, ...]]] = {}
+        self._keys_by_amm: Dict[str, Set[Hashable]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def bucket(self, amount: int) -> int:
+        if not self._bucket_width or amount <= 0:
+            return amount
+        return int(math.log(amount) / self._bucket_width)
+
+    def quote_key(self, input_mint: str, output_mint: str, amount: int, slippage_bps: float) -> Hashable:
+        return 'quote', input_mint, output_mint, self.bucket(amount), slippage_bps
+
+    @staticmethod
+    def swap_key(quote_response: Dict, payer: str, wrap_and_unwrap_sol: bool, slippage_bps: int) -> Hashable:
+        return ('swap', quote_response['inputMint'], quote_response['outputMint'], quote_response['inAmount'],
+                quote_response['outAmount'], route_amm_keys(quote_response), payer, wrap_and_unwrap_sol, slippage_bps)
+
+    def get(self, key: Hashable, max_in_amount: Optional[int] = None) -> Optional[Dict]:
+        """
+        :param max_in_amount: 报价的输入数额不能超过该值，避免复用的报价花费超过请求的数额
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+            elif max_in_amount is None or int(value['inAmount']) <= max_in_amount:
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Dict, amm_keys: Tuple[str, ...]):
+        if self.ttl <= 0:
+            return
+        if len(self._entries) >= self.MAX_ENTRIES:
+            self._prune()
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value, amm_keys)
+        for amm_key in amm_keys:
+            self._keys_by_amm.setdefault(amm_key, set()).add(key)
+
+    def invalidate(self, amm_ids: Iterable[str]):
+        """
+        Pool状态变化后，路由经过这些Pool的报价和交换指令立即失效
+        """
+        for amm_id in amm_ids:
+            for key in self._keys_by_amm.pop(amm_id, ()):
+                if self._remove(key):
+                    self.invalidations += 1
+
+    def _remove(self, key: Hashable) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        for amm_key in entry[2]:
+            keys = self._keys_by_amm.get(amm_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_amm[amm_key]
+        return True
+
+    def _prune(self):
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _, _) in self._entries.items() if expires_at < now]:
+            self._remove(key)
+        # 仍然过多时丢弃最早写入的条目
+        for key in list(self._entries)[:len(self._entries) - self.MAX_ENTRIES + 1]:
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_amm.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0,
+            'invalidations': self.invalidations,
+            'size': len(self._entries)
+        }
+
+
 class JupiterClient(Client):
 
     def __init__(self):
         super().__init__()
         self._base_rate = 0
+        self.quote_cache = QuoteCache()
 
     def sol_2_base_mint(self, amount: int) -> int:
         return int(self._base_rate * amount)
@@ -56,6 +163,7 @@ class JupiterClient(Client):
         self._base_rate = await self.vs_token(str(WRAPPED_SOL_MINT), str(BASE_MINT))
         flush_sol_value_task = asyncio.create_task(self._flush_sol_value_task())
         self._background_tasks.append(flush_sol_value_task)
+        self._background_tasks.append(asyncio.create_task(self._report_cache_stats_task()))
 
     async def _flush_sol_value_task(self):
         while True:
@@ -66,6 +174,17 @@ class JupiterClient(Client):
             finally:
                 await asyncio.sleep(3)
 
+    async def _report_cache_stats_task(self):
+        reported = 0
+        while True:
+            await asyncio.sleep(60)
+            stats = self.quote_cache.stats()
+            if stats['hits'] + stats['misses'] == reported:
+                continue
+            reported = stats['hits'] + stats['misses']
+            logger.info(f'Jupiter报价缓存 命中:{stats["hits"]} 未命中:{stats["misses"]} '
+                        f'命中率:{stats["hit_rate"]:.1%} 提前失效:{stats["invalidations"]} 条目:{stats["size"]}')
+
     async def vs_token(self, base_mint: str, target_mint: str) -> int:
         if base_mint == target_mint:
             self._base_rate = 1
@@ -86,8 +205,12 @@ class JupiterClient(Client):
         :param output_mint: 输出代币的 mint 地址。
         :param amount: 要交换的输入代币数量。
         :param slippage_bps: 允许的滑点，以基点为单位（1/100 的百分比）。
-        :return: 一个字典，包含报价信息。
+        :return: 一个字典，包含报价信息。缓存命中时 inAmount 可能略小于 amount，调用方应以 inAmount 为准
         """
+        cache_key = self.quote_cache.quote_key(input_mint, output_mint, amount, slippage_bps)
+        quote_response = self.quote_cache.get(cache_key, max_in_amount=amount)
+        if quote_response is not None:
+            return quote_response
         endpoint_url = urljoin(JUPITER.SWAP_HOST, '/v6/quote')
         params = {
             'inputMint': input_mint,
@@ -95,10 +218,16 @@ class JupiterClient(Client):
             'amount': amount,
             'slippageBps': slippage_bps * 100
         }
-        return await self.make_request(url=endpoint_url, method='GET', params=params)
+        quote_response = await self.make_request(url=endpoint_url, method='GET', params=params)
+        self.quote_cache.put(cache_key, quote_response, route_amm_keys(quote_response))
+        return quote_response
 
     async def _get_swap(self, quote_response: Dict,
                         payer: str, wrap_and_unwrap_sol, slippage_bps: int, i: int) -> Tuple[int, Dict[str, Any]]:
+        cache_key = self.quote_cache.swap_key(quote_response, payer, wrap_and_unwrap_sol, slippage_bps)
+        swap_response = self.quote_cache.get(cache_key)
+        if swap_response is not None:
+            return i, swap_response
         endpoint_url = urljoin(JUPITER.SWAP_HOST, '/v6/swap-instructions')
         json_data = {
             'quoteResponse': quote_response,
@@ -106,7 +235,9 @@ class JupiterClient(Client):
             'wrapAndUnwrapSol': wrap_and_unwrap_sol,
             'dynamicSlippage': {'maxBps': slippage_bps},
         }
-        return i, await self.make_request(url=endpoint_url, method='POST', json=json_data)
+        swap_response = await self.make_request(url=endpoint_url, method='POST', json=json_data)
+        self.quote_cache.put(cache_key, swap_response, route_amm_keys(quote_response))
+        return i, swap_response
 
     @catch_exceptions(option='交换Token')
     async def multiple_swap(self, quote_responses: List[Dict],
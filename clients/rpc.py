@@ -1,19 +1,24 @@
 import asyncio
+import itertools
 import json
 import logging
 import threading
 import time
-from typing import Optional, Dict, Type, Tuple, List, overload
-from queue import Queue
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Optional, Dict, Type, Tuple, List, Union, overload
 from solana.rpc.async_api import AsyncClient
 from solana.rpc.commitment import Commitment, Processed
 from solana.rpc.providers.async_http import AsyncHTTPProvider
 from solana.rpc.providers.core import DEFAULT_TIMEOUT, T
 from solders.hash import Hash
 from solders.pubkey import Pubkey
+from solana.rpc.core import RPCException
+from solders.rpc.config import RpcAccountInfoConfig
 from solders.rpc.responses import batch_from_json as batch_resp_json
-from solders.rpc.requests import Body
-from solders.rpc.responses import RPCResult
+from solders.rpc.requests import Body, GetLatestBlockhash, GetMultipleAccounts, SimulateLegacyTransaction, \
+    SimulateVersionedTransaction, SendRawTransaction, SendLegacyTransaction, SendVersionedTransaction
+from solders.rpc.responses import RPCResult, GetMultipleAccountsResp
 
 from core.constants import RPC
 from core.types.dex import AccountInfoMap
@@ -53,18 +58,94 @@ class TokenBucket:
             return False
 
 
+class RequestPriority(IntEnum):
+    # 时延敏感的请求：区块哈希、模拟及发送交易
+    HIGH = 0
+    NORMAL = 1
+    # 批量账户刷新
+    BULK = 2
+
+
+HIGH_PRIORITY_REQUESTS = (
+    GetLatestBlockhash,
+    SimulateLegacyTransaction,
+    SimulateVersionedTransaction,
+    SendRawTransaction,
+    SendLegacyTransaction,
+    SendVersionedTransaction
+)
+# getMultipleAccounts 单次请求的最大账户数
+MAX_MULTIPLE_ACCOUNTS = 100
+
+
+def request_priority(body: Body) -> RequestPriority:
+    if isinstance(body, HIGH_PRIORITY_REQUESTS):
+        return RequestPriority.HIGH
+    if isinstance(body, GetMultipleAccounts):
+        return RequestPriority.BULK
+    return RequestPriority.NORMAL
+
+
+@dataclass
+class PendingRequest:
+    body: Body
+    parser: Type[T]
+    future: asyncio.Future
+
+
+@dataclass
+class MergedAccountsRequest:
+    """
+    同一配置的多个 getMultipleAccounts 请求合并后的去重账户集合
+    """
+    config: Optional[RpcAccountInfoConfig]
+    index: Dict[Pubkey, int] = field(default_factory=dict)
+    members: List[PendingRequest] = field(default_factory=list)
+
+    def try_add(self, request: PendingRequest) -> bool:
+        new_accounts = {account for account in request.body.accounts if account not in self.index}
+        if len(self.index) + len(new_accounts) > MAX_MULTIPLE_ACCOUNTS:
+            return False
+        for account in request.body.accounts:
+            if account not in self.index:
+                self.index[account] = len(self.index)
+        self.members.append(request)
+        return True
+
+    @property
+    def body(self) -> GetMultipleAccounts:
+        return GetMultipleAccounts(list(self.index), self.config)
+
+    def resolve(self, response: GetMultipleAccountsResp):
+        for member in self.members:
+            if not member.future.done():
+                value = [response.value[self.index[account]] for account in member.body.accounts]
+                member.future.set_result(GetMultipleAccountsResp(value, response.context))
+
+
 class CoalescingAsyncHttpProvider(AsyncHTTPProvider):
+    """
+    所有请求进入按优先级排序的队列，由调度协程攒批发送：
+    普通请求在 flush_window_ms 窗口内或攒满 max_batch_size 后发出，高优先级请求立即发出；
+    同一批内相同配置的 getMultipleAccounts 请求合并为去重后的账户集合
+    """
 
     def __init__(self, endpoint: Optional[str] = None,
                  extra_headers: Optional[Dict[str, str]] = None,
                  timeout: float = DEFAULT_TIMEOUT,
                  requests_per_second: int = RPC.DEFAULT_REQUESTS_PER_SECOND,
-                 max_batch_size: int = RPC.DEFAULT_MAX_BATCH_SIZE):
+                 max_batch_size: int = RPC.DEFAULT_MAX_BATCH_SIZE,
+                 flush_window_ms: float = RPC.BATCH_FLUSH_MS):
         super().__init__(endpoint, extra_headers, timeout)
-        self.max_batch_size = max_batch_size
+        # 批内每个调用消耗一个令牌，单批调用数不超过令牌桶容量
+        self.max_batch_size = max(1, min(max_batch_size, requests_per_second))
         self.interval = 1 / requests_per_second
+        self.flush_window = flush_window_ms / 1000
         self.bucket = TokenBucket(requests_per_second, 1000 / requests_per_second)
-        self.request_queue = Queue()
+        self.request_queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        # 有新请求入队时唤醒攒批中的调度协程
+        self._arrived = asyncio.Event()
+        self._seq = itertools.count()
 
     def start_requests(self):
         loop = asyncio.get_event_loop()
@@ -72,60 +153,225 @@ class CoalescingAsyncHttpProvider(AsyncHTTPProvider):
 
     @catch_exceptions(option='发送rpc请求')
     async def make_request(self, body: Body, parser: Type[T]) -> T:
-        if await self.bucket.try_consume():
-            return await super().make_request(body, parser)
-        else:
-            future = asyncio.get_event_loop().create_future()
-            self.request_queue.put({
-                'body': body,
-                'parser': parser,
-                'resolve': lambda res: future.set_result(res)
-            })
-            result = await future
-            if isinstance(result, Exception):
-                raise result
-            return result
-
-    async def make_batch_request(self, reqs: Tuple[Body, ...], parsers: Tuple[Type[T], ...]) -> Tuple[RPCResult, ...]:
-        raw = await self.make_batch_request_unparsed(reqs)
-        return tuple(batch_resp_json(raw, parsers))
+        future = asyncio.get_event_loop().create_future()
+        request = PendingRequest(body, parser, future)
+        self.request_queue.put_nowait((request_priority(body), next(self._seq), request))
+        self._arrived.set()
+        return await future
 
     async def _process_requests(self):
+        loop = asyncio.get_event_loop()
         while True:
-            if not self.request_queue.empty():
-                await self._coalesce_requests()
-            await asyncio.sleep(self.interval)
-
-    async def _coalesce_requests(self):
-        bodies: List[Body] = []
-        parsers: List[Type[T]] = []
-        resolves = []
-        for _ in range(self.max_batch_size):
-            if self.request_queue.empty():
-                break
-            request = self.request_queue.get()
-            bodies.append(request['body'])
-            parsers.append(request['parser'])
-            resolves.append(request['resolve'])
-        bodies: Tuple[Body, ...] = tuple(bodies)
-        parsers: Tuple[Type[T], ...] = tuple(parsers)
-        logger.info(f"合并 {len(bodies)} 个请求")
+            priority, _, request = await self.request_queue.get()
+            batch = [request]
+            if priority == RequestPriority.HIGH:
+                # 高优先级请求不等待，只顺带发出已在队列中的请求
+                while len(batch) < self.max_batch_size and not self.request_queue.empty():
+                    batch.append(self.request_queue.get_nowait()[2])
+            else:
+                deadline = loop.time() + self.flush_window
+                while len(batch) < self.max_batch_size:
+                    if self.request_queue.empty():
+                        # 只等待入队通知，不在超时时取消 queue.get()，取出的请求不会因超时丢失
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        self._arrived.clear()
+                        try:
+                            await asyncio.wait_for(self._arrived.wait(), timeout)
+                        except asyncio.TimeoutError:
+                            break
+                        continue
+                    priority, _, request = self.request_queue.get_nowait()
+                    batch.append(request)
+                    if priority == RequestPriority.HIGH:
+                        break
+            entries = self._merge(batch)
+            # 节点按调用数限流，合并后的每个调用各消耗一个令牌
+            while not await self.bucket.try_consume(len(entries)):
+                await asyncio.sleep(self.interval)
+            loop.create_task(self._send_batch(batch, entries))
+
+    @staticmethod
+    def _merge(batch: List[PendingRequest]) -> List[Union[PendingRequest, MergedAccountsRequest]]:
+        merged: Dict[str, List[MergedAccountsRequest]] = {}
+        entries: List[Union[PendingRequest, MergedAccountsRequest]] = []
+        for request in batch:
+            body = request.body
+            if not isinstance(body, GetMultipleAccounts) or len(body.accounts) > MAX_MULTIPLE_ACCOUNTS:
+                entries.append(request)
+                continue
+            groups = merged.setdefault(body.config.to_json() if body.config else '', [])
+            if not any(group.try_add(request) for group in groups):
+                group = MergedAccountsRequest(body.config)
+                group.try_add(request)
+                groups.append(group)
+                entries.append(group)
+        return entries
+
+    async def _send_batch(self, batch: List[PendingRequest],
+                          entries: List[Union[PendingRequest, MergedAccountsRequest]]):
+        bodies = tuple(entry.body for entry in entries)
+        parsers = tuple(GetMultipleAccountsResp if isinstance(entry, MergedAccountsRequest) else entry.parser
+                        for entry in entries)
+        if len(batch) > 1:
+            logger.debug(f"合并 {len(batch)} 个请求为 {len(bodies)} 个")
         try:
-            response_data = await self.make_batch_request(bodies, parsers)
+            if len(bodies) == 1:
+                responses = (parsers[0].from_json(await self.make_request_unparsed(bodies[0])),)
+            else:
+                responses = tuple(batch_resp_json(await self.make_batch_request_unparsed(bodies), parsers))
         except Exception as e:
-            for resolve in resolves:
-                resolve(Exception(f'网络连接失败{e}'))
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(Exception(f'网络连接失败{e}'))
+            return
+        for entry, parser, response in zip(entries, parsers, responses):
+            if not isinstance(response, parser):
+                error = RPCException(response)
+                for request in entry.members if isinstance(entry, MergedAccountsRequest) else [entry]:
+                    if not request.future.done():
+                        request.future.set_exception(error)
+            elif isinstance(entry, MergedAccountsRequest):
+                entry.resolve(response)
+            elif not entry.future.done():
+                entry.future.set_result(response)
+
+
+# 延迟指数加权移动平均系数
+EWMA_ALPHA = 0.2
+# 错误率超过该值的节点视为不健康，最近一次错误后冷却期内不参与路由
+UNHEALTHY_ERROR_RATE = 0.5
+UNHEALTHY_COOLDOWN = 10
+# 可以同时发往两个节点、取最先返回结果的请求，只包括高优先级通道中的只读请求，批量账户读取不对冲
+HEDGED_REQUESTS = (GetLatestBlockhash, SimulateLegacyTransaction, SimulateVersionedTransaction)
+
+
+class RpcEndpoint:
+    """
+    单个RPC节点，统计请求延迟和错误率的指数加权移动平均
+    """
+
+    def __init__(self, provider: CoalescingAsyncHttpProvider):
+        self.provider = provider
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.requests = 0
+        self.last_error = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return self.error_rate < UNHEALTHY_ERROR_RATE or time.monotonic() - self.last_error > UNHEALTHY_COOLDOWN
+
+    def _observe(self, latency: float, error: bool):
+        if self.requests == 0:
+            self.latency = latency
         else:
-            for response, resolve in zip(response_data, resolves):
-                resolve(response)
+            self.latency += EWMA_ALPHA * (latency - self.latency)
+        self.error_rate += EWMA_ALPHA * (float(error) - self.error_rate)
+        self.requests += 1
+        if error:
+            self.last_error = time.monotonic()
+
+    async def make_request(self, body: Body, parser: Type[T]) -> T:
+        start = time.monotonic()
+        try:
+            result = await self.provider.make_request(body, parser)
+        except asyncio.CancelledError:
+            # 对冲请求中落后的一方被取消，没有完整的耗时，不计入统计
+            raise
+        except RPCException:
+            # 节点正常返回了RPC错误，属于请求本身的问题
+            self._observe(time.monotonic() - start, False)
+            raise
+        except Exception:
+            self._observe(time.monotonic() - start, True)
+            raise
+        self._observe(time.monotonic() - start, False)
+        return result
+
+
+class RpcPoolProvider:
+    """
+    多个RPC节点组成的连接池，每个节点有独立的令牌桶和批量调度。
+    请求发往健康节点中延迟最低的一个，开启对冲时只读的时延敏感请求同时发往最快的两个节点
+    """
+
+    def __init__(self, endpoints: List[str], extra_headers: Optional[Dict[str, str]] = None,
+                 timeout: float = DEFAULT_TIMEOUT, hedge: bool = bool(RPC.HEDGE)):
+        self.endpoints = [
+            RpcEndpoint(CoalescingAsyncHttpProvider(endpoint, extra_headers, timeout)) for endpoint in endpoints
+        ]
+        self.hedge = hedge
+        self.logger = self.endpoints[0].provider.logger
+
+    @property
+    def endpoint_uri(self) -> str:
+        return self.ranked()[0].provider.endpoint_uri
+
+    def start_requests(self):
+        for endpoint in self.endpoints:
+            endpoint.provider.start_requests()
+
+    def ranked(self) -> List[RpcEndpoint]:
+        return sorted(self.endpoints, key=lambda endpoint: (not endpoint.healthy, endpoint.latency))
+
+    async def make_request(self, body: Body, parser: Type[T]) -> T:
+        ranked = self.ranked()
+        if self.hedge and len(ranked) > 1 and ranked[1].healthy and isinstance(body, HEDGED_REQUESTS):
+            return await self._make_hedged_request(ranked[:2], body, parser)
+        return await ranked[0].make_request(body, parser)
+
+    @staticmethod
+    async def _make_hedged_request(endpoints: List[RpcEndpoint], body: Body, parser: Type[T]) -> T:
+        tasks = [asyncio.create_task(endpoint.make_request(body, parser)) for endpoint in endpoints]
+        error = None
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    return await next_done
+                except Exception as e:
+                    error = e
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def is_connected(self) -> bool:
+        results = await asyncio.gather(*[endpoint.provider.is_connected() for endpoint in self.endpoints])
+        return any(results)
+
+    async def __aenter__(self) -> 'RpcPoolProvider':
+        for endpoint in self.endpoints:
+            await endpoint.provider.__aenter__()
+        return self
+
+    async def __aexit__(self, _exc_type, _exc, _tb):
+        await self.close()
+
+    async def close(self):
+        for endpoint in self.endpoints:
+            await endpoint.provider.close()
+
+    def stats(self) -> List[Dict]:
+        return [
+            {
+                'endpoint': endpoint.provider.endpoint_uri,
+                'latency_ms': round(endpoint.latency * 1000, 2),
+                'error_rate': round(endpoint.error_rate, 4),
+                'requests': endpoint.requests,
+                'healthy': endpoint.healthy
+            }
+            for endpoint in self.endpoints
+        ]
 
 
 class AsyncConnection(AsyncClient):
 
     def __init__(self, endpoint: Optional[str] = None, commitment: Optional[Commitment] = None, timeout: float = 10,
-                 extra_headers: Optional[Dict[str, str]] = None) -> None:
+                 extra_headers: Optional[Dict[str, str]] = None, endpoints: Optional[List[str]] = None) -> None:
         super().__init__(endpoint, commitment, timeout, extra_headers)
-        self._provider = CoalescingAsyncHttpProvider(endpoint, extra_headers)
+        self._provider = RpcPoolProvider(endpoints or [endpoint], extra_headers)
 
     async def initialize(self):
 
@@ -135,32 +381,41 @@ class AsyncConnection(AsyncClient):
         recent_block_hash_resp = await self.get_latest_blockhash()
         return recent_block_hash_resp.value.blockhash
     async def get_accounts_info(self, addresses: List[str]) -> AccountInfoMap:
+        accounts_info = {}
+        for _accounts_info, _ in await self.get_accounts_info_with_slot(addresses):
+            accounts_info.update(_accounts_info)
+        return accounts_info
+
+    async def get_accounts_info_with_slot(self, addresses: List[str]) -> List[Tuple[AccountInfoMap, int]]:
+        """
+        分批获取账户信息，每批返回账户数据及其响应所在的slot
+        """
         if len(addresses) == 0:
-            return {}
+            return []
         addresses = list(set(addresses))
-        accounts_info = {}
 
-        async def _get_accounts_info(_addresses: List[str]):
+        async def _get_accounts_info(_addresses: List[str]) -> Tuple[AccountInfoMap, int]:
             _addresses: List[Pubkey] = [Pubkey.from_string(_address) for _address in _addresses]
-            while True:
+            for attempt in range(RPC.MAX_RETRIES + 1):
                 try:
                     accounts_resp = await self.get_multiple_accounts(_addresses)
                     _accounts = accounts_resp.value
-                    for j in range(0, len(_accounts)):
-                        accounts_info[str(_addresses[j])] = _accounts[j]
-                    break
-                except:
-                    await asyncio.sleep(1)
+                    return {str(_addresses[j]): _accounts[j] for j in range(0, len(_accounts))}, \
+                        accounts_resp.context.slot
+                except Exception as e:
+                    if attempt == RPC.MAX_RETRIES:
+                        raise
+                    logger.warning(f'获取账户信息失败=>{e}，第{attempt + 1}次重试')
+                    await asyncio.sleep(0.2 * 2 ** attempt)
 
         tasks = []
-        for i in range(0, len(addresses), 100):
+        for i in range(0, len(addresses), MAX_MULTIPLE_ACCOUNTS):
             tasks.append(
                 asyncio.create_task(
-                    _get_accounts_info(addresses[i:min(i + 100, len(addresses))])
+                    _get_accounts_info(addresses[i:i + MAX_MULTIPLE_ACCOUNTS])
                 )
             )
-        await asyncio.gather(*tasks)
-        return accounts_info
+        return list(await asyncio.gather(*tasks))
 
 
-connection = AsyncConnection(endpoint=RPC.HOST, commitment=Processed, timeout=5)
+connection = AsyncConnection(endpoints=RPC.HOSTS, commitment=Processed, timeout=5)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 17:45
+@Author     : lkkings
+@FileName:  : account_store.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+from typing import Dict, NamedTuple, Optional, Union, List
+
+from solders.pubkey import Pubkey
+
+from core.types.dex import AccountInfoMap
+
+Address = Union[str, Pubkey]
+
+
+class AccountRecord(NamedTuple):
+    """
+    与 AccountInfo 一样提供 data/owner，可直接传给各Amm的 update
+    """
+    data: bytes
+    owner: Pubkey
+    slot: int
+
+
+class AccountStore:
+    """
+    全局账户数据存储，以公钥字节为键，记录原始数据、所有者和观察到的slot
+    较旧slot的写入会被拒绝，避免并发的RPC响应用旧数据覆盖新数据
+    """
+
+    def __init__(self):
+        self._records: Dict[bytes, AccountRecord] = {}
+        self._keys: Dict[str, bytes] = {}
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def _key(self, address: Address) -> bytes:
+        if isinstance(address, Pubkey):
+            return bytes(address)
+        key = self._keys.get(address)
+        if key is None:
+            key = bytes(Pubkey.from_string(address))
+            self._keys[address] = key
+        return key
+
+    def get(self, address: Address) -> Optional[AccountRecord]:
+        return self._records.get(self._key(address))
+
+    def get_slot(self, address: Address) -> int:
+        record = self._records.get(self._key(address))
+        return -1 if record is None else record.slot
+
+    def write(self, address: Address, data: bytes, owner: Pubkey, slot: int) -> bool:
+        """
+        :return: 数据是否发生变化，slot更旧或数据相同时返回False
+        """
+        key = self._key(address)
+        record = self._records.get(key)
+        if record is not None:
+            if slot < record.slot:
+                self.rejected += 1
+                return False
+            if record.data == data and record.owner == owner:
+                if slot > record.slot:
+                    self._records[key] = record._replace(slot=slot)
+                return False
+        self._records[key] = AccountRecord(data, owner, slot)
+        return True
+
+    def write_many(self, account_info_map: AccountInfoMap, slot: int) -> List[str]:
+        """
+        写入同一slot观察到的一批账户，返回数据发生变化的账户
+        """
+        changed = []
+        for address, account_info in account_info_map.items():
+            if account_info is None:
+                continue
+            if self.write(address, bytes(account_info.data), account_info.owner, slot):
+                changed.append(address)
+        return changed
+
+
+account_store = AccountStore()
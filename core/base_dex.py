@@ -11,10 +11,11 @@ Change Log  :
 
 """
 from abc import ABC, abstractmethod
-from typing import Dict, Tuple, NamedTuple, List
+from typing import Dict, Tuple, NamedTuple, List, Optional, Set, Iterable
 
 from core.base_amm import Amm
-from core.constants import DexLabel, NETWORK
+from core.constants import DexLabel, NETWORK, BASE_MINT
+from core.sharding import partition_pools, PoolMints
 from core.types.dex import Market, AccountInfo, AccountInfoMap
 
 
@@ -33,6 +34,8 @@ class Dex(ABC):
         self._pair_markets_map: Dict[str, List[Market]] = {}
         self._pools: Dict[str, Amm] = {}
         self._markets: Dict[str, Market] = {}
+        # (分片序号, 分片数)，未分片时为None
+        self.shard: Optional[Tuple[int, int]] = None
 
     @property
     def markets(self) -> Dict[str, Market]:
@@ -50,6 +53,21 @@ class Dex(ABC):
     async def initialize(self):
         raise NotImplementedError
 
+    async def prepare_snapshot(self):
+        """
+        分片模式下由路由进程在启动分片前调用，构建或校验启动快照，分片进程只读取快照
+        """
+        pass
+
+    def shard_pool_ids(self, pools: Iterable[PoolMints]) -> Optional[Set[str]]:
+        """
+        当前分片负责的Pool地址，未分片时返回None
+        """
+        if self.shard is None:
+            return None
+        index, count = self.shard
+        return partition_pools(pools, str(BASE_MINT), count)[index]
+
     def get_markets_for_pair(self, mint1: str, mint2: str) -> List[Market]:
         markets = self._pair_markets_map.get(to_pair_string(mint1, mint2))
         return markets or []
@@ -62,6 +80,21 @@ class Dex(ABC):
         else:
             self._pair_markets_map[pair_string] = [market]
 
+    def remove_pool(self, pool_id: str):
+        """
+        移除Pool及其市场，需在 DexLander 构建路由索引之前调用，之后路由与报价不再包含该Pool
+        """
+        self._pools.pop(pool_id, None)
+        market = self._markets.pop(pool_id, None)
+        if market is None:
+            return
+        pair_string = to_pair_string(market.tokenMintA, market.tokenMintB)
+        markets = [m for m in self._pair_markets_map.get(pair_string, []) if m.id != pool_id]
+        if markets:
+            self._pair_markets_map[pair_string] = markets
+        else:
+            self._pair_markets_map.pop(pair_string, None)
+
     def get_all_markets(self):
         all_markets = []
         for markets in self._pair_markets_map.values():
@@ -16,6 +16,8 @@ from solders.instruction import Instruction
 from solders.transaction import VersionedTransaction
 from solders.pubkey import Pubkey
 
+from core.math import Fraction
+
 
 class FlashLoan(ABC):
     def __init__(self):
@@ -32,3 +34,8 @@ class FlashLoan(ABC):
     @abstractmethod
     def get_fee(self, in_amount: int):
         pass
+
+    @property
+    @abstractmethod
+    def fee_rate(self) -> Fraction:
+        pass
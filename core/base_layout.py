@@ -10,7 +10,10 @@
 Change Log  :
 
 """
+import struct
 from abc import ABC, abstractmethod
+from typing import Tuple, Dict
+
 from construct import Struct as CStruct
 from solders.pubkey import Pubkey
 
@@ -20,3 +23,51 @@ class Layout(ABC):
     @classmethod
     def get_layout(cls, program_id: Pubkey) -> CStruct:
         raise NotImplementedError
+
+
+# 定长字段字节数 -> struct格式
+_FIELD_FORMATS = {1: 'B', 2: 'H', 4: 'I', 8: 'Q', 32: '32s'}
+
+
+def layout_offsets(layout: CStruct) -> Dict[str, Tuple[int, int]]:
+    """
+    定长construct布局中各字段的 (偏移量, 长度)
+    """
+    offsets = {}
+    offset = 0
+    for subcon in layout.subcons:
+        if subcon.name is not None:
+            offsets[subcon.name] = (offset, subcon.sizeof())
+        offset += subcon.sizeof()
+    return offsets
+
+
+class FixedFields:
+    """
+    construct布局中若干定长字段的预编译读取器
+    偏移量由construct布局计算，读取时只做一次 struct.unpack_from，不解析整个账户。
+    完整的 layout.parse 仍用于初始化等冷路径
+    """
+
+    def __init__(self, layout: CStruct, *names: str):
+        offsets = layout_offsets(layout)
+        fmt = '<'
+        position = 0
+        for name in names:
+            field_offset, size = offsets[name]
+            assert field_offset >= position, f'字段{name}需按布局顺序声明'
+            assert size in _FIELD_FORMATS, f'字段{name}长度{size}不支持定长读取'
+            if field_offset > position:
+                fmt += f'{field_offset - position}x'
+            fmt += _FIELD_FORMATS[size]
+            position = field_offset + size
+        self.names = names
+        self.offsets = {name: offsets[name][0] for name in names}
+        self.size = position
+        self._struct = struct.Struct(fmt)
+
+    def unpack(self, data: bytes) -> Tuple:
+        """
+        按声明顺序返回字段值
+        """
+        return self._struct.unpack_from(data)
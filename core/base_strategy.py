@@ -16,8 +16,9 @@ from typing import List, Dict, Type
 
 from solders.transaction import VersionedTransaction
 
-from core.types.event import Event
+from core.types.event import Event, EventType
 from clients.helius import helius_client
+from clients.account_stream import account_stream
 from core.worker import worker
 from logger import logger
 from task.account_update_task import AccountUpdateTask, AccountUpdatePayload, AccountUpdateParams
@@ -37,11 +38,24 @@ class Strategy(ABC):
         self._events: List[Type[Event]] = []
         self._addresses: List[str] = []
 
-    async def start(self):
+    @property
+    def addresses(self) -> List[str]:
+        return self._addresses
+
+    @property
+    def event_types(self) -> List[EventType]:
+        return [i.type for i in self._events]
+
+    async def start(self, create_webhook: bool = True):
+        """
+        :param create_webhook: 分片进程不创建webhook，由路由进程汇总各分片的监听账户后统一创建
+        """
         await self.setup(self._events, self._addresses)
         assert len(self._events) > 0, '请设置监听事件'
         assert len(self._addresses) > 0, '清设置监听账户'
-        event_types = [i.type for i in self._events]
+        if not create_webhook:
+            return
+        event_types = self.event_types
         data = await helius_client.create_webhook(
             self._addresses, event_types
         )
@@ -50,14 +64,16 @@ class Strategy(ABC):
 
     def _parse_event(self, data: Dict):
         for item in data:
-            accounts = [i['account'] for i in item['accountData']]
-            worker.run_task(
-                AccountUpdateTask[AccountUpdatePayload](
-                    AccountUpdateParams(
-                        update_accounts=accounts
+            # 开启账户推送时Pool状态已由websocket更新，无需再拉取
+            if not account_stream.running:
+                accounts = [i['account'] for i in item['accountData']]
+                worker.run_task(
+                    AccountUpdateTask[AccountUpdatePayload](
+                        AccountUpdateParams(
+                            update_accounts=accounts
+                        )
                     )
                 )
-            )
             for event in self._events:
                 if event.is_type(item):
                     yield event.parse(item)
@@ -11,9 +11,13 @@ Change Log  :
 
 """
 import asyncio
+import time
 import uuid
 from abc import ABC, abstractmethod
-from typing import Any, Union, TypeVar, Generic, Optional
+from concurrent.futures import Executor
+from typing import Any, Union, TypeVar, Generic, Optional, Hashable, List, Tuple
+
+from core.constants import COMPUTE_MIN_WORK
 
 
 class TaskParams(ABC):
@@ -39,6 +43,10 @@ class TaskPayload(ABC):
     pass
 
 
+class TaskExpiredError(Exception):
+    pass
+
+
 V = TypeVar('V', bound=TaskPayload)
 
 
@@ -59,33 +67,93 @@ class TaskResp(Generic[V]):
 
 class AsyncTask(Generic[V]):
     priority = 10000
-
-    def __init__(self, message: Union[TaskReq, TaskParams]):
+    # 是否为纯计算任务，为True时由 Worker 交给计算通道执行
+    cpu_bound = False
+    # 同类任务的最大并发数，None 时使用 Worker 的默认值
+    max_concurrency: Optional[int] = None
+    # 入队后的有效时间(秒)，超过后仍未开始执行的任务被丢弃，None 表示不过期
+    ttl: Optional[float] = None
+
+    def __init__(self, message: Union[TaskReq, TaskParams], deadline: Optional[float] = None):
+        """
+        :param deadline: 截止时间(time.monotonic)，未指定时由 Worker 按 ttl 计算
+        """
         super().__init__()
         self._future = None
+        # 合并到本任务的其他提交方的 future，与本任务一同完成
+        self._coalesced_futures: List[asyncio.Future] = []
         self._message = message
+        self.deadline = deadline
+        # 入队顺序，由 Worker 分配
+        self.seq = 0
 
     def set_future(self, future: asyncio.Future):
         self._future = future
 
-    async def exec(self) -> None:
-        uid = uuid.uuid4()
+    @property
+    def params(self) -> Optional[TaskParams]:
+        return self._message.params if isinstance(self._message, TaskReq) else self._message
+
+    def coalesce_key(self) -> Optional[Hashable]:
+        """
+        键相同的同类任务在等待执行期间合并为一个，返回None时不合并
+        """
+        return None
+
+    def merge(self, other: 'AsyncTask[V]'):
+        """
+        将等待中的同键任务 other 合并到本任务，默认改用较新的参数
+        """
+        self._message = other._message
+
+    def coalesce(self, other: 'AsyncTask[V]'):
+        self.merge(other)
+        self._coalesced_futures.append(other._future)
+        if self.deadline is not None:
+            self.deadline = None if other.deadline is None else max(self.deadline, other.deadline)
+
+    def _set_result(self, resp: TaskResp):
+        for future in [self._future, *self._coalesced_futures]:
+            if not future.done():
+                future.set_result(resp)
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def _uid(self):
+        if isinstance(self._message, TaskReq) and self._message.id:
+            return self._message.id
+        return uuid.uuid4()
+
+    def expire(self):
+        self._set_result(TaskResp(id=self._uid(), error=TaskExpiredError(
+            f'{type(self).__name__} 超过截止时间 {time.monotonic() - self.deadline:.3f}s 未执行'
+        )))
+
+    async def exec(self, executor: Optional[Executor] = None) -> None:
+        """
+        :param executor: 计算通道，仅 cpu_bound 任务使用
+        """
+        uid = self._uid()
         try:
-            if isinstance(self._message, TaskReq):
-                uid = self._message.id if self._message.id else uid
-                resp_payload = await self.run(self._message.params)
-            elif isinstance(self._message, TaskParams):
-                resp_payload = await self.run(self._message)
-            else:
+            if not isinstance(self._message, (TaskReq, TaskParams)):
                 raise TypeError
-            self._future.set_result(TaskResp(id=uid, payload=resp_payload))
+            if executor is not None and self.cpu_bound:
+                resp_payload = await self.run_in_executor(self.params, executor)
+            else:
+                resp_payload = await self.run(self.params)
+            self._set_result(TaskResp(id=uid, payload=resp_payload))
         except Exception as e:
-            self._future.set_result(TaskResp(id=uid, error=e))
+            self._set_result(TaskResp(id=uid, error=e))
 
     @abstractmethod
     async def run(self, params: TaskParams) -> TaskPayload:
         raise NotImplementedError
 
+    async def run_in_executor(self, params: TaskParams, executor: Executor) -> TaskPayload:
+        return await self.run(params)
+
     def __lt__(self, other):
         return self.priority < other.priority
 
@@ -100,3 +168,54 @@ class AsyncTask(Generic[V]):
 
     def __eq__(self, other):
         return self.priority == other.priority
+
+
+class CpuBoundTask(AsyncTask[V]):
+    """
+    纯计算任务
+    在事件循环中由 snapshot 取出计算所需的最小状态，compute 在 Worker 的计算通道(线程/进程池)中执行，
+    compute 的结果交给 finish 在事件循环中完成剩余工作(如构建交易)；
+    快照、compute 的参数和返回值都需要可以序列化；snapshot 返回None、计算量低于 min_work 或不经过 Worker 执行时
+    在当前线程内计算
+    """
+    cpu_bound = True
+    min_work = COMPUTE_MIN_WORK
+
+    @abstractmethod
+    def snapshot(self, params: TaskParams) -> Optional[Tuple]:
+        raise NotImplementedError
+
+    @staticmethod
+    @abstractmethod
+    def compute(*snapshot) -> TaskPayload:
+        raise NotImplementedError
+
+    def work_size(self, snapshot: Tuple) -> int:
+        """
+        快照对应的计算量(候选路由数)，用于判断是否值得交给计算通道
+        """
+        return 1
+
+    async def finish(self, params: TaskParams, result: Any) -> TaskPayload:
+        return result
+
+    async def run(self, params: TaskParams) -> TaskPayload:
+        snapshot = self.snapshot(params)
+        if snapshot is None:
+            return await self.run_inline(params)
+        return await self.finish(params, self.compute(*snapshot))
+
+    async def run_inline(self, params: TaskParams) -> TaskPayload:
+        """
+        无法生成快照时的计算方式
+        """
+        raise Exception(f'{type(self).__name__} 无法生成计算快照')
+
+    async def run_in_executor(self, params: TaskParams, executor: Executor) -> TaskPayload:
+        snapshot = self.snapshot(params)
+        if snapshot is None:
+            return await self.run_inline(params)
+        if self.work_size(snapshot) < self.min_work:
+            return await self.finish(params, self.compute(*snapshot))
+        result = await asyncio.get_running_loop().run_in_executor(executor, self.compute, *snapshot)
+        return await self.finish(params, result)
@@ -56,6 +56,17 @@ class JITO_MAIN:
     TIP_PERCENT = int(os.getenv('JTTO_TIP_PERCENT', 50))
     MIN_TIP_LAMPORTS = int(os.getenv('JITO_MIN_TIP_LAMPORTS', 10000))
     FEES_LAMPORTS = int(os.getenv('JITO_FEES_LAMPORTS', 15000))
+    # 同时在途(已发送未落地)的捆绑包上限
+    MAX_INFLIGHT_BUNDLES = int(os.getenv('JITO_MAX_INFLIGHT_BUNDLES', 4))
+    # 查询捆绑包状态的最小/最大间隔(毫秒)，状态无变化时逐步放慢，有变化或新捆绑包时恢复最小间隔
+    BUNDLE_POLL_MS = int(os.getenv('JITO_BUNDLE_POLL_MS', 500))
+    BUNDLE_POLL_MAX_MS = int(os.getenv('JITO_BUNDLE_POLL_MAX_MS', 2000))
+    # 放弃跟踪捆绑包的超时(秒)
+    BUNDLE_TIMEOUT = int(os.getenv('JITO_BUNDLE_TIMEOUT', 60))
+    # 后台探测各区块引擎延迟的间隔(秒)
+    PROBE_SECONDS = int(os.getenv('JITO_PROBE_SECONDS', 30))
+    # 每个捆绑包同时发送到延迟最低的前K个区块引擎
+    FANOUT = int(os.getenv('JITO_FANOUT', 1))
 
 
 class HELIUS_MAIN:
@@ -114,8 +125,61 @@ class JUPITER_MAIN:
 
 class RPC:
     HOST = os.getenv('RPC_HOST')
+    # 多个RPC节点用逗号分隔，未配置时只使用 RPC_HOST
+    HOSTS = [host.strip() for host in os.getenv('RPC_HOSTS', HOST or '').split(',') if host.strip()]
+    # 是否将区块哈希、交易模拟等时延敏感的只读请求同时发往两个最快的节点，会增加RPC额度消耗
+    HEDGE = int(os.getenv('RPC_HEDGE', 0))
     DEFAULT_REQUESTS_PER_SECOND = int(os.getenv('RPC_DEFAULT_REQUESTS_PER_SECOND'))
     DEFAULT_MAX_BATCH_SIZE = int(os.getenv('RPC_DEFAULT_MAX_BATCH_SIZE'))
+    WS_HOST = os.getenv('RPC_WS_HOST', (HOST or '').replace('https://', 'wss://').replace('http://', 'ws://'))
+    # 单个websocket连接的最大订阅数，超出后新开连接
+    WS_MAX_SUBSCRIPTIONS = int(os.getenv('RPC_WS_MAX_SUBSCRIPTIONS', 1000))
+    # 是否通过websocket订阅Pool账户，开启后事件不再触发HTTP拉取
+    USE_ACCOUNT_STREAM = int(os.getenv('RPC_USE_ACCOUNT_STREAM', 1))
+    # 普通请求的攒批窗口(毫秒)，窗口内到达的请求合并为一次批量请求，高优先级请求不等待
+    BATCH_FLUSH_MS = float(os.getenv('RPC_BATCH_FLUSH_MS', 5))
+    # 获取账户信息失败时的最大重试次数
+    MAX_RETRIES = int(os.getenv('RPC_MAX_RETRIES', 3))
+    # 后台刷新区块哈希的间隔(毫秒)
+    BLOCKHASH_REFRESH_MS = int(os.getenv('RPC_BLOCKHASH_REFRESH_MS', 1000))
+
+
+class QUOTE:
+    # 是否使用本地Pool状态报价，本地没有路由的代币对才请求Jupiter报价
+    # 本地报价时由路由Pool的储备变化驱动套利循环，关闭后退化为每秒轮询Jupiter报价
+    LOCAL = int(os.getenv('QUOTE_LOCAL', 1))
+    # 本地报价与Jupiter报价对照检查的间隔(秒)
+    CHECK_SECONDS = int(os.getenv('QUOTE_CHECK_SECONDS', 60))
+    # 本地报价与Jupiter报价偏差超过该值(bps)时告警
+    MAX_DEVIATION_BPS = int(os.getenv('QUOTE_MAX_DEVIATION_BPS', 50))
+    # Jupiter报价和交换指令的缓存时间(毫秒)，为0时不缓存
+    CACHE_TTL_MS = int(os.getenv('QUOTE_CACHE_TTL_MS', 2000))
+    # 报价缓存的数额分桶宽度(bps)，同一桶内不超过请求数额的报价可以复用，为0时按精确数额缓存
+    CACHE_BUCKET_BPS = int(os.getenv('QUOTE_CACHE_BUCKET_BPS', 10))
+
+
+class SHARD:
+    # 分片进程数，大于1时 bot.py 作为路由进程启动，按代币将Pool分配到各分片进程
+    COUNT = int(os.getenv('SHARD_COUNT', 1))
+    # 当前分片序号，由路由进程启动分片时设置，-1 表示未分片或路由进程
+    INDEX = int(os.getenv('SHARD_INDEX', -1))
+    # 分片进程监听本地端口 BASE_PORT + 分片序号
+    BASE_PORT = int(os.getenv('SHARD_BASE_PORT', 8900))
+    # 等待分片进程加载完成的超时(秒)
+    START_TIMEOUT = int(os.getenv('SHARD_START_TIMEOUT', 900))
+
+
+class WEBHOOK:
+    # webhook条目缓冲区容量，超过后按 DROP_POLICY 丢弃
+    QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', 1024))
+    # 缓冲区满时的丢弃策略：oldest 丢弃最旧的条目，newest 丢弃新到的条目
+    DROP_POLICY = os.getenv('WEBHOOK_DROP_POLICY', 'oldest')
+    # 消费缓冲区的协程数
+    CONSUMERS = int(os.getenv('WEBHOOK_CONSUMERS', 4))
+    # 消费协程每次取出的最大条目数
+    BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', 16))
+    # 去重保留的最近交易签名数
+    DEDUPE_SIZE = int(os.getenv('WEBHOOK_DEDUPE_SIZE', 10000))
 
 
 BASE_MINT = Pubkey.from_string(os.getenv('BASE_MINT'))
@@ -124,6 +188,15 @@ MAX_SEED_LENGTH = 32
 DATA_PATH = os.getenv('DATA_PATH')
 os.makedirs(DATA_PATH, exist_ok=True)
 MAX_THREAD_NUM = int(os.getenv('MAX_THREAD_NUM'))
+# 启动时构建Pool及 Worker 计算通道使用的进程数，不大于1时构建Pool在主进程中进行
+MAX_PROCESS_NUM = int(os.getenv('MAX_PROCESS_NUM', os.cpu_count() or 1))
+# Worker 计算通道的执行器：process 使用进程池；thread 使用线程池，只对释放GIL的计算(如大数组numpy运算)有效
+COMPUTE_EXECUTOR = os.getenv('COMPUTE_EXECUTOR', 'process')
+# 计算量(候选路由数)低于该值的 cpu_bound 任务直接在事件循环中计算。test/计算通道测试.py 实测选路：
+# 1000条候选内联约125µs，与进程池往返在事件循环侧的序列化耗时(约130µs)相当；5000条约570µs对390µs
+COMPUTE_MIN_WORK = int(os.getenv('COMPUTE_MIN_WORK', 1000))
+# 单笔套利最大交易数额（BASE_MINT最小单位），实际数额按环路储备计算
+MAX_ARB_AMOUNT = int(os.getenv('MAX_ARB_AMOUNT', 1_000_000_000))
 
 NETWORK = NETWORK_TYPE.MAIN
 
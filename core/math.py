@@ -44,7 +44,7 @@ ZERO_FRACTION = Fraction(int(0), int(1))
 def calculate_fee_amount(amount: int, fee_rate: Fraction) -> int:
     if fee_rate.numerator == 0 or amount == 0:
         return int(0)
-    fee_amount = (amount * fee_rate.numerator) / fee_rate.denominator
+    fee_amount = int(amount) * fee_rate.numerator // fee_rate.denominator
     return int(1) if fee_amount == 0 else fee_amount
 
 
@@ -190,10 +190,8 @@ class TokenSwapConstantProduct:
         return new_pool_input_amount - pool_input_amount
 
     def get_invariant(self, token_amounts: List[int]) -> int:
-        scalar = 10 ** 8
-        a = token_amounts[0] / scalar
-        b = token_amounts[1] / scalar
-        return int(a * b * scalar ** 2)
+        # 整数相乘，储备超过2^53时浮点会丢失精度
+        return int(token_amounts[0]) * int(token_amounts[1])
 
 
 class Curve:
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 22:45
+@Author     : lkkings
+@FileName:  : shard_router.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import List, Dict, Tuple, Any, Optional
+
+import aiohttp
+
+from clients.helius import helius_client
+from core.constants import SHARD
+from core.types.event import EventType
+from logger import logger
+
+
+class ShardRouter:
+    """
+    分片模式的路由进程
+    启动各分片进程(每个分片只加载自己负责的Pool)，汇总分片的监听账户统一创建webhook，
+    收到的webhook条目按涉及的账户转发给持有相关Pool的分片，分片通过本地HTTP端口接收并返回处理结果
+    """
+
+    def __init__(self, shard_count: int = SHARD.COUNT, base_port: int = SHARD.BASE_PORT,
+                 start_timeout: float = SHARD.START_TIMEOUT):
+        self.shard_count = shard_count
+        self.base_port = base_port
+        self.start_timeout = start_timeout
+        self._processes: List[subprocess.Popen] = []
+        self._account_shards: Dict[str, Tuple[int, ...]] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._webhook_id = None
+        self.dispatched = [0] * shard_count
+        self.dropped = 0
+
+    def shard_url(self, index: int, path: str) -> str:
+        return f'http://127.0.0.1:{self.base_port + index}{path}'
+
+    async def start(self, entry: str):
+        """
+        :param entry: 分片进程执行的脚本，以 SHARD_INDEX 环境变量区分分片
+        """
+        self._session = aiohttp.ClientSession()
+        for index in range(self.shard_count):
+            self._processes.append(subprocess.Popen(
+                [sys.executable, entry], env={**os.environ, 'SHARD_INDEX': str(index)}
+            ))
+        subscriptions = await asyncio.gather(*[self._wait_ready(index) for index in range(self.shard_count)])
+        account_shards: Dict[str, List[int]] = {}
+        event_types = set()
+        for index, subscription in enumerate(subscriptions):
+            for account in subscription['addresses']:
+                account_shards.setdefault(account, []).append(index)
+            event_types.update(subscription['event_types'])
+            logger.info(f'分片[{index}] 已就绪，监听 {len(subscription["addresses"])} 个账户')
+        self._account_shards = {account: tuple(shards) for account, shards in account_shards.items()}
+        data = await helius_client.create_webhook(
+            list(self._account_shards), [EventType[name] for name in sorted(event_types)]
+        )
+        self._webhook_id = data['webhookID']
+        logger.info(f'正在监听{len(data["accountAddresses"])}个账户 WebhookID:{self._webhook_id} '
+                    f'URL:{data["webhookURL"]} 分片数:{self.shard_count}')
+
+    async def _wait_ready(self, index: int) -> Dict[str, Any]:
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline:
+            if self._processes[index].poll() is not None:
+                raise Exception(f'分片[{index}] 进程已退出 code:{self._processes[index].returncode}')
+            try:
+                async with self._session.get(self.shard_url(index, '/subscription')) as r:
+                    r.raise_for_status()
+                    return await r.json()
+            except aiohttp.ClientError:
+                await asyncio.sleep(2)
+        raise Exception(f'等待分片[{index}] 启动超时')
+
+    async def dispatch(self, data: List[Dict]) -> Dict[str, Any]:
+        """
+        按条目涉及的账户分发到对应分片，同一条目可能发往多个分片，返回各分片的处理结果
+        """
+        batches: Dict[int, List[Dict]] = {}
+        dropped = 0
+        for item in data:
+            shards = set()
+            for account_data in item.get('accountData', []):
+                shards.update(self._account_shards.get(account_data['account'], ()))
+            if not shards:
+                dropped += 1
+                continue
+            for index in shards:
+                batches.setdefault(index, []).append(item)
+        self.dropped += dropped
+        indexes = list(batches)
+        results = await asyncio.gather(*[self._post(index, batches[index]) for index in indexes],
+                                       return_exceptions=True)
+        merged = {'shards': {}, 'dropped': dropped}
+        for index, result in zip(indexes, results):
+            if isinstance(result, Exception):
+                logger.error(f'转发到分片[{index}]失败=>{result}')
+                merged['shards'][index] = {'error': str(result)}
+            else:
+                self.dispatched[index] += len(batches[index])
+                merged['shards'][index] = result
+        return merged
+
+    async def _post(self, index: int, items: List[Dict]) -> Any:
+        async with self._session.post(self.shard_url(index, '/webhook'), json=items) as r:
+            r.raise_for_status()
+            return await r.json()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'dispatched': list(self.dispatched),
+            'dropped': self.dropped,
+            'alive': [process.poll() is None for process in self._processes]
+        }
+
+    async def close(self):
+        if self._webhook_id is not None:
+            await helius_client.delete_webhook(self._webhook_id)
+            self._webhook_id = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            try:
+                await asyncio.to_thread(process.wait, 10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self._processes = []
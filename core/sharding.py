@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 22:30
+@Author     : lkkings
+@FileName:  : sharding.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import zlib
+from typing import Iterable, Tuple, List, Set, Dict
+
+# (Pool地址, 代币A, 代币B)
+PoolMints = Tuple[str, str, str]
+
+
+def shard_of(mint: str, shard_count: int) -> int:
+    return zlib.crc32(mint.encode()) % shard_count
+
+
+def cycle_owner(mints: List[str], anchor_mint: str, shard_count: int) -> int:
+    """
+    环路的归属分片，mints 为从锚定代币出发并回到锚定代币的环路代币序列
+    锚定代币 -> m -> n -> 锚定代币 的环路在 m 和 n 所属的分片内都完整可见，由较小代币所属的分片执行；
+    锚定代币 -> m -> n -> p -> 锚定代币 的环路只保证在中间代币 n 所属的分片内完整可见，由该分片执行
+    """
+    assert mints[0] == anchor_mint and mints[-1] == anchor_mint, '环路需从锚定代币出发'
+    inner = mints[1:-1]
+    if len(inner) <= 2:
+        return shard_of(min(inner), shard_count)
+    return shard_of(inner[len(inner) // 2], shard_count)
+
+
+def partition_pools(pools: Iterable[PoolMints], anchor_mint: str, shard_count: int) -> List[Set[str]]:
+    """
+    按代币将Pool分配到各分片
+    每个非锚定代币归属一个分片，分片持有与其代币相邻的全部Pool，以及相邻代币与锚定代币之间的Pool，
+    因此 锚定代币 -> m -> n -> 锚定代币 的环路在 m 所属的分片内完整可见，
+    锚定代币 -> m -> n -> p -> 锚定代币 的环路在 n 所属的分片内完整可见；跨分片的Pool会复制到多个分片
+    """
+    pools = list(pools)
+    anchor_pools: Dict[str, List[str]] = {}
+    for pool_id, mint_a, mint_b in pools:
+        if mint_a == anchor_mint:
+            anchor_pools.setdefault(mint_b, []).append(pool_id)
+        elif mint_b == anchor_mint:
+            anchor_pools.setdefault(mint_a, []).append(pool_id)
+    shards: List[Set[str]] = [set() for _ in range(shard_count)]
+    for pool_id, mint_a, mint_b in pools:
+        for mint, other in ((mint_a, mint_b), (mint_b, mint_a)):
+            if mint == anchor_mint:
+                continue
+            shard = shards[shard_of(mint, shard_count)]
+            shard.add(pool_id)
+            if other != anchor_mint:
+                shard.update(anchor_pools.get(other, ()))
+    return shards
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 16:05
+@Author     : lkkings
+@FileName:  : sizing.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import math
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from core.math import TokenSwapConstantProduct, Fraction, ZERO_FRACTION
+
+def _total_fee(calculator: TokenSwapConstantProduct) -> Fraction:
+    numerator, denominator = 0, 1
+    for fee in (calculator.trader_fee, calculator.owner_fee):
+        if fee.numerator:
+            numerator = numerator * fee.denominator + fee.numerator * denominator
+            denominator *= fee.denominator
+    return Fraction(numerator, denominator) if numerator else ZERO_FRACTION
+
+
+@dataclass
+class VirtualPool:
+    """
+    恒定乘积路径的等效虚拟池
+    单跳输出可写成 f(dx) = a*dx / (b + c*dx)，多跳复合后形式不变：
+    a = a1*a2, b = b1*b2, c = b2*c1 + a1*c2
+    """
+    a: int
+    b: int
+    c: int
+
+    def then(self, other: 'VirtualPool') -> 'VirtualPool':
+        return VirtualPool(
+            a=self.a * other.a,
+            b=self.b * other.b,
+            c=other.b * self.c + self.a * other.c
+        )
+
+    def get_output_amount(self, amount: int) -> int:
+        return self.a * amount // (self.b + self.c * amount)
+
+    def is_profitable(self, cost: Fraction = ZERO_FRACTION) -> bool:
+        # 零点处边际收益率 a/b 大于单位成本 (1+cost) 时才有正收益
+        return self.a * cost.denominator > self.b * (cost.denominator + cost.numerator)
+
+    def optimal_input(self, cost: Fraction = ZERO_FRACTION) -> int:
+        """
+        最大化 f(dx) - dx*(1+cost) 的输入数额：dx* = (sqrt(a*b/(1+cost)) - b) / c
+        """
+        if self.c <= 0 or not self.is_profitable(cost):
+            return 0
+        k_numerator = cost.denominator + cost.numerator
+        root = math.isqrt(self.a * self.b * cost.denominator // k_numerator)
+        return max(0, (root - self.b) // self.c)
+
+    @classmethod
+    def from_quotes(cls, quote1: Tuple[int, int], quote2: Tuple[int, int]) -> Optional['VirtualPool']:
+        """
+        由同一路径两个(输入, 输出)报价拟合虚拟池：1/y = (b/a)*(1/x) + c/a 对 1/x 是线性的，取 c = 1
+        """
+        (x1, y1), (x2, y2) = quote1, quote2
+        if x1 == x2 or min(x1, x2, y1, y2) <= 0:
+            return None
+        slope = (1 / y1 - 1 / y2) / (1 / x1 - 1 / x2)
+        intercept = 1 / y1 - slope / x1
+        if slope <= 0 or intercept <= 0:
+            return None
+        scale = 10 ** 18
+        a = 1 / intercept
+        return cls(a=int(a * scale), b=int(slope * a * scale), c=scale)
+
+
+@dataclass
+class ConstantProductHop:
+    calculator: TokenSwapConstantProduct
+    reserve_in: int
+    reserve_out: int
+
+    def to_virtual_pool(self) -> VirtualPool:
+        fee = _total_fee(self.calculator)
+        gamma = fee.denominator - fee.numerator
+        return VirtualPool(
+            a=gamma * self.reserve_out,
+            b=fee.denominator * self.reserve_in,
+            c=gamma if self.calculator.fees_on_input else fee.denominator
+        )
+
+    def exchange(self, amount: int) -> int:
+        result = self.calculator.exchange([self.reserve_in, self.reserve_out], amount, 1)
+        return int(result.expected_output_amount)
+
+
+@dataclass
+class SizingResult:
+    amount: int
+    out_amount: int
+    profit: int
+
+
+def compose(hops: List[ConstantProductHop]) -> VirtualPool:
+    pool = hops[0].to_virtual_pool()
+    for hop in hops[1:]:
+        pool = pool.then(hop.to_virtual_pool())
+    return pool
+
+
+def simulate(hops: List[ConstantProductHop], amount: int) -> int:
+    for hop in hops:
+        if amount <= 0:
+            return 0
+        amount = hop.exchange(amount)
+    return amount
+
+
+def optimal_trade_size(hops: List[ConstantProductHop], max_amount: int = None,
+                       cost: Fraction = ZERO_FRACTION, refine_steps: int = 8) -> SizingResult:
+    """
+    计算恒定乘积环路的最优输入数额
+    先用复合虚拟池求解析解，再用各跳真实的 TokenSwapConstantProduct 逐跳验证，
+    并在解析解附近做少量搜索以吸收整数取整误差
+    :param hops: 首尾代币相同的环路各跳
+    :param max_amount: 可用资金上限
+    :param cost: 按输入比例计算的额外成本（如闪电贷手续费）
+    :param refine_steps: 解析解附近的搜索次数
+    """
+    assert hops, '环路为空'
+    pool = compose(hops)
+    amount = pool.optimal_input(cost)
+    if max_amount is not None:
+        amount = min(amount, max_amount)
+    if amount <= 0:
+        return SizingResult(amount=0, out_amount=0, profit=0)
+
+    def evaluate(x: int) -> SizingResult:
+        out_amount = simulate(hops, x)
+        fee = x * cost.numerator // cost.denominator
+        return SizingResult(amount=x, out_amount=out_amount, profit=out_amount - x - fee)
+
+    best = evaluate(amount)
+    step = max(1, amount // 1000)
+    for _ in range(refine_steps):
+        improved = False
+        for x in (best.amount - step, best.amount + step):
+            if x <= 0 or (max_amount is not None and x > max_amount):
+                continue
+            candidate = evaluate(x)
+            if candidate.profit > best.profit:
+                best, improved = candidate, True
+        if not improved:
+            if step == 1:
+                break
+            step = max(1, step // 4)
+    if best.profit <= 0:
+        return SizingResult(amount=0, out_amount=0, profit=0)
+    return best
+
+
+class QuoteSizer:
+    """
+    只能获得整条路径报价（如Jupiter）时的交易数额估计
+    用最近两个不同数额的往返报价拟合虚拟池，下一轮按拟合结果的最优数额报价
+    """
+
+    def __init__(self, max_amount: int, min_amount: int = 1):
+        self.max_amount = max_amount
+        self.min_amount = min(min_amount, max_amount)
+        self._quotes: List[Tuple[int, int]] = []
+
+    def observe(self, amount: int, out_amount: int):
+        if self._quotes and self._quotes[-1][0] == amount:
+            self._quotes[-1] = (amount, out_amount)
+        else:
+            self._quotes = [*self._quotes[-1:], (amount, out_amount)]
+
+    def next_amount(self, cost: Fraction = ZERO_FRACTION) -> int:
+        if len(self._quotes) < 2:
+            # 样本不足时在上限和一半之间交替探测
+            if self._quotes and self._quotes[-1][0] == self.max_amount:
+                return max(self.min_amount, self.max_amount // 2)
+            return self.max_amount
+        pool = VirtualPool.from_quotes(*self._quotes)
+        if pool is None:
+            return self.max_amount
+        return min(self.max_amount, max(self.min_amount, pool.optimal_input(cost)))
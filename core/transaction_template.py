@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 20:40
+@Author     : lkkings
+@FileName:  : transaction_template.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import struct
+from typing import List, Tuple, Dict, Callable, Hashable, Sequence
+
+from solders.address_lookup_table_account import AddressLookupTableAccount
+from solders.hash import Hash
+from solders.instruction import Instruction
+from solders.keypair import Keypair
+from solders.message import MessageV0, to_bytes_versioned
+from solders.transaction import VersionedTransaction
+
+U64 = struct.Struct('<Q')
+# 编译时写入数额位置的占位值，编译后在消息字节中定位
+AMOUNT_PLACEHOLDER = 0x5EA1_0000_0000_0000
+# 系统转账指令 data 中 lamports 的偏移
+TRANSFER_LAMPORTS_OFFSET = 4
+
+# (指令序号, 数额在指令data中的偏移)
+AmountSlot = Tuple[int, int]
+
+
+class TransactionTemplate:
+    """
+    账户集合固定的交易只编译一次，之后每次只改写消息中的区块哈希和数额并重新签名
+    """
+
+    def __init__(self, payer: Keypair, instructions: List[Instruction],
+                 address_lookup_table_accounts: List[AddressLookupTableAccount],
+                 amount_slots: Sequence[AmountSlot] = ()):
+        self.payer = payer
+        instructions = list(instructions)
+        placeholders = []
+        for i, (index, offset) in enumerate(amount_slots):
+            instruction = instructions[index]
+            placeholder = U64.pack(AMOUNT_PLACEHOLDER + i)
+            data = bytes(instruction.data)
+            instructions[index] = Instruction(
+                instruction.program_id, data[:offset] + placeholder + data[offset + U64.size:], instruction.accounts
+            )
+            placeholders.append(placeholder)
+        blockhash = Hash.default()
+        message = MessageV0.try_compile(payer.pubkey(), instructions, address_lookup_table_accounts, blockhash)
+        self._message = bytearray(to_bytes_versioned(message))
+        self._amount_offsets = [self._find(placeholder) for placeholder in placeholders]
+        # v0消息：版本前缀(1) + 消息头(3) + 账户数(compact-u16) + 账户列表，之后是区块哈希
+        self._blockhash_offset = 4 + _compact_u16_size(len(message.account_keys)) + 32 * len(message.account_keys)
+        assert self._message[self._blockhash_offset:self._blockhash_offset + 32] == bytes(blockhash)
+        self._last_key = None
+        self._last_tx = None
+
+    def _find(self, placeholder: bytes) -> int:
+        offset = self._message.find(placeholder)
+        assert offset >= 0 and self._message.find(placeholder, offset + 1) < 0, '数额占位值定位失败'
+        return offset
+
+    def build(self, recent_blockhash: Hash, amounts: Sequence[int] = ()) -> VersionedTransaction:
+        key = (recent_blockhash, tuple(amounts))
+        if key == self._last_key:
+            return self._last_tx
+        message = self._message
+        message[self._blockhash_offset:self._blockhash_offset + 32] = bytes(recent_blockhash)
+        for offset, amount in zip(self._amount_offsets, amounts):
+            U64.pack_into(message, offset, amount)
+        signature = self.payer.sign_message(bytes(message))
+        self._last_key = key
+        self._last_tx = VersionedTransaction.from_bytes(b'\x01' + bytes(signature) + bytes(message))
+        return self._last_tx
+
+
+def _compact_u16_size(value: int) -> int:
+    return 1 if value < 0x80 else 2 if value < 0x4000 else 3
+
+
+class TransactionTemplateCache:
+    """
+    按调用方给定的键缓存交易模板，键应能区分账户集合（例如随机选取的小费账户）
+    """
+
+    def __init__(self):
+        self._templates: Dict[Hashable, TransactionTemplate] = {}
+
+    def get(self, key: Hashable, factory: Callable[[], TransactionTemplate]) -> TransactionTemplate:
+        template = self._templates.get(key)
+        if template is None:
+            template = factory()
+            self._templates[key] = template
+        return template
+
+    def clear(self):
+        self._templates.clear()
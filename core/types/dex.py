@@ -38,6 +38,18 @@ class Route(Serial):
     hop2: Market
 
 
+@dataclass
+class Cycle(Serial):
+    mints: List[str]
+    markets: List[Market]
+    from_a: List[bool]
+    profit_ratio: float
+
+    @property
+    def key(self) -> Tuple[str, ...]:
+        return tuple(market.id for market in self.markets)
+
+
 @dataclass
 class Node(Serial):
     id: str
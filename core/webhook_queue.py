@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 23:20
+@Author     : lkkings
+@FileName:  : webhook_queue.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+import time
+from collections import deque, OrderedDict
+from typing import List, Dict, Any, Callable, Awaitable, Deque, Tuple
+
+from core.constants import WEBHOOK
+from logger import logger
+
+# 消费webhook条目的处理函数，参数为一批交易条目
+WebhookHandler = Callable[[List[Dict]], Awaitable[Any]]
+
+DROP_OLDEST = 'oldest'
+DROP_NEWEST = 'newest'
+
+
+class WebhookQueue:
+    """
+    webhook接收与处理分离：接收端只把条目放入有界环形缓冲区后立即返回，由多个消费协程取出处理
+    按交易签名去重，Helius重试推送的重复交易直接丢弃；缓冲区满时按策略丢弃最旧或最新的条目
+    """
+
+    def __init__(self, handler: WebhookHandler, capacity: int = WEBHOOK.QUEUE_SIZE,
+                 consumers: int = WEBHOOK.CONSUMERS, batch_size: int = WEBHOOK.BATCH_SIZE,
+                 drop_policy: str = WEBHOOK.DROP_POLICY, dedupe_size: int = WEBHOOK.DEDUPE_SIZE):
+        assert drop_policy in (DROP_OLDEST, DROP_NEWEST), f'不支持的丢弃策略{drop_policy}'
+        self.handler = handler
+        self.capacity = capacity
+        self.consumers = consumers
+        self.batch_size = batch_size
+        self.drop_policy = drop_policy
+        self.dedupe_size = dedupe_size
+        # (入队时间, 条目)
+        self._buffer: Deque[Tuple[float, Dict]] = deque()
+        # 最近见过的交易签名，按插入顺序淘汰
+        self._seen: OrderedDict[str, None] = OrderedDict()
+        self._event = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self.received = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+        self.high_water = 0
+        self.max_lag = 0.0
+
+    @property
+    def running(self) -> bool:
+        return len(self._tasks) > 0
+
+    def _is_duplicate(self, item: Dict) -> bool:
+        signature = item.get('signature')
+        return signature is not None and signature in self._seen
+
+    def _remember(self, item: Dict):
+        # 只记录已进入缓冲区的条目，被丢弃的条目重试推送时仍可入队
+        signature = item.get('signature')
+        if signature is None:
+            return
+        self._seen[signature] = None
+        if len(self._seen) > self.dedupe_size:
+            self._seen.popitem(last=False)
+
+    def _forget(self, item: Dict):
+        signature = item.get('signature')
+        if signature is not None:
+            self._seen.pop(signature, None)
+
+    def put(self, data: List[Dict]) -> Dict[str, int]:
+        """
+        同步入队，不等待处理，返回本次接收的条目统计
+        """
+        accepted = duplicates = dropped = 0
+        now = time.monotonic()
+        for item in data:
+            self.received += 1
+            if self._is_duplicate(item):
+                duplicates += 1
+                continue
+            if len(self._buffer) >= self.capacity:
+                dropped += 1
+                if self.drop_policy == DROP_NEWEST:
+                    continue
+                self._forget(self._buffer.popleft()[1])
+            self._buffer.append((now, item))
+            self._remember(item)
+            accepted += 1
+        self.duplicates += duplicates
+        self.dropped += dropped
+        self.high_water = max(self.high_water, len(self._buffer))
+        if dropped:
+            logger.warning(f'webhook缓冲区已满 丢弃{dropped}条({self.drop_policy}) 积压:{len(self._buffer)}')
+        if self._buffer:
+            self._event.set()
+        return {'accepted': accepted, 'duplicates': duplicates, 'dropped': dropped}
+
+    def _take(self) -> List[Dict]:
+        items = []
+        now = time.monotonic()
+        while self._buffer and len(items) < self.batch_size:
+            enqueued_at, item = self._buffer.popleft()
+            self.max_lag = max(self.max_lag, now - enqueued_at)
+            items.append(item)
+        if not self._buffer:
+            self._event.clear()
+        return items
+
+    async def _consume(self):
+        while True:
+            await self._event.wait()
+            items = self._take()
+            if not items:
+                continue
+            try:
+                await self.handler(items)
+                self.processed += len(items)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += len(items)
+                logger.error(f'处理webhook条目失败=>{e}')
+
+    async def _report_stats_task(self):
+        reported = 0
+        while True:
+            await asyncio.sleep(60)
+            if self.received == reported:
+                continue
+            reported = self.received
+            stats = self.stats()
+            self.max_lag = 0.0
+            logger.info(f'webhook队列 接收:{stats["received"]} 处理:{stats["processed"]} 失败:{stats["failed"]} '
+                        f'重复:{stats["duplicates"]} 丢弃:{stats["dropped"]} 积压:{stats["depth"]} '
+                        f'峰值:{stats["high_water"]} 最大延迟:{stats["max_lag_ms"]:.0f}ms')
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'received': self.received,
+            'processed': self.processed,
+            'failed': self.failed,
+            'duplicates': self.duplicates,
+            'dropped': self.dropped,
+            'depth': len(self._buffer),
+            'high_water': self.high_water,
+            'max_lag_ms': self.max_lag * 1000
+        }
+
+    async def start(self):
+        if self.running:
+            return
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.consumers)]
+        self._tasks.append(asyncio.create_task(self._report_stats_task()))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -11,42 +11,156 @@ Change Log  :
 
 """
 import asyncio
+import heapq
+import itertools
+import math
+import time
 from asyncio import Future
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Tuple, Type, Any, Hashable, Optional
+
 from core.base_task import AsyncTask, TaskResp, V
-from core.constants import MAX_THREAD_NUM
+from core.constants import MAX_THREAD_NUM, MAX_PROCESS_NUM, COMPUTE_EXECUTOR
+from logger import logger
+
+# (优先级, 截止时间, 入队顺序, 任务)
+QueueItem = Tuple[int, float, int, AsyncTask]
 
 
 class Worker:
-    def __init__(self, max_thread_num=MAX_THREAD_NUM):
+    """
+    任务调度器
+    每类任务一个队列，按 (优先级, 截止时间, 入队顺序) 出队，同优先级先到期的先执行，无截止时间的按入队顺序执行；
+    同类任务的并发数受 max_concurrency 限制，某类任务达到上限时不阻塞其他类型；
+    超过截止时间仍未开始的任务不再执行，以 TaskExpiredError 结束；
+    coalesce_key 相同的同类任务在等待期间合并为一次执行，所有提交方的 future 由这次执行完成；
+    cpu_bound 任务计算量足够大时计算部分在计算通道中执行，不占用事件循环
+    """
+
+    def __init__(self, max_thread_num=MAX_THREAD_NUM, compute_workers=MAX_PROCESS_NUM,
+                 compute_executor=COMPUTE_EXECUTOR):
+        self.max_thread_num = max_thread_num
+        self.compute_workers = max(1, compute_workers)
+        self.compute_executor_type = compute_executor
+        self._compute_executor: Optional[Executor] = None
         self._running = False
         self._t = None
 
-        self._task_queue = asyncio.PriorityQueue()
-        self._semaphore = asyncio.Semaphore(max_thread_num)
+        self._seq = itertools.count()
+        self._queues: Dict[Type[AsyncTask], List[QueueItem]] = {}
+        self._active: Dict[Type[AsyncTask], int] = {}
+        # (任务类型, 合并键) -> 等待执行的任务
+        self._pending_by_key: Dict[Tuple[Type[AsyncTask], Hashable], AsyncTask] = {}
+        self._wakeup = asyncio.Event()
+        self.expired = 0
+        self.coalesced = 0
 
     @property
     def running(self):
         return self._running
 
+    @property
+    def compute_executor(self) -> Executor:
+        if self._compute_executor is None:
+            if self.compute_executor_type == 'thread':
+                self._compute_executor = ThreadPoolExecutor(self.compute_workers, thread_name_prefix='compute')
+            else:
+                self._compute_executor = ProcessPoolExecutor(self.compute_workers)
+            logger.info(f'启动计算通道 {self.compute_executor_type} x{self.compute_workers}')
+        return self._compute_executor
+
+    def concurrency_limit(self, task_type: Type[AsyncTask]) -> int:
+        return task_type.max_concurrency or self.max_thread_num
+
     def run_task(self, task: AsyncTask[V]) -> Future[TaskResp[V]]:
         future = asyncio.Future()
         task.set_future(future)
-        self._task_queue.put_nowait(task)
+        if task.deadline is None and task.ttl is not None:
+            task.deadline = time.monotonic() + task.ttl
+        key = task.coalesce_key()
+        if key is not None:
+            key = (type(task), key)
+            pending = self._pending_by_key.get(key)
+            if pending is not None:
+                pending.coalesce(task)
+                self.coalesced += 1
+                return future
+            self._pending_by_key[key] = task
+        task.seq = next(self._seq)
+        heapq.heappush(self._queues.setdefault(type(task), []),
+                       (task.priority, self._deadline_key(task), task.seq, task))
+        self._wakeup.set()
         return future
 
+    def _dispatch(self):
+        while True:
+            best = None
+            for task_type, queue in self._queues.items():
+                # 同类任务优先级相同，队首按截止时间排序，过期任务总是先出现在队首
+                self._refresh_head(queue)
+                while queue and queue[0][-1].expired:
+                    task = heapq.heappop(queue)[-1]
+                    self._forget(task)
+                    task.expire()
+                    self.expired += 1
+                    self._refresh_head(queue)
+                if not queue or self._active.get(task_type, 0) >= self.concurrency_limit(task_type):
+                    continue
+                if best is None or queue[0] < self._queues[best][0]:
+                    best = task_type
+            if best is None:
+                return
+            task = heapq.heappop(self._queues[best])[-1]
+            # 开始执行后不再接受合并，之后提交的任务需要基于新的状态执行
+            self._forget(task)
+            self._active[best] = self._active.get(best, 0) + 1
+            _task = asyncio.create_task(task.exec(self.compute_executor if task.cpu_bound else None))
+            _task.add_done_callback(partial(self._on_done, best))
+
+    @staticmethod
+    def _deadline_key(task: AsyncTask) -> float:
+        return math.inf if task.deadline is None else task.deadline
+
+    @classmethod
+    def _refresh_head(cls, queue: List[QueueItem]):
+        """
+        合并只会延长截止时间，堆中记录的截止时间可能早于任务当前的截止时间；
+        队首记录过期时按当前截止时间重新入堆，直到队首记录与任务一致
+        """
+        while queue:
+            priority, deadline, seq, task = queue[0]
+            current = cls._deadline_key(task)
+            if deadline == current:
+                return
+            heapq.heapreplace(queue, (priority, current, seq, task))
+
+    def _forget(self, task: AsyncTask):
+        key = task.coalesce_key()
+        if key is not None and self._pending_by_key.get((type(task), key)) is task:
+            del self._pending_by_key[(type(task), key)]
+
+    def _on_done(self, task_type: Type[AsyncTask], _future):
+        self._active[task_type] -= 1
+        self._wakeup.set()
+
     async def run(self):
         self._running = True
         while self._running:
-            task = await self._task_queue.get()
-            if task is None:
-                break
-
-            def callback(_future):
-                self._semaphore.release()
+            self._wakeup.clear()
+            try:
+                self._dispatch()
+            except Exception as e:
+                logger.error(f'调度任务错误=>{e}')
+            await self._wakeup.wait()
 
-            await self._semaphore.acquire()
-            _task = asyncio.create_task(task.exec())
-            _task.add_done_callback(callback)
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued': {task_type.__name__: len(queue) for task_type, queue in self._queues.items()},
+            'active': {task_type.__name__: count for task_type, count in self._active.items()},
+            'expired': self.expired,
+            'coalesced': self.coalesced
+        }
 
     async def start(self):
         self._t = asyncio.create_task(self.run())
@@ -56,8 +170,11 @@ class Worker:
 
     async def stop(self):
         self._running = False
-        await self._task_queue.put(None)
+        self._wakeup.set()
         await self.join()
+        if self._compute_executor is not None:
+            self._compute_executor.shutdown(wait=False, cancel_futures=True)
+            self._compute_executor = None
 
 
 worker = Worker()
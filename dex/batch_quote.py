@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 10:12
+@Author     : lkkings
+@FileName:  : batch_quote.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Callable, Iterable, Optional, Tuple
+
+import numpy as np
+
+from core.base_amm import Amm
+from core.math import TokenSwapConstantProduct
+from core.types.dex import Market
+
+# float64 预筛后按Pool逐跳精确复算的候选路由数
+EXACT_CANDIDATES = 4
+
+
+def exchange_reserves(reserve_a: np.ndarray, reserve_b: np.ndarray, fee_rate: np.ndarray, valid: np.ndarray,
+                      from_a: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+    """
+    按逐行给定的储备和费率批量ExactIn报价，不可报价的行输出为0
+    float64 计算，储备超过2^53时与 TokenSwapConstantProduct.exchange 的整数结果存在误差，只用于筛选候选路由
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    pool_input = np.where(from_a, reserve_a, reserve_b)
+    pool_output = np.where(from_a, reserve_b, reserve_a)
+    fees = np.floor(amounts * fee_rate)
+    fees = np.where((fees == 0) & (fee_rate > 0), 1, fees)
+    net_amounts = amounts - fees
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.floor(pool_output * net_amounts / (pool_input + net_amounts))
+    out = np.where(valid & (amounts > 0) & np.isfinite(out), out, 0)
+    return np.maximum(out, 0)
+
+
+@dataclass
+class ReserveSlice:
+    """
+    按行号取出的储备副本，不引用 BatchQuoter，可以交给计算通道报价
+    """
+    reserve_a: np.ndarray
+    reserve_b: np.ndarray
+    fee_rate: np.ndarray
+    valid: np.ndarray
+    # 不能向量报价、需按Pool逐个报价的行
+    fallback: np.ndarray
+
+    def __len__(self):
+        return len(self.valid)
+
+    def exchange(self, from_a: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+        return exchange_reserves(self.reserve_a, self.reserve_b, self.fee_rate, self.valid, from_a, amounts)
+
+
+@dataclass
+class RouteChoice:
+    # 各跳的市场行号和方向，直连路由只有一跳
+    rows: Tuple[int, ...]
+    from_a: Tuple[bool, ...]
+    # amounts[i] 为第i跳的输入，amounts[i + 1] 为其输出；未报价的候选只有输入
+    amounts: Tuple[int, ...]
+
+    @property
+    def out_amount(self) -> int:
+        return self.amounts[-1]
+
+
+@dataclass
+class RouteCandidates:
+    """
+    一个方向上的直连及2跳候选路由和所需储备的快照，选路只依赖快照
+    """
+    direct_rows: np.ndarray
+    direct_from_a: np.ndarray
+    direct: ReserveSlice
+    hop1_rows: np.ndarray
+    hop1_from_a: np.ndarray
+    hop1: ReserveSlice
+    hop2_rows: np.ndarray
+    hop2_from_a: np.ndarray
+    hop2: ReserveSlice
+
+    def __len__(self):
+        return len(self.direct_rows) + len(self.hop1_rows)
+
+    @property
+    def valid(self) -> np.ndarray:
+        return np.concatenate([self.direct.valid, self.hop1.valid & self.hop2.valid])
+
+    @property
+    def fallback(self) -> np.ndarray:
+        """
+        至少一跳不能向量报价、其余跳可以报价的候选
+        """
+        hop_fallback = (self.hop1.valid | self.hop1.fallback) & (self.hop2.valid | self.hop2.fallback) \
+            & (self.hop1.fallback | self.hop2.fallback)
+        return np.concatenate([self.direct.fallback, hop_fallback])
+
+    def quote(self, amount: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :return: (直连输出, 2跳中间输出, 2跳输出)
+        """
+        direct_out = self.direct.exchange(self.direct_from_a, np.full(len(self.direct_rows), amount, dtype=np.float64))
+        intermediate_out = self.hop1.exchange(self.hop1_from_a, np.full(len(self.hop1_rows), amount, dtype=np.float64))
+        return direct_out, intermediate_out, self.hop2.exchange(self.hop2_from_a, intermediate_out)
+
+    def _choice(self, index: int, amounts: Tuple[int, ...]) -> RouteChoice:
+        if index < len(self.direct_rows):
+            return RouteChoice((int(self.direct_rows[index]),), (bool(self.direct_from_a[index]),), amounts)
+        index -= len(self.direct_rows)
+        return RouteChoice((int(self.hop1_rows[index]), int(self.hop2_rows[index])),
+                           (bool(self.hop1_from_a[index]), bool(self.hop2_from_a[index])), amounts)
+
+    def rank(self, amount: int, lowest: bool = False, limit: int = EXACT_CANDIDATES) -> List[RouteChoice]:
+        """
+        按float64输出排序的前 limit 条可向量报价的路由，输出最高(lowest为True时最低)的在前
+        """
+        direct_out, intermediate_out, route_out = self.quote(amount)
+        outs = np.concatenate([direct_out, route_out])
+        intermediates = np.concatenate([np.zeros(len(direct_out)), intermediate_out])
+        valid = self.valid
+        if not lowest:
+            valid &= outs > 0
+        candidates = np.flatnonzero(valid)
+        order = np.argsort(outs[candidates] if lowest else -outs[candidates], kind='stable')[:limit]
+        choices = []
+        for index in candidates[order].tolist():
+            amounts = (amount, int(outs[index])) if index < len(self.direct_rows) \
+                else (amount, int(intermediates[index]), int(outs[index]))
+            choices.append(self._choice(index, amounts))
+        return choices
+
+    def fallback_choices(self, amount: int) -> List[RouteChoice]:
+        """
+        需要按Pool逐跳报价的候选路由，只带输入数额
+        """
+        return [self._choice(index, (amount,)) for index in np.flatnonzero(self.fallback).tolist()]
+
+
+class BatchQuoter:
+    """
+    恒定乘积池批量报价
+    从每个Amm快照储备到数组中，一次向量化计算N个(池, 方向, 数额)的输出，
+    float64 结果用于筛选候选路由，最终数额由 DexLander 按Pool逐跳精确复算；
+    不是输入端收费的恒定乘积池标记为 fallback，由 DexLander 按Pool报价参与选路
+    """
+
+    def __init__(self):
+        self.market_ids: List[str] = []
+        self.market_rows: Dict[str, int] = {}
+        self._mint_a: List[str] = []
+        self.reserve_a = np.zeros(0, dtype=np.float64)
+        self.reserve_b = np.zeros(0, dtype=np.float64)
+        self.fee_rate = np.zeros(0, dtype=np.float64)
+        self.quotable = np.zeros(0, dtype=bool)
+        self.fallback = np.zeros(0, dtype=bool)
+
+    def __len__(self):
+        return len(self.market_ids)
+
+    def build(self, markets: Iterable[Market], get_pool: Callable[[str], Optional[Amm]]):
+        self.market_ids, self.market_rows, self._mint_a = [], {}, []
+        for market in markets:
+            if market.id in self.market_rows:
+                continue
+            self.market_rows[market.id] = len(self.market_ids)
+            self.market_ids.append(market.id)
+            self._mint_a.append(market.tokenMintA)
+        size = len(self.market_ids)
+        self.reserve_a = np.zeros(size, dtype=np.float64)
+        self.reserve_b = np.zeros(size, dtype=np.float64)
+        self.fee_rate = np.zeros(size, dtype=np.float64)
+        self.quotable = np.zeros(size, dtype=bool)
+        self.fallback = np.zeros(size, dtype=bool)
+        for market_id in self.market_ids:
+            amm = get_pool(market_id)
+            if amm is not None:
+                self.update_pool(amm)
+
+    def update_pool(self, amm: Amm):
+        row = self.market_rows.get(amm.id)
+        if row is None:
+            return
+        calculator = getattr(amm, 'calculator', None)
+        coin_reserve = getattr(amm, 'coin_reserve', None)
+        pc_reserve = getattr(amm, 'pc_reserve', None)
+        tradeable = bool(getattr(amm, 'is_tradeable', False))
+        vectorizable = isinstance(calculator, TokenSwapConstantProduct) and calculator.fees_on_input
+        self.fallback[row] = tradeable and not vectorizable
+        if not vectorizable or not coin_reserve or not pc_reserve or not tradeable:
+            self.quotable[row] = False
+            return
+        if str(amm.coin_mint) == self._mint_a[row]:
+            self.reserve_a[row], self.reserve_b[row] = coin_reserve, pc_reserve
+        else:
+            self.reserve_a[row], self.reserve_b[row] = pc_reserve, coin_reserve
+        fee_rate = 0.0
+        for fee in (calculator.trader_fee, calculator.owner_fee):
+            if fee.numerator:
+                fee_rate += fee.numerator / fee.denominator
+        self.fee_rate[row] = fee_rate
+        self.quotable[row] = True
+
+    def update_pools(self, amms: Iterable[Amm]):
+        for amm in amms:
+            self.update_pool(amm)
+
+    def rows_for(self, markets: List[Market]) -> np.ndarray:
+        return np.fromiter((self.market_rows.get(market.id, -1) for market in markets),
+                           dtype=np.int64, count=len(markets))
+
+    def valid(self, rows: np.ndarray) -> np.ndarray:
+        mask = rows >= 0
+        mask[mask] = self.quotable[rows[mask]]
+        return mask
+
+    def slice(self, rows: np.ndarray) -> ReserveSlice:
+        """
+        :param rows: 市场行号（rows_for获得），-1表示未知市场
+        """
+        valid = self.valid(rows)
+        safe_rows = np.where(valid, rows, 0)
+        fallback = rows >= 0
+        fallback[fallback] = self.fallback[rows[fallback]]
+        return ReserveSlice(self.reserve_a[safe_rows], self.reserve_b[safe_rows], self.fee_rate[safe_rows], valid,
+                            fallback)
+
+    def exchange(self, rows: np.ndarray, from_a: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+        """
+        批量ExactIn报价
+        :param rows: 市场行号（rows_for获得），-1表示未知市场
+        :param from_a: True表示输入为市场的tokenMintA
+        :param amounts: 输入数额
+        :return: float64数组，元素为整数值的输出数额，不可报价的行输出为0
+        """
+        return self.slice(rows).exchange(from_a, amounts)
+
+    def exchange_2_hop(self, hop1_rows: np.ndarray, hop1_from_a: np.ndarray,
+                       hop2_rows: np.ndarray, hop2_from_a: np.ndarray,
+                       amounts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        intermediate = self.exchange(hop1_rows, hop1_from_a, amounts)
+        return intermediate, self.exchange(hop2_rows, hop2_from_a, intermediate)
+
+
+batch_quoter = BatchQuoter()
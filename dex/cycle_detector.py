@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 15:20
+@Author     : lkkings
+@FileName:  : cycle_detector.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import math
+import time
+from typing import Dict, List, Tuple, Iterable, Callable, Optional
+
+import numpy as np
+
+from core.types.dex import Cycle
+from dex.batch_quote import batch_quoter
+from dex.route_index import route_index, expand_rows
+from logger import logger
+
+CycleListener = Callable[[List[Cycle]], None]
+
+
+def rotate_cycle(cycle: Cycle, mint: str) -> Optional[Cycle]:
+    """
+    旋转环路使其从指定代币开始，环路不经过该代币时返回None
+    """
+    if mint not in cycle.mints[:-1]:
+        return None
+    i = cycle.mints.index(mint)
+    mints = cycle.mints[:-1]
+    return Cycle(
+        mints=[*mints[i:], *mints[:i], mint],
+        markets=[*cycle.markets[i:], *cycle.markets[:i]],
+        from_a=[*cycle.from_a[i:], *cycle.from_a[:i]],
+        profit_ratio=cycle.profit_ratio
+    )
+
+
+class CycleDetector:
+    """
+    代币-市场图上的套利环路检测
+    边权重为 -log(扣除手续费后的边际价格)，负权环即套利机会。
+    Pool更新时只重算受影响边的权重，并从这些边出发做限跳数的Bellman-Ford搜索经过它们的环路
+    """
+
+    def __init__(self, max_legs: int = 4, min_profit_bps: int = 10):
+        self.max_legs = max_legs
+        self.threshold = -math.log(1 + min_profit_bps / 10000)
+        self.edge_src = np.zeros(0, dtype=np.int32)
+        self.edge_weight = np.zeros(0, dtype=np.float64)
+        self.market_edges = np.zeros((0, 2), dtype=np.int64)
+        self.cycles: Dict[Tuple[str, ...], Cycle] = {}
+        self._listeners: List[CycleListener] = []
+
+    def add_listener(self, listener: CycleListener):
+        self._listeners.append(listener)
+
+    def build(self):
+        # 边与 route_index 邻接表一一对应：第e条边为 edge_src[e] -> adj_mint[e]，经过市场 adj_market[e]
+        degrees = np.diff(route_index.adj_indptr)
+        self.edge_src = np.repeat(np.arange(len(route_index.mints), dtype=np.int32), degrees)
+        self.edge_weight = np.full(len(self.edge_src), np.inf)
+        self.market_edges = np.full((len(route_index.markets), 2), -1, dtype=np.int64)
+        edges = np.arange(len(self.edge_src))
+        first = route_index.market_mint_a[route_index.adj_market] == self.edge_src
+        self.market_edges[route_index.adj_market[first], 0] = edges[first]
+        self.market_edges[route_index.adj_market[~first], 1] = edges[~first]
+        self.cycles = {}
+        self._reweight(edges)
+
+    def _reweight(self, edges: np.ndarray):
+        if len(edges) == 0:
+            return
+        markets = route_index.adj_market[edges]
+        from_a = route_index.market_mint_a[markets] == self.edge_src[edges]
+        reserve_a = batch_quoter.reserve_a[markets]
+        reserve_b = batch_quoter.reserve_b[markets]
+        reserve_in = np.where(from_a, reserve_a, reserve_b)
+        reserve_out = np.where(from_a, reserve_b, reserve_a)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            price = (1 - batch_quoter.fee_rate[markets]) * reserve_out / reserve_in
+            weight = -np.log(price)
+        valid = batch_quoter.quotable[markets] & (reserve_in > 0) & (reserve_out > 0) & np.isfinite(weight)
+        self.edge_weight[edges] = np.where(valid, weight, np.inf)
+
+    def on_pools_updated(self, market_rows: Iterable[int]) -> List[Cycle]:
+        rows = np.fromiter(market_rows, dtype=np.int64)
+        rows = rows[(rows >= 0) & (rows < len(self.market_edges))]
+        if len(rows) == 0:
+            return []
+        start_time = time.time()
+        edges = self.market_edges[rows].ravel()
+        edges = edges[edges >= 0]
+        self._reweight(edges)
+        updated = {route_index.markets[row].id for row in rows.tolist()}
+        for key in [key for key in self.cycles if updated.intersection(key)]:
+            del self.cycles[key]
+        found: Dict[Tuple[str, ...], Cycle] = {}
+        for edge in edges.tolist():
+            for cycle in self.search_edge(edge):
+                found[cycle.key] = cycle
+        self.cycles.update(found)
+        cycles = list(found.values())
+        logger.debug(f'重算 {len(edges)} 条边，发现 {len(cycles)} 个套利环路，耗时 {(time.time() - start_time) * 1000:.2f}ms')
+        if cycles:
+            for listener in self._listeners:
+                listener(cycles)
+        return cycles
+
+    def search_edge(self, edge: int) -> List[Cycle]:
+        """
+        搜索经过边 u -> v 的负权环：从v出发做 max_legs-1 层Bellman-Ford，每层检查能否回到u
+        """
+        w0 = self.edge_weight[edge]
+        if not np.isfinite(w0):
+            return []
+        u, v = int(self.edge_src[edge]), int(route_index.adj_mint[edge])
+        dist = np.full(len(route_index.mints), np.inf)
+        dist[v] = 0
+        frontier = np.asarray([v], dtype=np.int64)
+        preds: List[np.ndarray] = []
+        cycles = []
+        for _ in range(1, self.max_legs):
+            candidates = expand_rows(route_index.adj_indptr, frontier)
+            if len(candidates) == 0:
+                break
+            cost = dist[self.edge_src[candidates]] + self.edge_weight[candidates]
+            targets = route_index.adj_mint[candidates]
+            new_dist = np.full(len(dist), np.inf)
+            np.minimum.at(new_dist, targets, cost)
+            pred = np.full(len(dist), -1, dtype=np.int64)
+            hit = np.isfinite(cost) & (cost == new_dist[targets])
+            pred[targets[hit]] = candidates[hit]
+            preds.append(pred)
+            dist = new_dist
+            if dist[u] + w0 < self.threshold:
+                cycle = self._reconstruct(edge, u, preds, dist[u] + w0)
+                if cycle is not None:
+                    cycles.append(cycle)
+            frontier = np.flatnonzero(np.isfinite(dist))
+        return cycles
+
+    def _reconstruct(self, edge: int, u: int, preds: List[np.ndarray], weight: float) -> Optional[Cycle]:
+        path = []
+        node = u
+        for pred in reversed(preds):
+            e = int(pred[node])
+            if e < 0:
+                return None
+            path.append(e)
+            node = int(self.edge_src[e])
+        edges = [edge, *reversed(path)]
+        mints = [int(self.edge_src[e]) for e in edges]
+        markets = [int(route_index.adj_market[e]) for e in edges]
+        # 分层松弛可能产生重复代币或市场的路径，只保留简单环
+        if len(set(mints)) != len(mints) or len(set(markets)) != len(markets):
+            return None
+        return Cycle(
+            mints=[route_index.mints[i] for i in [*mints, u]],
+            markets=[route_index.markets[i] for i in markets],
+            from_a=[bool(route_index.market_mint_a[m] == s) for m, s in zip(markets, mints)],
+            profit_ratio=math.exp(-weight)
+        )
+
+
+cycle_detector = CycleDetector()
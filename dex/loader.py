@@ -11,7 +11,7 @@ Change Log  :
 
 """
 import asyncio
-from typing import List, Dict, Set, Tuple
+from typing import List, Dict, Set, Tuple, Callable, Optional
 import os.path as osp
 
 from solders.instruction import AccountMeta
@@ -19,30 +19,45 @@ from solders.pubkey import Pubkey
 from anchorpy import Idl, Program, Context, Provider
 from spl.token.constants import TOKEN_PROGRAM_ID
 
+from clients.jupiter import jupiter_client
 from clients.rpc import connection
 from core.base_amm import Amm
+from core.account_store import account_store
 from core.base_dex import Dex
 from core.constants import SwapMode, BASE_MINT, DATA_PATH, JUPITER
+from core.math import TokenSwapConstantProduct
+from core.sizing import ConstantProductHop
 from core.types.dex import Market, Route, AccountInfo, QuoteParams, SwapRoute, TradeOutputOverride, SwapParams, \
-    SwapLegType
-from dex.market_graph import market_graph
+    SwapLegType, Cycle, AccountInfoMap
+from dex.batch_quote import batch_quoter, RouteCandidates, RouteChoice
+from dex.cycle_detector import cycle_detector
+from dex.route_index import route_index
 from logger import logger
 from wallet import Wallet
 
+# 参数为本次状态发生变化的Pool
+PoolsHandler = Callable[[List[Amm]], None]
+
 
 class DexLander:
 
     def __init__(self):
         self.base_mint = str(BASE_MINT)
         self.dexs: List[Dex] = []
-        self.route_cache: Dict[str, List[Route]] = {}
 
         self._wallet: Wallet | None = None
         self._update_account_amms_ref: Dict[str, Set[Amm]] = {}
+        self._pools_handlers: List[PoolsHandler] = []
+        # (分片序号, 分片数)，未分片时为None
+        self.shard: Tuple[int, int] | None = None
 
     def bind_wallet(self, wallet: Wallet):
         self._wallet = wallet
 
+    def bind_shard(self, index: int, count: int):
+        assert 0 <= index < count, f'分片序号 {index} 超出范围'
+        self.shard = (index, count)
+
     @property
     def wallet(self):
         return self._wallet
@@ -50,9 +65,25 @@ class DexLander:
     async def initialize(self):
         assert self.dexs, '未发现DEX交易所'
         assert self._wallet, f'请先绑定交易钱包'
+        for dex in self.dexs:
+            dex.shard = self.shard
         await asyncio.wait([dex.initialize() for dex in self.dexs])
+        route_index.build(self.get_all_markets(), [self.base_mint])
+        batch_quoter.build(route_index.markets, self.get_pool)
+        cycle_detector.build()
         await self._wallet.initialize()
 
+    async def prepare(self):
+        """
+        分片模式下由路由进程调用，各分片进程启动前准备好共享的启动快照
+        """
+        assert self.dexs, '未发现DEX交易所'
+        for dex in self.dexs:
+            await dex.prepare_snapshot()
+
+    def add_pools_handler(self, handler: PoolsHandler):
+        self._pools_handlers.append(handler)
+
     def get_all_amm_by_update_account(self, update_accounts: List[str]) -> List[Amm]:
         if len(self._update_account_amms_ref) == 0:
             for amm in self.get_all_pools():
@@ -74,35 +105,86 @@ class DexLander:
         return markets
 
     def get_all_2_hop_routes(self, source_mint: str, destination_mint: str) -> List[Route]:
-        cache_key = f"{source_mint}-{destination_mint}"
-        cache_key_reverse = f"{destination_mint}-{source_mint}"
-
-        if cache_key in self.route_cache:
-            logger.debug(f"命中路由缓存 {cache_key}")
-            return self.route_cache[cache_key]
+        hop1, hop2, _ = route_index.get_2_hop_routes(
+            route_index.mint_id(source_mint), route_index.mint_id(destination_mint)
+        )
+        return [Route(route_index.markets[i], route_index.markets[j]) for i, j in zip(hop1.tolist(), hop2.tolist())]
 
-        source_neighbours = market_graph.get_neighbours(source_mint)
-        dest_neighbours = market_graph.get_neighbours(destination_mint)
-        if len(source_neighbours) < len(dest_neighbours):
-            intersections = source_neighbours.intersection(dest_neighbours)
-        else:
-            intersections = dest_neighbours.intersection(source_neighbours)
-
-        routes = []
-        routes_reverse = []
-
-        for intersection in intersections:
-            hop1 = market_graph.get_markets(source_mint, intersection)
-            hop2 = market_graph.get_markets(intersection, destination_mint)
+    def get_route_candidates(self, source_mint: str, destination_mint: str) -> RouteCandidates:
+        """
+        source_mint => destination_mint 的候选路由及储备快照
+        """
+        source = route_index.mint_id(source_mint)
+        destination = route_index.mint_id(destination_mint)
+        direct_rows = route_index.get_direct_markets(source, destination)
+        hop1_rows, hop2_rows, intermediates = route_index.get_2_hop_routes(source, destination)
+        return RouteCandidates(
+            direct_rows=direct_rows,
+            direct_from_a=route_index.market_mint_a[direct_rows] == source,
+            direct=batch_quoter.slice(direct_rows),
+            hop1_rows=hop1_rows,
+            hop1_from_a=route_index.market_mint_a[hop1_rows] == source,
+            hop1=batch_quoter.slice(hop1_rows),
+            hop2_rows=hop2_rows,
+            hop2_from_a=route_index.market_mint_a[hop2_rows] == intermediates,
+            hop2=batch_quoter.slice(hop2_rows)
+        )
+
+    @staticmethod
+    def get_choice_swap_routes(choice: RouteChoice) -> List[SwapRoute]:
+        """
+        将候选路由中选出的路由转换为交换路由
+        """
+        return [
+            SwapRoute(
+                market=route_index.markets[row],
+                fromA=from_a,
+                trade_output_override=TradeOutputOverride(
+                    in_=choice.amounts[i],
+                    estimated_out=choice.amounts[i + 1]
+                )
+            )
+            for i, (row, from_a) in enumerate(zip(choice.rows, choice.from_a))
+        ]
 
-            for hop1_market in hop1:
-                for hop2_market in hop2:
-                    routes.append(Route(hop1_market, hop2_market))
-                    routes_reverse.append(Route(hop2_market, hop1_market))
+    def quote_choice(self, choice: RouteChoice, amount: int) -> Optional[RouteChoice]:
+        """
+        按Pool逐跳精确报价候选路由，Pool已移除或不可报价时返回None
+        """
+        amounts = [amount]
+        for row, from_a in zip(choice.rows, choice.from_a):
+            market = route_index.markets[row]
+            try:
+                out_amount = self.get_out_amount_market(market, market.tokenMintA if from_a else market.tokenMintB,
+                                                        amounts[-1])
+            except Exception:
+                return None
+            amounts.append(int(out_amount))
+        return RouteChoice(choice.rows, choice.from_a, tuple(amounts))
+
+    def resolve_choice(self, choices: List[RouteChoice], amount: int, lowest: bool = False) -> Optional[RouteChoice]:
+        """
+        对预筛出的候选路由逐跳精确报价，返回输出最高(lowest为True时最低)的路由
+        """
+        quoted = [choice for choice in (self.quote_choice(choice, amount) for choice in choices) if choice is not None]
+        if not lowest:
+            quoted = [choice for choice in quoted if choice.out_amount > 0]
+        if not quoted:
+            return None
+        return (min if lowest else max)(quoted, key=lambda choice: choice.out_amount)
+
+    def select_route(self, candidates: RouteCandidates, amount: int, lowest: bool = False) -> Optional[RouteChoice]:
+        """
+        向量报价预筛出前几条路由，连同不能向量报价的候选一起精确复算后选出最终路由
+        """
+        return self.resolve_choice([*candidates.rank(amount, lowest), *candidates.fallback_choices(amount)],
+                                   amount, lowest)
 
-        self.route_cache[cache_key] = routes
-        self.route_cache[cache_key_reverse] = routes_reverse
-        return routes
+    def _select_route(self, source_mint: str, destination_mint: str, amount: int, lowest: bool) -> List[SwapRoute]:
+        candidates = self.get_route_candidates(source_mint, destination_mint)
+        choice = self.select_route(candidates, amount, lowest)
+        assert choice is not None, f'未发现{source_mint}=>{destination_mint}的交易路线'
+        return self.get_choice_swap_routes(choice)
 
     def get_most_height_value_route(self, source_mint: str, destination_mint: str, amount: int) -> List[SwapRoute]:
         """
@@ -112,109 +194,10 @@ class DexLander:
         :param destination_mint:
         :return:
         """
-        best_height_estimated_out = 0
-        markets = self.get_markets_for_pair(source_mint, destination_mint)
-        swap_routes = None
-        for market in markets:
-            out_amount = self.get_out_amount_market(
-                market, source_mint, amount
-            )
-            if out_amount > best_height_estimated_out:
-                swap_routes = [
-                    SwapRoute(
-                        market=market,
-                        fromA=source_mint == market.tokenMintA,
-                        trade_output_override=TradeOutputOverride(
-                            in_=amount,
-                            estimated_out=out_amount
-                        )
-                    )
-                ]
-                best_height_estimated_out = out_amount
-        routes = self.get_all_2_hop_routes(source_mint, destination_mint)
-        for route in routes:
-            intermediate_out_amount = self.get_out_amount_market(
-                route.hop1, source_mint, amount
-            )
-            is_source_mint = route.hop1.tokenMintA == source_mint
-            intermediate_mint = route.hop1.tokenMintB if is_source_mint else route.hop1.tokenMintA
-            out_amount = self.get_out_amount_market(
-                route.hop2, intermediate_mint, intermediate_out_amount
-            )
-            if out_amount > best_height_estimated_out:
-                swap_routes = [
-                    SwapRoute(
-                        market=route.hop1,
-                        fromA=is_source_mint,
-                        trade_output_override=TradeOutputOverride(
-                            in_=amount,
-                            estimated_out=intermediate_out_amount
-                        )
-                    ),
-                    SwapRoute(
-                        market=route.hop2,
-                        fromA=intermediate_mint == route.hop2.tokenMintA,
-                        trade_output_override=TradeOutputOverride(
-                            in_=intermediate_out_amount,
-                            estimated_out=out_amount
-                        )
-                    )
-                ]
-                best_height_estimated_out = out_amount
-            assert swap_routes, f'未发现{source_mint}=>{destination_mint}的交易路线'
-            return swap_routes
+        return self._select_route(source_mint, destination_mint, amount, lowest=False)
 
     def get_most_low_value_route(self, source_mint: str, destination_mint: str, amount: int) -> List[SwapRoute]:
-        best_low_estimated_out, swap_routes = float("inf"), None
-        markets = self.get_markets_for_pair(source_mint, destination_mint)
-        for market in markets:
-            out_amount = self.get_out_amount_market(
-                market, source_mint, amount
-            )
-            if out_amount < best_low_estimated_out:
-                swap_routes = [
-                    SwapRoute(
-                        market=market,
-                        fromA=source_mint == market.tokenMintA,
-                        trade_output_override=TradeOutputOverride(
-                            in_=amount,
-                            estimated_out=out_amount
-                        )
-                    )
-                ]
-                best_low_estimated_out = out_amount
-        routes = self.get_all_2_hop_routes(source_mint, destination_mint)
-        for route in routes:
-            out_amount1 = self.get_out_amount_market(
-                route.hop1, source_mint, amount
-            )
-            is_source_mint = route.hop1.tokenMintA == source_mint
-            intermediate_mint = route.hop1.tokenMintB if is_source_mint else route.hop1.tokenMintA
-            out_amount2 = self.get_out_amount_market(
-                route.hop2, intermediate_mint, out_amount1
-            )
-            if out_amount2 < best_low_estimated_out:
-                swap_routes = [
-                    SwapRoute(
-                        market=route.hop1,
-                        fromA=is_source_mint,
-                        trade_output_override=TradeOutputOverride(
-                            in_=amount,
-                            estimated_out=out_amount1
-                        )
-                    ),
-                    SwapRoute(
-                        market=route.hop2,
-                        fromA=intermediate_mint == route.hop2.tokenMintA,
-                        trade_output_override=TradeOutputOverride(
-                            in_=out_amount1,
-                            estimated_out=out_amount2
-                        )
-                    )
-                ]
-                best_low_estimated_out = out_amount2
-            assert swap_routes, f'未发现{source_mint}=>{destination_mint}的交易对'
-            return swap_routes
+        return self._select_route(source_mint, destination_mint, amount, lowest=True)
 
     def get_out_amount_route(self, route: Route, source_mint: str, amount: int):
         amount = self.get_pool(route.hop1.id).get_quote(QuoteParams(
@@ -241,23 +224,81 @@ class DexLander:
     def get_value_mint_amount(self, mint: str, amount: int, is_negative=True) -> int:
         if mint == self.base_mint or mint == 0:
             return amount
-        values = []
-        markets = self.get_markets_for_pair(mint, self.base_mint)
-        for market in markets:
+        candidates = self.get_route_candidates(mint, self.base_mint)
+        choice = self.select_route(candidates, amount, lowest=is_negative)
+        return 0 if choice is None else choice.out_amount
+
+    def apply_account_updates(self, account_info_map: AccountInfoMap, slot: int) -> List[Amm]:
+        """
+        将同一slot观察到的账户数据写入 account_store，并更新数据发生变化的Pool
+        旧slot或内容未变的账户不会触发更新，多个Pool共享的账户只写入一次
+        """
+        changed_accounts = account_store.write_many(account_info_map, slot)
+        updated_amms = []
+        for amm in set(self.get_all_amm_by_update_account(changed_accounts)):
+            amm_account_info_map: AccountInfoMap = {}
+            for account_for_update in amm.accounts_for_update:
+                record = account_store.get(account_for_update)
+                if record is not None:
+                    amm_account_info_map[account_for_update] = record
+            if len(amm_account_info_map) != len(amm.accounts_for_update):
+                continue
             try:
-                values.append(self.get_out_amount_market(market, mint, amount))
+                amm.update(amm_account_info_map)
             except Exception as e:
-                logger.warning(e)
-        routes = self.get_all_2_hop_routes(mint, self.base_mint)
-        for route in routes:
+                logger.error(f'更新Pool {amm.id} 错误=>{e}')
+                continue
+            amm.is_initialized = True
+            updated_amms.append(amm)
+        self.notify_pools_updated(updated_amms)
+        return updated_amms
+
+    def notify_pools_updated(self, amms: List[Amm]):
+        batch_quoter.update_pools(amms)
+        jupiter_client.quote_cache.invalidate(amm.id for amm in amms)
+        cycle_detector.on_pools_updated(
+            batch_quoter.market_rows[amm.id] for amm in amms if amm.id in batch_quoter.market_rows
+        )
+        for handler in self._pools_handlers:
             try:
-                values.append(self.get_out_amount_route(route, mint, amount))
+                handler(amms)
             except Exception as e:
-                logger.warning(e)
-        if len(values) == 0:
-            return 0
-        else:
-            return min(values) if is_negative else max(values)
+                logger.error(f'处理Pool更新错误=>{e}')
+
+    def get_cycle_swap_routes(self, cycle: Cycle, amount: int, out_amounts: List[int] = None) -> List[SwapRoute]:
+        """
+        按环路逐跳精确报价，生成与环路市场一一对应的交换路由
+        :param out_amounts: 已算出的各跳输出，指定时不再报价
+        """
+        swap_routes = []
+        for i, (market, source_mint, from_a) in enumerate(zip(cycle.markets, cycle.mints, cycle.from_a)):
+            if out_amounts is not None:
+                out_amount = out_amounts[i]
+            else:
+                out_amount = int(self.get_out_amount_market(market, source_mint, amount))
+            swap_routes.append(SwapRoute(
+                market=market,
+                fromA=from_a,
+                trade_output_override=TradeOutputOverride(in_=amount, estimated_out=out_amount)
+            ))
+            amount = out_amount
+        return swap_routes
+
+    def get_cycle_hops(self, cycle: Cycle) -> List[ConstantProductHop]:
+        """
+        环路各跳的恒定乘积参数，用于计算最优交易数额
+        """
+        hops = []
+        for market, source_mint in zip(cycle.markets, cycle.mints):
+            amm = self.get_pool(market.id)
+            calculator = getattr(amm, 'calculator', None)
+            assert isinstance(calculator, TokenSwapConstantProduct) and amm.coin_reserve and amm.pc_reserve, \
+                f'Pool {market.id} 不是可计算的恒定乘积池'
+            if str(amm.coin_mint) == source_mint:
+                hops.append(ConstantProductHop(calculator, amm.coin_reserve, amm.pc_reserve))
+            else:
+                hops.append(ConstantProductHop(calculator, amm.pc_reserve, amm.coin_reserve))
+        return hops
 
     def get_pool(self, pool_id: str) -> Amm:
         for dex in self.dexs:
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 21:40
+@Author     : lkkings
+@FileName:  : local_quote.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+import time
+from collections import deque
+from typing import List, Optional, Tuple, Deque
+
+from clients.jupiter import jupiter_client
+from core.base_amm import Amm
+from core.constants import QUOTE
+from core.types.dex import SwapRoute
+from dex.batch_quote import batch_quoter
+from dex.loader import dex_loader
+from dex.route_index import route_index
+from logger import logger
+
+
+class LocalQuoter:
+    """
+    基于 DexLander 中的Pool状态在本地报价，不经过网络
+    本地报价的准确性定期与Jupiter报价对照，对照在后台进行，不阻塞报价
+    """
+
+    def __init__(self, check_interval: float = QUOTE.CHECK_SECONDS, max_deviation_bps: float = QUOTE.MAX_DEVIATION_BPS):
+        self.check_interval = check_interval
+        self.max_deviation_bps = max_deviation_bps
+        # 最近的对照偏差(bps)，正数表示本地报价高于Jupiter
+        self.deviations: Deque[float] = deque(maxlen=100)
+        self._last_check = 0.0
+        self._check_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def quote(source_mint: str, destination_mint: str, amount: int) -> Optional[List[SwapRoute]]:
+        """
+        本地最优路由，代币不在路由索引中或没有可报价的Pool时返回None
+        """
+        if route_index.mint_id(source_mint) < 0 or route_index.mint_id(destination_mint) < 0:
+            return None
+        try:
+            return dex_loader.get_most_height_value_route(source_mint, destination_mint, amount)
+        except AssertionError:
+            return None
+
+    def quote_round_trip(self, base_mint: str, target_mint: str,
+                         amount: int) -> Optional[Tuple[List[SwapRoute], List[SwapRoute]]]:
+        """
+        base_mint => target_mint => base_mint 往返报价，任一方向没有本地路由时返回None
+        """
+        buy_routes = self.quote(base_mint, target_mint, amount)
+        if not buy_routes:
+            return None
+        sell_routes = self.quote(target_mint, base_mint, buy_routes[-1].trade_output_override.estimated_out)
+        if not sell_routes:
+            return None
+        return buy_routes, sell_routes
+
+    def covers(self, base_mint: str, target_mint: str, amount: int) -> bool:
+        return self.quote_round_trip(base_mint, target_mint, amount) is not None
+
+    @staticmethod
+    def route_pools(base_mint: str, target_mint: str) -> List[Amm]:
+        """
+        base_mint 与 target_mint 之间直连及2跳路由涉及的全部Pool，只需订阅这些Pool的账户
+        """
+        rows = set()
+        for source_mint, destination_mint in ((base_mint, target_mint), (target_mint, base_mint)):
+            source, destination = route_index.mint_id(source_mint), route_index.mint_id(destination_mint)
+            rows.update(route_index.get_direct_markets(source, destination).tolist())
+            hop1_rows, hop2_rows, _ = route_index.get_2_hop_routes(source, destination)
+            rows.update(hop1_rows.tolist())
+            rows.update(hop2_rows.tolist())
+        pools = [dex_loader.get_pool(route_index.markets[row].id) for row in sorted(rows)]
+        return [pool for pool in pools if pool is not None]
+
+    def maybe_cross_check(self, base_mint: str, target_mint: str, amount: int, local_out_amount: int):
+        """
+        距上次对照超过 check_interval 时，在后台请求Jupiter往返报价并记录与本地报价的偏差
+        """
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        if self._check_task is not None and not self._check_task.done():
+            return
+        self._last_check = now
+        self._check_task = asyncio.create_task(
+            self._cross_check(base_mint, target_mint, amount, local_out_amount)
+        )
+
+    async def _cross_check(self, base_mint: str, target_mint: str, amount: int, local_out_amount: int):
+        try:
+            buy_resp = await jupiter_client.quote(base_mint, target_mint, amount, slippage_bps=100)
+            sell_resp = await jupiter_client.quote(target_mint, base_mint, int(buy_resp['outAmount']),
+                                                   slippage_bps=100)
+            remote_out_amount = int(sell_resp['outAmount'])
+        except Exception as e:
+            logger.warning(f'本地报价对照失败=>{e}')
+            return
+        if remote_out_amount <= 0:
+            return
+        deviation_bps = (local_out_amount - remote_out_amount) * 10000 / remote_out_amount
+        self.deviations.append(deviation_bps)
+        message = f'本地报价对照 输入:{amount} 本地:{local_out_amount} Jupiter:{remote_out_amount} ' \
+                  f'偏差:{deviation_bps:.1f}bps'
+        if abs(deviation_bps) > self.max_deviation_bps:
+            logger.warning(message)
+        else:
+            logger.info(message)
+
+    async def close(self):
+        if self._check_task is not None:
+            self._check_task.cancel()
+            await asyncio.gather(self._check_task, return_exceptions=True)
+            self._check_task = None
+
+
+class RouteChangeFeed:
+    """
+    往返路由上的Pool储备变化通知，作为 DexLander 的Pool更新处理函数注册
+    储备未变化的更新不会唤醒等待方，等待期间的多次变化合并为一次
+    """
+
+    def __init__(self, pools: List[Amm]):
+        self._rows = {batch_quoter.market_rows[pool.id] for pool in pools if pool.id in batch_quoter.market_rows}
+        self._reserves = {row: self._reserve(row) for row in self._rows}
+        self._event = asyncio.Event()
+        self.changes = 0
+
+    @staticmethod
+    def _reserve(row: int) -> Tuple[float, float]:
+        return float(batch_quoter.reserve_a[row]), float(batch_quoter.reserve_b[row])
+
+    def on_pools_updated(self, amms: List[Amm]):
+        for amm in amms:
+            row = batch_quoter.market_rows.get(amm.id)
+            if row not in self._rows:
+                continue
+            reserve = self._reserve(row)
+            if reserve != self._reserves[row]:
+                self._reserves[row] = reserve
+                self.changes += 1
+                self._event.set()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
+
+
+local_quoter = LocalQuoter()
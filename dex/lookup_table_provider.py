@@ -10,62 +10,206 @@
 Change Log  :
 
 """
-import time
-from typing import Dict, Set, List
+import asyncio
+import struct
+from typing import Dict, List, Union, Set, Optional, Tuple
 
+from solana.rpc.types import DataSliceOpts
 from solders.address_lookup_table_account import AddressLookupTableAccount, AddressLookupTable
 from solders.instruction import Instruction
 from solders.pubkey import Pubkey
 
-from clients.rpc import connection
+from cache import Cache
+from clients.rpc import connection, MAX_MULTIPLE_ACCOUNTS
 from core.types.dex import AccountInfo
 
 from logger import logger, catch_exceptions
 
 
+MIN_ADDRESSES_TO_INCLUDE_TABLE = 2
+MAX_TABLE_COUNT = 3
+MAX_MEMO_SIZE = 4096
+# Instruction 序列化格式：program_id(32) + 账户数(u64) + 账户列表[公钥(32) + is_signer(1) + is_writable(1)] + data
+INSTRUCTION_ACCOUNTS_OFFSET = 40
+ACCOUNT_META_SIZE = 34
+U64 = struct.Struct('<Q')
+# 路由表账户：类型(u32) + deactivation_slot(u64) + last_extended_slot(u64) + ...，扩展路由表时 last_extended_slot 变化
+LAST_EXTENDED_SLOT_OFFSET = 12
+LOOKUP_TABLE_CACHE = 'lookup_tables'
+# 后台检查路由表是否扩展的间隔(秒)
+REFRESH_INTERVAL = 30
+
+
 class LookupTableProvider:
     def __init__(self):
         self.lookup_tables: Dict[str, AddressLookupTableAccount] = {}
-        self.lookup_tables_for_address: Dict[str, Set[str]] = {}
-        self.addresses_for_lookup_table = {}
+        # 地址驻留为整数编号，每个地址记录其所在路由表编号的位集合
+        self._address_ids: Dict[bytes, int] = {}
+        self._table_bits_for_address: List[int] = []
+        self._table_ids: Dict[str, int] = {}
+        self._tables: List[AddressLookupTableAccount] = []
+        # 以指令账户列表的原始字节为键缓存选表结果，路由表变化时清空
+        self._memo: Dict[bytes, List[AddressLookupTableAccount]] = {}
+        self._last_extended_slots: Dict[str, int] = {}
+        self._pending: Set[str] = set()
+        self._fetch_task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._dirty = False
 
     async def initialize(self):
-        await lookup_table_provider.get_lookup_table(
+        self.load()
+        await self.get_lookup_table(
             Pubkey.from_string('Gr8rXuDwE2Vd2F5tifkPyMaUR67636YgrZEjkJf9RR9V')
         )
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
 
-    def update_cache(self, lut_address: Pubkey, lut_account: AddressLookupTableAccount):
-        self.lookup_tables[str(lut_address)] = lut_account
-        self.addresses_for_lookup_table[str(lut_address)] = set()
+    async def close(self):
+        tasks = [task for task in (self._refresh_task, self._fetch_task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refresh_task = self._fetch_task = None
+        if self._dirty:
+            self.save()
 
+    def load(self):
+        """
+        从本地缓存加载路由表地址列表及其 last_extended_slot
+        """
+        cache = Cache.try_read(LOOKUP_TABLE_CACHE)
+        for lut_key, (last_extended_slot, addresses) in (cache.value or {}).items():
+            lut_address = Pubkey.from_string(lut_key)
+            lut = AddressLookupTableAccount(
+                key=lut_address,
+                addresses=[Pubkey.from_bytes(address) for address in addresses]
+            )
+            self.update_cache(lut_address, lut, last_extended_slot)
+        logger.info(f'从本地缓存加载 {len(self.lookup_tables)} 个路由表')
+
+    def save(self):
+        Cache(LOOKUP_TABLE_CACHE, {
+            lut_key: (self._last_extended_slots.get(lut_key, 0), [bytes(address) for address in lut.addresses])
+            for lut_key, lut in self.lookup_tables.items()
+        }).write()
+        self._dirty = False
+
+    def update_cache(self, lut_address: Pubkey, lut_account: AddressLookupTableAccount, last_extended_slot: int = 0):
+        lut_key = str(lut_address)
+        self.lookup_tables[lut_key] = lut_account
+        self._last_extended_slots[lut_key] = last_extended_slot
+        table_id = self._table_ids.get(lut_key)
+        if table_id is None:
+            table_id = len(self._tables)
+            self._table_ids[lut_key] = table_id
+            self._tables.append(lut_account)
+        else:
+            self._tables[table_id] = lut_account
+
+        table_bit = 1 << table_id
         for address in lut_account.addresses:
-            address_str = str(address)
-            self.addresses_for_lookup_table[str(lut_address)].add(address_str)
-            if address_str not in self.lookup_tables_for_address:
-                self.lookup_tables_for_address[address_str] = set()
-            self.lookup_tables_for_address[address_str].add(str(lut_address))
+            address_key = bytes(address)
+            address_id = self._address_ids.get(address_key)
+            if address_id is None:
+                address_id = len(self._table_bits_for_address)
+                self._address_ids[address_key] = address_id
+                self._table_bits_for_address.append(0)
+            self._table_bits_for_address[address_id] |= table_bit
+        self._memo.clear()
+
+    def remove_from_cache(self, lut_key: str):
+        """
+        移除已关闭的路由表，清除其地址位集合中对应的位，表编号不再复用
+        """
+        lut = self.lookup_tables.pop(lut_key, None)
+        if lut is None:
+            return
+        self._last_extended_slots.pop(lut_key, None)
+        table_mask = ~(1 << self._table_ids.pop(lut_key))
+        for address in lut.addresses:
+            address_id = self._address_ids.get(bytes(address))
+            if address_id is not None:
+                self._table_bits_for_address[address_id] &= table_mask
+        self._memo.clear()
+        self._dirty = True
 
     def process_lookup_table_update(self, lut_address: Pubkey, data: AccountInfo):
-        lut_account = AddressLookupTableAccount(
-            key=lut_address,
-            addresses=AddressLookupTableAccount.from_bytes(data.data).addresses
-        )
-        self.update_cache(lut_address, lut_account)
+        self.update_cache(lut_address, *self._deserialize(lut_address, data.data))
+        self._dirty = True
+
+    @staticmethod
+    def _deserialize(lut_address: Pubkey, data: bytes) -> Tuple[AddressLookupTableAccount, int]:
+        lut = AddressLookupTable.deserialize(data)
+        return AddressLookupTableAccount(key=lut_address, addresses=lut.addresses), lut.meta.last_extended_slot
 
     @catch_exceptions(option='批量更新路由表')
-    async def batch_update(self, lut_addresses: List[Pubkey]):
-        lut_addresses = [i for i in lut_addresses if i not in self.lookup_tables]
-        if len(lut_addresses) == 0:
-            return
+    async def batch_update(self, lut_addresses: List[Union[Pubkey, str]], refresh: bool = False):
         lut_addresses_str = [str(i) for i in lut_addresses]
+        if not refresh:
+            lut_addresses_str = [i for i in lut_addresses_str if i not in self.lookup_tables]
+        if len(lut_addresses_str) == 0:
+            return
         lut_accounts_map = await connection.get_accounts_info(lut_addresses_str)
         for lut_address_str, lut_account in lut_accounts_map.items():
+            if lut_account is None:
+                if refresh:
+                    self.remove_from_cache(lut_address_str)
+                continue
             lut_address = Pubkey.from_string(lut_address_str)
-            lut = AddressLookupTableAccount(
-                key=lut_address,
-                addresses=AddressLookupTable.deserialize(lut_account.data).addresses
+            self.update_cache(lut_address, *self._deserialize(lut_address, lut_account.data))
+        self._dirty = True
+
+    def prefetch(self, lut_addresses: List[Union[Pubkey, str]]):
+        """
+        在后台获取尚未缓存的路由表，不阻塞调用方
+        """
+        for lut_address in lut_addresses:
+            lut_address_str = str(lut_address)
+            if lut_address_str not in self.lookup_tables:
+                self._pending.add(lut_address_str)
+        if self._pending and (self._fetch_task is None or self._fetch_task.done()):
+            self._fetch_task = asyncio.create_task(self._fetch_pending())
+
+    async def _fetch_pending(self):
+        while self._pending:
+            pending, self._pending = list(self._pending), set()
+            await self.batch_update(pending)
+            logger.info(f'后台获取 {len(pending)} 个路由表')
+
+    async def refresh(self):
+        """
+        只读取各路由表的 last_extended_slot，发生变化的路由表重新获取完整地址列表
+        """
+        lut_keys = list(self.lookup_tables)
+        changed = []
+        closed = []
+        for i in range(0, len(lut_keys), MAX_MULTIPLE_ACCOUNTS):
+            _lut_keys = lut_keys[i:i + MAX_MULTIPLE_ACCOUNTS]
+            resp = await connection.get_multiple_accounts(
+                [Pubkey.from_string(lut_key) for lut_key in _lut_keys],
+                data_slice=DataSliceOpts(offset=LAST_EXTENDED_SLOT_OFFSET, length=U64.size)
             )
-            self.update_cache(lut_address, lut)
+            for lut_key, account in zip(_lut_keys, resp.value):
+                if account is None:
+                    closed.append(lut_key)
+                elif U64.unpack(bytes(account.data))[0] != self._last_extended_slots[lut_key]:
+                    changed.append(lut_key)
+        if closed:
+            logger.info(f'{len(closed)} 个路由表已关闭，移除')
+            for lut_key in closed:
+                self.remove_from_cache(lut_key)
+        if changed:
+            logger.info(f'{len(changed)} 个路由表已扩展，重新获取')
+            await self.batch_update(changed, refresh=True)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f'刷新路由表失败=>{e}')
+            if self._dirty:
+                self.save()
 
     @catch_exceptions(option='获取路由表', retry=10)
     async def get_lookup_table(self, lut_address: Pubkey):
@@ -77,69 +221,82 @@ class LookupTableProvider:
         lut_account = lut_account_resp.value
         if lut_account is None:
             return None
-        lut = AddressLookupTableAccount(
-            key=lut_address,
-            addresses=AddressLookupTable.deserialize(lut_account.data).addresses
-        )
-        self.update_cache(lut_address, lut)
+        lut, last_extended_slot = self._deserialize(lut_address, lut_account.data)
+        self.update_cache(lut_address, lut, last_extended_slot)
+        self._dirty = True
         return lut
 
     def compute_ideal_lookup_tables_for_instructions(self, instructions: List[Instruction]):
-        addresses = []
+        account_metas = []
         for instruction in instructions:
-            addresses.extend([i.pubkey for i in instruction.accounts])
-        return lookup_table_provider.compute_ideal_lookup_tables_for_addresses(addresses)
-
-    def compute_ideal_lookup_tables_for_addresses(self, addresses):
-        MIN_ADDRESSES_TO_INCLUDE_TABLE = 2
-        MAX_TABLE_COUNT = 3
-
-        start_calc = time.time()
-
-        address_set: Set[str] = set()
-        table_intersections: Dict[str, int] = {}
-        selected_tables: List[AddressLookupTableAccount] = []
-        remaining_addresses: Set[str] = set()
-        num_addresses_taken_care_of = 0
+            raw = bytes(instruction)
+            count = U64.unpack_from(raw, INSTRUCTION_ACCOUNTS_OFFSET - U64.size)[0]
+            end = INSTRUCTION_ACCOUNTS_OFFSET + count * ACCOUNT_META_SIZE
+            account_metas.append(raw[INSTRUCTION_ACCOUNTS_OFFSET:end])
+        return self._lookup(b''.join(account_metas))
 
+    def compute_ideal_lookup_tables_for_addresses(self, addresses: List[Union[Pubkey, str]]):
+        account_metas = []
         for address in addresses:
-            address_str = str(address)
-            if address_str in address_set:
-                continue
-            address_set.add(address_str)
+            if isinstance(address, str):
+                address = Pubkey.from_string(address)
+            account_metas.append(bytes(address) + b'\x00\x00')
+        return self._lookup(b''.join(account_metas))
 
-            tables_for_address = self.lookup_tables_for_address.get(address_str, set())
-            if len(tables_for_address) == 0:
-                continue
+    def _lookup(self, account_metas: bytes) -> List[AddressLookupTableAccount]:
+        selected_tables = self._memo.get(account_metas)
+        if selected_tables is None:
+            address_ids = set()
+            for offset in range(0, len(account_metas), ACCOUNT_META_SIZE):
+                # 签名账户不能通过路由表加载
+                if account_metas[offset + 32]:
+                    continue
+                address_id = self._address_ids.get(account_metas[offset:offset + 32])
+                if address_id is not None:
+                    address_ids.add(address_id)
+            selected_tables = self._select(sorted(address_ids))
+            if len(self._memo) >= MAX_MEMO_SIZE:
+                self._memo.clear()
+            self._memo[account_metas] = selected_tables
+        return list(selected_tables)
 
-            remaining_addresses.add(address_str)
-            for table in tables_for_address:
-                table_intersections[table] = table_intersections.get(table, 0) + 1
+    def _select(self, address_ids: List[int]) -> List[AddressLookupTableAccount]:
+        """
+        贪心集合覆盖：第i个地址对应掩码第i位，每轮选择覆盖剩余地址最多的路由表
+        """
+        # 只有包含至少两个地址的路由表才可能被选中
+        once, twice = 0, 0
+        for address_id in address_ids:
+            table_bits = self._table_bits_for_address[address_id]
+            twice |= once & table_bits
+            once |= table_bits
 
-        sorted_intersection_array = sorted(table_intersections.items(), key=lambda x: x[1], reverse=True)
+        table_masks: Dict[int, int] = {}
+        for i, address_id in enumerate(address_ids):
+            table_bits = self._table_bits_for_address[address_id] & twice
+            while table_bits:
+                lowest = table_bits & -table_bits
+                table_bits ^= lowest
+                table_id = lowest.bit_length() - 1
+                table_masks[table_id] = table_masks.get(table_id, 0) | (1 << i)
 
-        for lut_key, intersection_size in sorted_intersection_array:
-            if intersection_size < MIN_ADDRESSES_TO_INCLUDE_TABLE or len(selected_tables) >= MAX_TABLE_COUNT or len(
-                    remaining_addresses) <= 1:
+        # 按包含的地址数降序，某表包含的地址数不超过当前最优覆盖数时后面的表都无需再比较
+        candidates = sorted(table_masks.items(), key=lambda item: item[1].bit_count(), reverse=True)
+        remaining = (1 << len(address_ids)) - 1
+        selected_tables: List[AddressLookupTableAccount] = []
+        while len(selected_tables) < MAX_TABLE_COUNT and remaining.bit_count() > 1:
+            best_index, best_count = -1, MIN_ADDRESSES_TO_INCLUDE_TABLE - 1
+            for i, (table_id, mask) in enumerate(candidates):
+                if mask.bit_count() <= best_count:
+                    break
+                count = (mask & remaining).bit_count()
+                if count > best_count:
+                    best_index, best_count = i, count
+            if best_index < 0:
                 break
-
-            lut_addresses = self.addresses_for_lookup_table.get(lut_key)
-
-            address_matches = {x for x in remaining_addresses if x in lut_addresses}
-
-            if len(address_matches) >= MIN_ADDRESSES_TO_INCLUDE_TABLE:
-                selected_tables.append(self.lookup_tables[lut_key])
-                for address in address_matches:
-                    remaining_addresses.remove(address)
-                    num_addresses_taken_care_of += 1
-
-        logger.info(
-            f"Reduced {len(address_set)} different addresses to {len(selected_tables)} lookup tables from "
-            f"{len(sorted_intersection_array)} ({len(self.lookup_tables)}) candidates, with "
-            f"{len(address_set) - num_addresses_taken_care_of} missing addresses in "
-            f"{(time.time() - start_calc) * 1000:.2f}ms."
-        )
-
+            table_id, mask = candidates.pop(best_index)
+            selected_tables.append(self._tables[table_id])
+            remaining &= ~mask
         return selected_tables
 
 
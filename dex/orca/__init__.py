@@ -25,7 +25,6 @@ from dex.market_graph import market_graph
 from dex.orca.layouts import TOKEN_SWAP_LAYOUT
 from dex.orca.types import ApiPoolInfoItem
 from logger import logger
-from task import AddPoolParams, AddPoolTask, AddPoolPayload
 
 data_dir = osp.join(DATA_PATH, 'orca')
 os.makedirs(data_dir, exist_ok=True)
@@ -56,6 +55,8 @@ class OrcaDex(Dex):
         return pools
 
     async def initialize(self):
+        # task.add_pool_task 依赖 dex.orca.amm，在此处导入避免 dex.raydium -> task -> dex.orca 的循环导入
+        from task import AddPoolParams, AddPoolTask, AddPoolPayload
         pool_temp_file_path = osp.join(data_dir, f'{self.network.value}.json')
         with open(pool_temp_file_path, 'r') as f:
             data = json.load(f)
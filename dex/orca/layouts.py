@@ -57,4 +57,4 @@ SWAP_INFO_LAYOUT = CStruct(
     'tokenAccountB' / PUBKEY_LAYOUT,
     'tokenAccountC' / PUBKEY_LAYOUT,
     'tokenAccountD' / PUBKEY_LAYOUT
-)
\ No newline at end of file
+)
@@ -10,27 +10,30 @@
 Change Log  :
 
 """
+import asyncio
 import json
 import os
 import os.path as osp
-import traceback
-from typing import List, Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple, Callable, Optional
 from solders.pubkey import Pubkey
 
 from cache import Cache
 from logger import logger
 from clients.rpc import connection
 from core.base_dex import Dex
+from core.account_store import account_store
 from core.worker import worker
 from dex.market_graph import market_graph
-from dex.raydium.amm import RaydiumAmm, decode_serum_market_keys_string
-from core.constants import DexLabel, DATA_PATH
+from dex.raydium.amm import RaydiumAmm, RaydiumPoolRecord, decode_pool_descriptors, amm_static_hash
+from dex.snapshot import file_digest, read_snapshot, write_snapshot, remove_snapshot
+from core.constants import DexLabel, DATA_PATH, MAX_PROCESS_NUM
 from core.types.dex import Market, AccountInfo, AccountInfoMap
 from dex.raydium.layouts import AMM_INFO_V4_LAYOUT, MARKET_STATE_V1_LAYOUT, MARKET_STATE_V2_LAYOUT, \
     MARKET_STATE_V3_LAYOUT, SWAP_EXACT_LAYOUT
-from dex.raydium.types import ApiPoolInfo, ApiPoolInfoItem, ApiPoolInfoV4, ApiPoolInfoV5
+from dex.raydium.types import ApiPoolInfo, ApiPoolInfoItem, ApiPoolInfoV4, ApiPoolInfoV5, RaydiumPoolDescriptor, \
+    RAYDIUM_POOL_DESCRIPTOR_STRUCT
 from task.account_update_task import AccountUpdateTask, AccountUpdateParams, AccountUpdatePayload
-from task.add_pool_task import AddPoolTask, AddPoolPayload, AddPoolParams
 
 MARKETS_TO_IGNORE = [
     '9DTY3rv8xRa3CnoPoWJCMcQUSY7kUHZAoFKNsBhx8DDz',
@@ -39,6 +42,9 @@ MARKETS_TO_IGNORE = [
     '5NBtQe4GPZTRiwrmkwPxNdAuiVFGjQWnihVSqML6ADKT'
 ]
 
+# 启动快照格式版本，RaydiumPoolDescriptor 变化时递增
+SNAPSHOT_VERSION = 1
+
 data_dir = osp.join(DATA_PATH, 'raydium')
 os.makedirs(data_dir, exist_ok=True)
 
@@ -67,7 +73,23 @@ class RaydiumDex(Dex):
         pools.extend([pool for pool in pool_info.unOfficial])
         return pools
 
-    async def initialize(self):
+    def add_pool(self, amm: RaydiumAmm):
+        market = Market(
+            id=amm.id,
+            tokenMintA=str(amm.coin_mint),
+            tokenVaultA=str(amm.pool_coin_token_account),
+            tokenMintB=str(amm.pc_mint),
+            tokenVaultB=str(amm.pool_pc_token_account),
+            dexLabel=self.label.value
+        )
+        market_graph.add_market(market.tokenMintA, market.tokenMintB, market)
+        self.add_markets_for_pair(market.tokenMintA, market.tokenMintB, market)
+        self._pools[amm.id] = amm
+
+    async def build_pool_descriptors(self) -> List[RaydiumPoolDescriptor]:
+        """
+        从Pool列表和链上账户构建全部Pool描述
+        """
         pools: List[ApiPoolInfoItem] = await self.get_all_pools_info()
         init_addresses: List[str] = []
         for pool in pools:
@@ -80,54 +102,95 @@ class RaydiumDex(Dex):
             connection.get_accounts_info, init_addresses
         )
         initial_accounts: AccountInfoMap = initial_accounts_cache.value
-        update_account_addresses = []
+        records: List[RaydiumPoolRecord] = []
         for pool in pools:
-            try:
-                market = Market(
-                    id=pool.id,
-                    tokenMintA=pool.baseMint,
-                    tokenVaultA=pool.baseVault,
-                    tokenMintB=pool.quoteMint,
-                    tokenVaultB=pool.quoteVault,
-                    dexLabel=self.label.value
-                )
-                market_graph.add_market(market.tokenMintA, market.tokenMintB, market)
-                self.add_markets_for_pair(pool.baseMint, pool.quoteMint, market)
-                serum_market_id = pool.marketId
-                serum_program_id = Pubkey.from_string(pool.marketProgramId)
-                serum_market = Pubkey.from_string(serum_market_id)
-                pool_id = Pubkey.from_string(pool.id)
-                if pool.marketId not in initial_accounts:
-                    logger.warning(f'未发现{serum_market}账户信息')
-                    continue
-
-                serum_params = decode_serum_market_keys_string(
-                    pool_id,
-                    serum_program_id,
-                    serum_market,
-                    initial_accounts.get(serum_market_id)
-                )
+            if pool.marketId not in initial_accounts:
+                logger.warning(f'未发现{pool.marketId}账户信息')
+                continue
+            records.append((
+                Pubkey.from_string(pool.id),
+                Pubkey.from_string(pool.marketProgramId),
+                Pubkey.from_string(pool.marketId),
+                pool.fee_rate_bps,
+                initial_accounts.get(pool.id),
+                initial_accounts.get(pool.marketId)
+            ))
+        return await self.decode_pool_descriptors(records)
 
-                resp = await worker.run_task(
-                    AddPoolTask[AddPoolPayload](
-                        AddPoolParams(
-                            pool_label=self.label,
-                            pool_id=pool_id,
-                            fee_rate_bps=pool.fee_rate_bps,
-                            account_info=initial_accounts.get(pool.id),
-                            serum_params=serum_params
-                        )
-                    )
-                )
-                if resp.error:
-                    logger.error(resp.error)
-                else:
-                    amm = resp.payload.amm
-                    self._pools[amm.id] = amm
-                    update_account_addresses.extend(amm.accounts_for_update)
-            except Exception as e:
-                traceback.print_exc()
-                logger.error(e)
+    @staticmethod
+    async def decode_pool_descriptors(records: List[RaydiumPoolRecord]) -> List[RaydiumPoolDescriptor]:
+        """
+        将Pool分片到进程池中解码，MAX_PROCESS_NUM 不大于1时在当前进程解码
+        """
+        if MAX_PROCESS_NUM <= 1 or len(records) == 0:
+            results = [decode_pool_descriptors(records)]
+        else:
+            # 分片数为进程数的数倍，避免个别分片过慢拖住整体
+            shard_size = -(-len(records) // (MAX_PROCESS_NUM * 4))
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor(max_workers=MAX_PROCESS_NUM) as executor:
+                results = await asyncio.gather(*[
+                    loop.run_in_executor(executor, decode_pool_descriptors, records[i:i + shard_size])
+                    for i in range(0, len(records), shard_size)
+                ])
+        descriptors = []
+        for _descriptors, errors in results:
+            descriptors.extend(_descriptors)
+            for error in errors:
+                logger.error(f'构建Pool失败 {error}')
+        logger.info(f'构建 {len(descriptors)} 个Pool描述，失败 {len(records) - len(descriptors)} 个')
+        return descriptors
+
+    @property
+    def snapshot_path(self) -> str:
+        return osp.join(data_dir, f'{self.network.value}.snapshot')
+
+    async def load_descriptors(self, readonly: bool = False) -> Tuple[List[RaydiumPoolDescriptor], bool]:
+        """
+        从启动快照加载Pool描述，快照不可用时重新构建并写入快照
+        :param readonly: 分片进程只读取由路由进程准备好的快照，不写入
+        :return: (Pool描述, 是否来自快照)
+        """
+        digest = file_digest(osp.join(data_dir, f'{self.network.value}.json'))
+        records = read_snapshot(self.snapshot_path, SNAPSHOT_VERSION, RAYDIUM_POOL_DESCRIPTOR_STRUCT, digest)
+        if records is not None:
+            descriptors = [RaydiumPoolDescriptor._make(record) for record in records]
+            logger.info(f'{self.label.value}: 从启动快照加载 {len(descriptors)} 个矿池')
+            return descriptors, True
+        if readonly:
+            raise Exception(f'{self.label.value}: 启动快照 {self.snapshot_path} 不可用，应由路由进程预先构建')
+        descriptors = await self.build_pool_descriptors()
+        write_snapshot(self.snapshot_path, SNAPSHOT_VERSION, RAYDIUM_POOL_DESCRIPTOR_STRUCT, digest, descriptors)
+        return descriptors, False
+
+    async def prepare_snapshot(self):
+        descriptors, from_snapshot = await self.load_descriptors()
+        if not from_snapshot:
+            return
+        amm_accounts = await connection.get_accounts_info([str(Pubkey.from_bytes(d.id)) for d in descriptors])
+        stale = self.stale_pool_ids(descriptors, lambda amm_id: amm_accounts.get(str(amm_id)))
+        if stale:
+            logger.warning(f'{self.label.value}: 启动快照中 {len(stale)} 个矿池已失效，重建快照')
+            remove_snapshot(self.snapshot_path)
+            await self.load_descriptors()
+
+    async def initialize(self):
+        # 分片进程共用路由进程准备的快照，只读不写，避免多个进程同时重建或删除同一个文件
+        readonly = self.shard is not None
+        descriptors, from_snapshot = await self.load_descriptors(readonly)
+        shard_pool_ids = self.shard_pool_ids(
+            (str(Pubkey.from_bytes(d.id)), str(Pubkey.from_bytes(d.coin_mint)), str(Pubkey.from_bytes(d.pc_mint)))
+            for d in descriptors
+        )
+        if shard_pool_ids is not None:
+            descriptors = [d for d in descriptors if str(Pubkey.from_bytes(d.id)) in shard_pool_ids]
+            logger.info(f'{self.label.value}: 分片 {self.shard[0]}/{self.shard[1]} 负责 {len(descriptors)} 个矿池')
+
+        update_account_addresses = []
+        for descriptor in descriptors:
+            amm = RaydiumAmm.from_descriptor(descriptor)
+            self.add_pool(amm)
+            update_account_addresses.extend(amm.accounts_for_update)
         logger.info(f'{self.label.value} Pool 加载完成')
         await worker.run_task(
             AccountUpdateTask[AccountUpdatePayload](
@@ -137,6 +200,35 @@ class RaydiumDex(Dex):
             )
         )
         logger.info(f'{self.label} Pool 更新账户完成')
+        if from_snapshot:
+            self.validate_snapshot(descriptors, remove=not readonly)
+
+    @staticmethod
+    def stale_pool_ids(descriptors: List[RaydiumPoolDescriptor],
+                       get_account: Callable[[Pubkey], Optional[AccountInfo]]) -> List[str]:
+        """
+        AMM账户中地址字段与快照不一致的Pool
+        """
+        stale = []
+        for descriptor in descriptors:
+            amm_id = Pubkey.from_bytes(descriptor.id)
+            account = get_account(amm_id)
+            if account is not None and amm_static_hash(account.data) != descriptor.static_hash:
+                stale.append(str(amm_id))
+        return stale
+
+    def validate_snapshot(self, descriptors: List[RaydiumPoolDescriptor], remove: bool = True):
+        """
+        用最新的AMM账户校验快照中的Pool描述，地址发生变化的Pool本次不参与交易，快照在下次启动时重建
+        :param remove: 是否删除失效的快照，分片进程不删除，由路由进程下次启动时校验重建
+        """
+        stale = self.stale_pool_ids(descriptors, account_store.get)
+        if stale:
+            logger.warning(f'{self.label.value}: 启动快照中 {len(stale)} 个矿池已失效，将在下次启动时重建')
+            for amm_id in stale:
+                self.remove_pool(amm_id)
+            if remove:
+                remove_snapshot(self.snapshot_path)
 
 
 raydium = RaydiumDex()
\ No newline at end of file
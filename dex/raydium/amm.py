@@ -10,8 +10,8 @@
 Change Log  :
 
 """
-import struct
-from typing import List, Dict
+import hashlib
+from typing import List, Dict, Tuple
 
 from solders.pubkey import Pubkey
 from solders.instruction import AccountMeta, Instruction
@@ -22,12 +22,21 @@ from core.constants import AmmLabel, RAYDIUM, SwapMode, JUPITER
 from core.math import TokenSwapConstantProduct, Fraction, ZERO_FRACTION
 from core.types.dex import SerumMarketKeysString, AccountInfoMap, QuoteParams, Quote, SwapParams, \
     SwapLegAndAccounts, ExactOutSwapParams, SerumMarketKeys, AccountInfo
-from dex.raydium.layouts import AMM_INFO_V4_LAYOUT as AMM_INFO_LAYOUT
+from dex.raydium.layouts import AMM_INFO_V4_LAYOUT as AMM_INFO_LAYOUT, AMM_INFO_V4_FIELDS, TOKEN_ACCOUNT_AMOUNT, \
+    OPEN_ORDERS_INITIALIZED_FLAG, OPEN_ORDERS_OPEN_ORDERS_FLAG, AMM_INFO_V4_STATIC_OFFSET
+from dex.raydium.types import RaydiumPoolDescriptor
 from dex.utils import get_account_info,generate_program_derived_address, to_array_like
 from dex.raydium.market import Market as RaydiumMarket, OpenOrders
 from logger import catch_exceptions
 
 
+def amm_static_hash(amm_account_data: bytes) -> bytes:
+    """
+    AMM账户中各地址字段的哈希，地址变化说明启动快照中的Pool描述已失效
+    """
+    return hashlib.blake2b(amm_account_data[AMM_INFO_V4_STATIC_OFFSET:], digest_size=8).digest()
+
+
 def build_remaining_accounts(fee_account: Pubkey, overflow_fee_account: Pubkey):
     accounts = [AccountMeta(pubkey=overflow_fee_account, is_signer=False, is_writable=True)]
     if fee_account is not None:
@@ -62,6 +71,55 @@ def decode_serum_market_keys_string(raydium_amm_id: Pubkey,
         )
 
 
+# 子进程构建Pool描述的输入：池地址, Serum程序, Serum市场, 手续费(bps), AMM账户, Serum市场账户
+RaydiumPoolRecord = Tuple[Pubkey, Pubkey, Pubkey, int, AccountInfo, AccountInfo]
+
+
+def decode_pool_descriptor(pool_id: Pubkey, serum_program_id: Pubkey, serum_market: Pubkey, fee_rate_bps: int,
+                           amm_account_info: AccountInfo, serum_market_info: AccountInfo) -> RaydiumPoolDescriptor:
+    """
+    只依赖账户数据解码出Pool描述，不创建Amm对象，可在子进程中执行
+    """
+    s = AMM_INFO_LAYOUT.parse(amm_account_info.data)
+    keys = decode_serum_market_keys_string(pool_id, serum_program_id, serum_market, serum_market_info)
+    return RaydiumPoolDescriptor(
+        id=bytes(pool_id),
+        coin_mint=bytes(s.get('coinMintAddress')),
+        pc_mint=bytes(s.get('pcMintAddress')),
+        pool_coin_token_account=bytes(s.get('poolCoinTokenAccount')),
+        pool_pc_token_account=bytes(s.get('poolPcTokenAccount')),
+        serum_program_id=bytes(s.get('serumProgramId')),
+        serum_market=bytes(s.get('serumMarket')),
+        amm_open_orders=bytes(s.get('ammOpenOrders')),
+        amm_target_orders=bytes(s.get('ammTargetOrders')),
+        serum_bids=bytes(keys.serum_bids),
+        serum_asks=bytes(keys.serum_asks),
+        serum_event_queue=bytes(keys.serum_event_queue),
+        serum_coin_vault_account=bytes(keys.serum_coin_vault_account),
+        serum_pc_vault_account=bytes(keys.serum_pc_vault_account),
+        serum_vault_signer=bytes(keys.serum_vault_signer),
+        status=int(s.get('status')),
+        swap_fee_numerator=int(s.get('swapFeeNumerator')),
+        swap_fee_denominator=int(s.get('swapFeeDenominator')),
+        fee_rate_bps=fee_rate_bps,
+        static_hash=amm_static_hash(amm_account_info.data)
+    )
+
+
+def decode_pool_descriptors(records: List[RaydiumPoolRecord]) -> Tuple[List[RaydiumPoolDescriptor], List[str]]:
+    """
+    进程池任务：解码一个分片内的全部Pool，返回Pool描述和解码失败的错误信息
+    """
+    descriptors = []
+    errors = []
+    for record in records:
+        try:
+            descriptors.append(decode_pool_descriptor(*record))
+        except Exception as e:
+            errors.append(f'{record[0]} => {e}')
+    return descriptors, errors
+
+
 class RaydiumAmm(Amm):
     label = AmmLabel.RAYDIUM
 
@@ -86,6 +144,8 @@ class RaydiumAmm(Amm):
         self.pc_reserve = None
         self.fee_pct = None
         self.calculator = None
+        self._swap_fee = None
+        self._open_orders_fields = None
 
         s = AMM_INFO_LAYOUT.parse(amm_account_info.data)
         self.status = s.get('status')
@@ -100,10 +160,48 @@ class RaydiumAmm(Amm):
 
         self.serum_market_keys = params
 
-        a = int(s.get('swapFeeNumerator'))
-        r = int(s.get('swapFeeDenominator'))
-        self.fee_pct = Fraction(a, r)
-        self.calculator = TokenSwapConstantProduct(Fraction(a, r), ZERO_FRACTION)
+        self._set_swap_fee(int(s.get('swapFeeNumerator')), int(s.get('swapFeeDenominator')))
+
+    @classmethod
+    def from_descriptor(cls, descriptor: RaydiumPoolDescriptor) -> 'RaydiumAmm':
+        """
+        由Pool描述直接恢复，不解析账户数据
+        """
+        amm = cls.__new__(cls)
+        Amm.__init__(amm)
+        amm.amm_id = Pubkey.from_bytes(descriptor.id)
+        amm.id = str(amm.amm_id)
+        amm.should_prefetch = False
+        amm.exact_output_supported = True
+        amm.has_dynamic_accounts = False
+        amm.coin_mint = Pubkey.from_bytes(descriptor.coin_mint)
+        amm.pc_mint = Pubkey.from_bytes(descriptor.pc_mint)
+        amm.status = descriptor.status
+        amm.serum_program_id = Pubkey.from_bytes(descriptor.serum_program_id)
+        amm.serum_market = Pubkey.from_bytes(descriptor.serum_market)
+        amm.amm_open_orders = Pubkey.from_bytes(descriptor.amm_open_orders)
+        amm.amm_target_orders = Pubkey.from_bytes(descriptor.amm_target_orders)
+        amm.pool_coin_token_account = Pubkey.from_bytes(descriptor.pool_coin_token_account)
+        amm.pool_pc_token_account = Pubkey.from_bytes(descriptor.pool_pc_token_account)
+        amm.serum_market_keys = SerumMarketKeys(
+            serum_bids=Pubkey.from_bytes(descriptor.serum_bids),
+            serum_asks=Pubkey.from_bytes(descriptor.serum_asks),
+            serum_event_queue=Pubkey.from_bytes(descriptor.serum_event_queue),
+            serum_coin_vault_account=Pubkey.from_bytes(descriptor.serum_coin_vault_account),
+            serum_pc_vault_account=Pubkey.from_bytes(descriptor.serum_pc_vault_account),
+            serum_vault_signer=Pubkey.from_bytes(descriptor.serum_vault_signer)
+        )
+        amm.coin_reserve = None
+        amm.pc_reserve = None
+        amm._open_orders_fields = None
+        amm._set_swap_fee(descriptor.swap_fee_numerator, descriptor.swap_fee_denominator)
+        amm.fee_rate_bps = descriptor.fee_rate_bps
+        return amm
+
+    def _set_swap_fee(self, numerator: int, denominator: int):
+        self._swap_fee = (numerator, denominator)
+        self.fee_pct = Fraction(numerator, denominator)
+        self.calculator = TokenSwapConstantProduct(Fraction(numerator, denominator), ZERO_FRACTION)
 
     def get_accounts_for_update(self) -> List[Pubkey]:
         return [self.amm_id, self.pool_coin_token_account, self.pool_pc_token_account, self.amm_open_orders]
@@ -112,13 +210,22 @@ class RaydiumAmm(Amm):
         amm_account_info, pool_coin_token_account_info, pool_pc_token_account_info, amm_open_orders_account_info = [
             get_account_info(account_info_map, account) for account in self.get_accounts_for_update()
         ]
-        a = struct.unpack('<Q', pool_coin_token_account_info.data[64:72])[0]
-        r = struct.unpack('<Q', pool_pc_token_account_info.data[64:72])[0]
-        u = OpenOrders.from_account_info(self.amm_open_orders, amm_open_orders_account_info,
-                                         amm_open_orders_account_info.owner)
-        c = AMM_INFO_LAYOUT.parse(amm_account_info.data)
-        self.coin_reserve = a + u.baseTokenTotal - c.needTakePnlCoin
-        self.pc_reserve = r + u.quoteTokenTotal - c.needTakePnlPc
+        # 只读取需要的定长字段，完整解析见 AMM_INFO_LAYOUT / OpenOrders.from_account_info
+        a, = TOKEN_ACCOUNT_AMOUNT.unpack_from(pool_coin_token_account_info.data)
+        r, = TOKEN_ACCOUNT_AMOUNT.unpack_from(pool_pc_token_account_info.data)
+        if self._open_orders_fields is None:
+            self._open_orders_fields = OpenOrders.get_fields(amm_open_orders_account_info.owner)
+        flags, base_token_total, quote_token_total = self._open_orders_fields.unpack(
+            amm_open_orders_account_info.data)
+        if not flags & OPEN_ORDERS_INITIALIZED_FLAG or not flags & OPEN_ORDERS_OPEN_ORDERS_FLAG:
+            raise Exception('未结订单账户无效')
+        status, swap_fee_numerator, swap_fee_denominator, need_take_pnl_coin, need_take_pnl_pc = \
+            AMM_INFO_V4_FIELDS.unpack(amm_account_info.data)
+        self.status = status
+        if self._swap_fee != (swap_fee_numerator, swap_fee_denominator):
+            self._set_swap_fee(swap_fee_numerator, swap_fee_denominator)
+        self.coin_reserve = a + base_token_total - need_take_pnl_coin
+        self.pc_reserve = r + quote_token_total - need_take_pnl_pc
 
     @catch_exceptions(option='获取报价')
     def get_quote(self, quote_params: QuoteParams) -> Quote:
@@ -1,9 +1,12 @@
+import struct
 from typing import Union
 
 from construct import Bytes, Int8ul, Int64ul, Padding, BitsInteger, BitsSwapped, BitStruct, Const, Flag, BytesInteger, \
     Int16ul, Array, Bit
 from construct import Struct as CStruct
 
+from core.base_layout import FixedFields, layout_offsets
+
 
 PUBKEY_LAYOUT = Bytes(32)
 
@@ -210,3 +213,18 @@ OPEN_ORDERS_V2_LAYOUT = CStruct(
     "referrerRebatesAccrued" / Int64ul,
     "reserved2" / Bytes(7)
 )
+
+# 热路径定长字段读取器，字段按布局顺序声明
+AMM_INFO_V4_FIELDS = FixedFields(
+    AMM_INFO_V4_LAYOUT,
+    'status', 'swapFeeNumerator', 'swapFeeDenominator', 'needTakePnlCoin', 'needTakePnlPc'
+)
+OPEN_ORDERS_V1_FIELDS = FixedFields(OPEN_ORDERS_V1_LAYOUT, 'accountFlags', 'baseTokenTotal', 'quoteTokenTotal')
+OPEN_ORDERS_V2_FIELDS = FixedFields(OPEN_ORDERS_V2_LAYOUT, 'accountFlags', 'baseTokenTotal', 'quoteTokenTotal')
+# OpenOrders accountFlags 的位（BitsSwapped，第一个字段为最低位）
+OPEN_ORDERS_INITIALIZED_FLAG = 1 << 0
+OPEN_ORDERS_OPEN_ORDERS_FLAG = 1 << 2
+# AMM账户中初始化后不再变化的部分（各账户地址）的起始偏移，用于校验启动快照
+AMM_INFO_V4_STATIC_OFFSET = layout_offsets(AMM_INFO_V4_LAYOUT)['poolCoinTokenAccount'][0]
+# SPL Token账户 amount 字段
+TOKEN_ACCOUNT_AMOUNT = struct.Struct('<64xQ')
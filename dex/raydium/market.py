@@ -18,7 +18,9 @@ from solders.pubkey import Pubkey
 
 from core.base_layout import Layout, CStruct
 from core.types.dex import AccountInfo
-from dex.raydium.layouts import OPEN_ORDERS_V1_LAYOUT, OPEN_ORDERS_V2_LAYOUT, MARKET_STATE_V1_LAYOUT, MARKET_STATE_V2_LAYOUT
+from core.base_layout import FixedFields
+from dex.raydium.layouts import OPEN_ORDERS_V1_LAYOUT, OPEN_ORDERS_V2_LAYOUT, MARKET_STATE_V1_LAYOUT, MARKET_STATE_V2_LAYOUT, \
+    OPEN_ORDERS_V1_FIELDS, OPEN_ORDERS_V2_FIELDS
 
 
 class OpenOrders(Layout):
@@ -36,6 +38,15 @@ class OpenOrders(Layout):
             return OPEN_ORDERS_V1_LAYOUT
         return OPEN_ORDERS_V2_LAYOUT
 
+    @classmethod
+    def get_fields(cls, program_id: Pubkey) -> FixedFields:
+        """
+        accountFlags/baseTokenTotal/quoteTokenTotal 的定长读取器
+        """
+        if get_layout_version(program_id) == 1:
+            return OPEN_ORDERS_V1_FIELDS
+        return OPEN_ORDERS_V2_FIELDS
+
     @classmethod
     async def find_for_owner(cls, client: AsyncClient, owner_address: Pubkey, program_id: Pubkey) -> List['OpenOrders']:
         pass
@@ -10,6 +10,7 @@
 Change Log  :
 
 """
+import struct
 from typing import Union, List, NamedTuple
 
 
@@ -84,3 +85,33 @@ ApiPoolInfoItem = Union[ApiPoolInfoV4, ApiPoolInfoV5]
 class ApiPoolInfo(NamedTuple):
     official: List[ApiPoolInfoItem]
     unOfficial: List[ApiPoolInfoItem]
+
+
+class RaydiumPoolDescriptor(NamedTuple):
+    """
+    构建完成的Raydium Pool的紧凑描述，公钥均为32字节
+    """
+    id: bytes
+    coin_mint: bytes
+    pc_mint: bytes
+    pool_coin_token_account: bytes
+    pool_pc_token_account: bytes
+    serum_program_id: bytes
+    serum_market: bytes
+    amm_open_orders: bytes
+    amm_target_orders: bytes
+    serum_bids: bytes
+    serum_asks: bytes
+    serum_event_queue: bytes
+    serum_coin_vault_account: bytes
+    serum_pc_vault_account: bytes
+    serum_vault_signer: bytes
+    status: int
+    swap_fee_numerator: int
+    swap_fee_denominator: int
+    fee_rate_bps: int
+    # AMM账户静态部分的哈希，见 amm_static_hash
+    static_hash: bytes
+
+
+RAYDIUM_POOL_DESCRIPTOR_STRUCT = struct.Struct('<' + '32s' * 15 + '4Q8s')
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 13:40
+@Author     : lkkings
+@FileName:  : route_index.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+from typing import Dict, List, Iterable, Tuple
+
+import numpy as np
+
+from core.types.dex import Market
+from logger import logger
+
+INDEX_DTYPE = np.int32
+EMPTY = np.zeros(0, dtype=INDEX_DTYPE)
+
+# (hop1市场, hop2市场, 中间代币)
+TwoHopRoutes = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def expand_rows(indptr: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    展开多个CSR行为一个下标数组，等价于 concatenate([arange(indptr[r], indptr[r+1]) for r in rows])
+    """
+    starts = indptr[rows]
+    lens = indptr[rows + 1] - starts
+    total = int(lens.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lens) + lens, lens)
+    return offsets + np.arange(total)
+
+
+class RouteIndex:
+    """
+    启动时构建的整数路由索引
+    代币和市场均映射为整数ID，邻接关系和锚定代币(BASE_MINT)相关的2跳路由以CSR数组保存，
+    代币对查询返回数组切片
+    """
+
+    def __init__(self):
+        self.mints: List[str] = []
+        self.mint_ids: Dict[str, int] = {}
+        self.markets: List[Market] = []
+        self.market_mint_a = EMPTY
+        self.market_mint_b = EMPTY
+        # 邻接表：代币 -> (相邻代币, 市场)，每行按相邻代币排序
+        self.adj_indptr = np.zeros(1, dtype=np.int64)
+        self.adj_mint = EMPTY
+        self.adj_market = EMPTY
+        # 2跳路由：源代币 -> (目标代币, hop1, hop2, 中间代币)，每行按目标代币排序
+        self.route_indptr = np.zeros(1, dtype=np.int64)
+        self.route_dest = EMPTY
+        self.route_hop1 = EMPTY
+        self.route_hop2 = EMPTY
+        self.route_mid = EMPTY
+        self._anchors: List[int] = []
+
+    def mint_id(self, mint: str) -> int:
+        return self.mint_ids.get(mint, -1)
+
+    def _intern_mint(self, mint: str) -> int:
+        mint_id = self.mint_ids.get(mint)
+        if mint_id is None:
+            mint_id = len(self.mints)
+            self.mint_ids[mint] = mint_id
+            self.mints.append(mint)
+        return mint_id
+
+    def build(self, markets: Iterable[Market], anchor_mints: Iterable[str]):
+        self.mints, self.mint_ids, self.markets = [], {}, []
+        seen = set()
+        mint_a, mint_b = [], []
+        for market in markets:
+            if market.id in seen:
+                continue
+            seen.add(market.id)
+            self.markets.append(market)
+            mint_a.append(self._intern_mint(market.tokenMintA))
+            mint_b.append(self._intern_mint(market.tokenMintB))
+        self.market_mint_a = np.asarray(mint_a, dtype=INDEX_DTYPE)
+        self.market_mint_b = np.asarray(mint_b, dtype=INDEX_DTYPE)
+        self._anchors = [self.mint_ids[mint] for mint in anchor_mints if mint in self.mint_ids]
+        self._build_adjacency()
+        self._build_routes()
+        logger.info(f'路由索引构建完成 代币:{len(self.mints)} 市场:{len(self.markets)} 2跳路由:{len(self.route_dest)}')
+
+    def _build_adjacency(self):
+        market_ids = np.arange(len(self.markets), dtype=INDEX_DTYPE)
+        keep = self.market_mint_a != self.market_mint_b
+        src = np.concatenate([self.market_mint_a[keep], self.market_mint_b[keep]])
+        nbr = np.concatenate([self.market_mint_b[keep], self.market_mint_a[keep]])
+        mkt = np.concatenate([market_ids[keep], market_ids[keep]])
+        order = np.lexsort((mkt, nbr, src))
+        self.adj_mint = nbr[order]
+        self.adj_market = mkt[order]
+        self.adj_indptr = np.zeros(len(self.mints) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(self.mints)), out=self.adj_indptr[1:])
+
+    def _two_hop_from(self, source: int) -> Tuple[np.ndarray, ...]:
+        first = np.arange(self.adj_indptr[source], self.adj_indptr[source + 1])
+        mids = self.adj_mint[first]
+        second = expand_rows(self.adj_indptr, mids)
+        lens = self.adj_indptr[mids + 1] - self.adj_indptr[mids]
+        dest = self.adj_mint[second]
+        hop1 = np.repeat(self.adj_market[first], lens)
+        hop2 = self.adj_market[second]
+        mid = np.repeat(mids, lens)
+        keep = dest != source
+        return dest[keep], hop1[keep], hop2[keep], mid[keep]
+
+    def _build_routes(self):
+        parts = []
+        for anchor in self._anchors:
+            dest, hop1, hop2, mid = self._two_hop_from(anchor)
+            parts.append((np.full(len(dest), anchor, dtype=INDEX_DTYPE), dest, hop1, hop2, mid))
+            # 反向：X -> mid -> anchor，X 为锚定代币时已在其正向路由中
+            keep = ~np.isin(dest, self._anchors)
+            parts.append((dest[keep], np.full(int(keep.sum()), anchor, dtype=INDEX_DTYPE),
+                          hop2[keep], hop1[keep], mid[keep]))
+        if not parts:
+            parts.append((EMPTY, EMPTY, EMPTY, EMPTY, EMPTY))
+        source, dest, hop1, hop2, mid = (np.concatenate(i).astype(INDEX_DTYPE) for i in zip(*parts))
+        order = np.lexsort((hop2, hop1, dest, source))
+        self.route_dest = dest[order]
+        self.route_hop1 = hop1[order]
+        self.route_hop2 = hop2[order]
+        self.route_mid = mid[order]
+        self.route_indptr = np.zeros(len(self.mints) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(source, minlength=len(self.mints)), out=self.route_indptr[1:])
+
+    def get_direct_markets(self, source: int, destination: int) -> np.ndarray:
+        if source < 0 or destination < 0:
+            return EMPTY
+        start, end = self.adj_indptr[source], self.adj_indptr[source + 1]
+        lo, hi = np.searchsorted(self.adj_mint[start:end], destination, side='left'), \
+            np.searchsorted(self.adj_mint[start:end], destination, side='right')
+        return self.adj_market[start + lo:start + hi]
+
+    def get_2_hop_routes(self, source: int, destination: int) -> TwoHopRoutes:
+        if source < 0 or destination < 0 or source == destination:
+            return EMPTY, EMPTY, EMPTY
+        if source in self._anchors or destination in self._anchors:
+            start, end = self.route_indptr[source], self.route_indptr[source + 1]
+            block = self.route_dest[start:end]
+            lo = start + np.searchsorted(block, destination, side='left')
+            hi = start + np.searchsorted(block, destination, side='right')
+            return self.route_hop1[lo:hi], self.route_hop2[lo:hi], self.route_mid[lo:hi]
+        # 非锚定代币对不预先计算，按需从邻接表展开
+        dest, hop1, hop2, mid = self._two_hop_from(source)
+        keep = dest == destination
+        return hop1[keep], hop2[keep], mid[keep]
+
+
+route_index = RouteIndex()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 19:05
+@Author     : lkkings
+@FileName:  : snapshot.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import hashlib
+import mmap
+import os
+import struct
+from typing import Iterable, List, Optional, Tuple
+
+from logger import logger
+
+SNAPSHOT_MAGIC = b'STBS'
+# 魔数, 格式版本, 单条记录长度, 记录数, 数据源摘要
+SNAPSHOT_HEADER = struct.Struct('<4sHIQ32s')
+
+
+def file_digest(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').digest()
+
+
+def write_snapshot(path: str, version: int, record_struct: struct.Struct, digest: bytes,
+                   records: Iterable[Tuple]):
+    """
+    写入启动快照：定长文件头 + 定长记录，先写临时文件再原子替换
+    """
+    records = list(records)
+    buffer = bytearray(SNAPSHOT_HEADER.size + record_struct.size * len(records))
+    SNAPSHOT_HEADER.pack_into(buffer, 0, SNAPSHOT_MAGIC, version, record_struct.size, len(records), digest)
+    offset = SNAPSHOT_HEADER.size
+    for record in records:
+        record_struct.pack_into(buffer, offset, *record)
+        offset += record_struct.size
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(buffer)
+    os.replace(temp_path, path)
+    logger.info(f'写入启动快照 {path} 记录数:{len(records)}')
+
+
+def read_snapshot(path: str, version: int, record_struct: struct.Struct, digest: bytes) -> Optional[List[Tuple]]:
+    """
+    读取启动快照，文件不存在、版本/记录格式不一致或数据源摘要不匹配时返回None
+    """
+    if not os.path.exists(path) or os.path.getsize(path) < SNAPSHOT_HEADER.size:
+        return None
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        magic, snapshot_version, record_size, count, snapshot_digest = SNAPSHOT_HEADER.unpack_from(mm)
+        if magic != SNAPSHOT_MAGIC or snapshot_version != version or record_size != record_struct.size:
+            logger.warning(f'启动快照 {path} 版本不一致，需要重建')
+            return None
+        if snapshot_digest != digest:
+            logger.warning(f'启动快照 {path} 与数据源不一致，需要重建')
+            return None
+        end = SNAPSHOT_HEADER.size + record_size * count
+        if len(mm) != end:
+            logger.warning(f'启动快照 {path} 不完整，需要重建')
+            return None
+        view = memoryview(mm)
+        try:
+            return list(record_struct.iter_unpack(view[SNAPSHOT_HEADER.size:end]))
+        finally:
+            view.release()
+
+
+def remove_snapshot(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -19,8 +19,10 @@ from solders.keypair import Keypair
 from solana.rpc.async_api import AsyncClient
 from solders.transaction import VersionedTransaction
 
+from clients.blockhash import blockhash_service
 from core.base_flashloan import FlashLoan
 from core.constants import SOLEND
+from core.math import Fraction
 from flashloan.solend.instructions import LendingInstruction, build_flash_borrow_instruction, \
     build_flash_repay_instruction
 from flashloan.solend.layouts import BORROW_LAYOUT, REPAY_LAYOUT
@@ -56,6 +58,10 @@ class SolendFlashLoan(FlashLoan):
     def get_fee(self, in_amount: int) -> int:
         return int(in_amount * SOLEND.FLASHLOAN_FEE_BPS / 10000)
 
+    @property
+    def fee_rate(self) -> Fraction:
+        return Fraction(SOLEND.FLASHLOAN_FEE_BPS, 10000)
+
     async def simulate(self, amount, token_account: Pubkey, payer: Keypair, con: AsyncClient) -> Tuple[Instruction,Instruction]:
         flash_borrow_instruction = self.create_borrow_instruction(
             amount, token_account
@@ -63,8 +69,11 @@ class SolendFlashLoan(FlashLoan):
         flash_repay_instruction = self.create_repay_instruction(
             amount, token_account, payer.pubkey()
         )
-        recent_block_hash_resp = await con.get_latest_blockhash()
-        recent_block_hash = recent_block_hash_resp.value.blockhash
+        if blockhash_service.running:
+            recent_block_hash = blockhash_service.blockhash
+        else:
+            recent_block_hash_resp = await con.get_latest_blockhash()
+            recent_block_hash = recent_block_hash_resp.value.blockhash
         simulate_instructions = [flash_borrow_instruction, flash_repay_instruction]
         simulate_message = MessageV0.try_compile(
             payer=payer.pubkey(),
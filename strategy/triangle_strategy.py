@@ -19,9 +19,12 @@ from solders.pubkey import Pubkey
 from core.base_strategy import Strategy, Idea
 from core.types.event import EventType, Event
 from core.worker import worker
-from core.constants import BASE_MINT
+from core.constants import BASE_MINT, MAX_ARB_AMOUNT, SHARD
+from core.sharding import cycle_owner
+from core.types.dex import Cycle
 from task.arb_swap_task import ArbSwapTask, ArbSwapPayload, ArbSwapParams
 from dex.loader import dex_loader
+from dex.cycle_detector import cycle_detector, rotate_cycle
 from db.model import Token
 from logger import logger
 
@@ -92,7 +95,27 @@ class TriangleStrategy(Strategy):
     async def to_do(self, idea: Idea):
         pass
 
+    def on_cycles(self, cycles: List[Cycle]):
+        base_mint = str(BASE_MINT)
+        for cycle in cycles:
+            cycle = rotate_cycle(cycle, base_mint)
+            if cycle is None:
+                continue
+            # 分片模式下同一环路可能在多个分片内被发现，只由归属分片执行
+            if SHARD.INDEX >= 0 and cycle_owner(cycle.mints, base_mint, SHARD.COUNT) != SHARD.INDEX:
+                continue
+            logger.info(f'发现套利环路 {"->".join(cycle.key)} 预期收益率:{cycle.profit_ratio - 1:.4%}')
+            worker.run_task(ArbSwapTask[ArbSwapPayload](
+                ArbSwapParams(
+                    source_mint=base_mint,
+                    destination_mint=cycle.mints[1],
+                    amount=MAX_ARB_AMOUNT,
+                    cycle=cycle
+                )
+            ))
+
     async def setup(self, events: List[Type[Event]], addresses: List[str]):
+        cycle_detector.add_listener(self.on_cycles)
         events.extend([AddLiquidityEvent, RemoveLiquidityEvent, SwapEvent])
         pools = dex_loader.get_all_pools()
         update_accounts = []
@@ -110,22 +133,7 @@ class TriangleStrategy(Strategy):
         if max(value2,value1) < 10_000_000:
             return Idea(amount=int(8), expected_profit=int(8), bundle=[])
 
-        if value1 > 1_000_000 and event.mint1 != str(BASE_MINT):
-            worker.run_task(ArbSwapTask[ArbSwapPayload](
-                ArbSwapParams(
-                    source_mint=str(BASE_MINT),
-                    destination_mint=event.mint1,
-                    amount=1_000_000_000
-                )
-            ))
-        if value2 > 1_000_000 and event.mint2 != str(BASE_MINT):
-            worker.run_task(ArbSwapTask[ArbSwapPayload](
-                ArbSwapParams(
-                    source_mint=str(BASE_MINT),
-                    destination_mint=event.mint2,
-                    amount=1_000_000_000
-                )
-            ))
+        # 套利机会由 cycle_detector 在Pool更新后检测并通过 on_cycles 下发
         logger.info(f'交易hash:{event.hash}')
         if event.type == EventType.WITHDRAW_LIQUIDITY:
             logger.info(
@@ -10,10 +10,10 @@
 Change Log  :
 
 """
-from dataclasses import dataclass
-from typing import Dict, List
+from dataclasses import dataclass, replace
+from typing import Dict, List, Hashable, Optional, Set
 
-from core.base_task import TaskParams, AsyncTask, TaskPayload, V
+from core.base_task import TaskParams, AsyncTask, TaskPayload, TaskReq, V
 from core.types.dex import AccountInfo, AccountInfoMap
 from dex.loader import dex_loader
 from clients.rpc import connection
@@ -32,6 +32,27 @@ class AccountUpdatePayload(TaskPayload):
 
 class AccountUpdateTask(AsyncTask[V]):
     priority = 1000
+    # 账户更新请求由RPC合并发送，限制并发避免占满执行槽位
+    max_concurrency = 4
+    # 已合并的账户集合，首次合并时建立，之后每次合并只检查新增账户
+    _known_accounts: Optional[Set[str]] = None
+
+    def coalesce_key(self) -> Hashable:
+        # 等待中的账户更新任务全部合并为一次请求
+        return 'update_accounts'
+
+    def merge(self, other: 'AccountUpdateTask[V]'):
+        known = self._known_accounts
+        if known is None:
+            # 参数属于提交方，首次合并时复制一份再追加，不修改提交方的对象
+            params = replace(self.params, update_accounts=list(self.params.update_accounts))
+            self._message = TaskReq(params, self._message.id) if isinstance(self._message, TaskReq) else params
+            known = self._known_accounts = set(params.update_accounts)
+        update_accounts = self.params.update_accounts
+        for account in other.params.update_accounts:
+            if account not in known:
+                known.add(account)
+                update_accounts.append(account)
 
     @catch_exceptions(option='账号更新')
     async def run(self, params: AccountUpdateParams) -> AccountUpdatePayload:
@@ -40,21 +61,8 @@ class AccountUpdateTask(AsyncTask[V]):
         dexs = dex_loader.get_all_amm_by_update_account(params.update_accounts)
         for amm in dexs:
             update_accounts.extend(amm.accounts_for_update)
-        update_accounts_info = await connection.get_accounts_info(update_accounts)
-        for amm in dexs:
-            has_null_account_info = False
-            account_info_map: AccountInfoMap = {}
-            for account_for_update in amm.accounts_for_update:
-                account_info = update_accounts_info.get(account_for_update)
-                if account_info is None:
-                    has_null_account_info = True
-                else:
-                    account_info_map[account_for_update] = account_info
-            if len(account_info_map) == len(amm.accounts_for_update):
-                try:
-                    amm.update(account_info_map)
-                    if not has_null_account_info:
-                        amm.is_initialized = True
-                except Exception as e:
-                    raise Exception(f'更新Pool {amm.id} 错误=>{e}')
+        update_accounts_info: AccountInfoMap = {}
+        for accounts_info, slot in await connection.get_accounts_info_with_slot(update_accounts):
+            dex_loader.apply_account_updates(accounts_info, slot)
+            update_accounts_info.update(accounts_info)
         return AccountUpdatePayload(update_accounts_info)
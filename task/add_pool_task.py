@@ -48,7 +48,7 @@ class AddPoolTask(AsyncTask[V]):
             if not serumParams:
                 raise Exception('未提供 Raydium 池的 Serum 参数')
             amm = RaydiumAmm(params.pool_id, account_info, serumParams)
-        if pool_label == DexLabel.ORCA:
+        elif pool_label == DexLabel.ORCA:
             amm = OrcaAmm(params.pool_id, account_info, 'Orca')
         else:
             raise Exception(f'未知池 {pool_label.value}')
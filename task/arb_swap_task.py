@@ -11,8 +11,8 @@ Change Log  :
 
 """
 import os
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
+from typing import List, Optional, Hashable, Tuple
 
 from solders.pubkey import Pubkey
 from solders.keypair import Keypair
@@ -21,12 +21,15 @@ from spl.token.constants import ACCOUNT_LEN, TOKEN_PROGRAM_ID
 from spl.token.instructions import initialize_account, InitializeAccountParams
 
 from clients.jito import jito_client
-from core.base_task import TaskParams, AsyncTask, TaskPayload, V
+from core.base_task import TaskParams, CpuBoundTask, TaskPayload, V
 from core.constants import TOKEN, JITO
-from core.types.dex import SwapRoute
+from core.math import Fraction
+from core.sizing import optimal_trade_size, ConstantProductHop
+from core.types.dex import SwapRoute, Cycle
 from flashloan import flashloan
 from logger import catch_exceptions, logger
 from programs import jupiter
+from dex.batch_quote import RouteCandidates, RouteChoice
 from dex.loader import dex_loader
 
 
@@ -34,7 +37,9 @@ from dex.loader import dex_loader
 class ArbSwapParams(TaskParams):
     source_mint: str
     destination_mint: str
-    amount: int
+    amount: int  # 指定环路时为最大交易数额
+    # 指定套利环路时按环路逐跳报价，否则在 source_mint/destination_mint 间往返搜索
+    cycle: Optional[Cycle] = None
 
 
 @dataclass
@@ -42,6 +47,19 @@ class ArbSwapPayload(TaskPayload):
     pass
 
 
+@dataclass
+class ArbSwapPlan:
+    """
+    计算通道得出的交易数额和路由，在事件循环中据此构建交易
+    """
+    amount: int
+    # 指定环路时各跳的输出
+    hop_outs: List[int] = field(default_factory=list)
+    # 未指定环路时往返两个方向预筛出的候选路由，在事件循环中按Pool精确复算后选出
+    buy: List[RouteChoice] = field(default_factory=list)
+    sell: List[RouteChoice] = field(default_factory=list)
+
+
 def calculate_min_gas_fee():
     return dex_loader.get_value_mint_amount(str(TOKEN.SOL.mint), JITO.FEES_LAMPORTS + JITO.MIN_TIP_LAMPORTS)
 
@@ -58,20 +76,74 @@ def calculate_tip_lamports(expected_profit: int) -> int:
     return expected_profit * JITO.TIP_PERCENT / 100
 
 
-class ArbSwapTask(AsyncTask[V]):
+class ArbSwapTask(CpuBoundTask[V]):
+    """
+    环路数额计算和往返选路在计算通道中进行，构建交易在事件循环中进行
+    """
     priority = 1
+    # 约三个slot后Pool储备已变化，基于旧储备构建的套利交易不再有价值
+    ttl = 1.2
+
+    def coalesce_key(self) -> Hashable:
+        # 同一代币对(及同一环路)的套利只需按最新状态执行一次
+        params: ArbSwapParams = self.params
+        return params.source_mint, params.destination_mint, params.cycle.key if params.cycle else None
+
+    def snapshot(self, params: ArbSwapParams) -> Tuple:
+        if params.cycle is not None:
+            return dex_loader.get_cycle_hops(params.cycle), params.amount, flashloan.fee_rate, None, None
+        return (None, params.amount, None,
+                dex_loader.get_route_candidates(params.source_mint, params.destination_mint),
+                dex_loader.get_route_candidates(params.destination_mint, params.source_mint))
+
+    def work_size(self, snapshot: Tuple) -> int:
+        hops, _, _, buy_candidates, sell_candidates = snapshot
+        if hops is not None:
+            # 环路数额计算不超过约150µs，低于进程池往返开销，总在事件循环中计算
+            return 0
+        return len(buy_candidates) + len(sell_candidates)
+
+    @staticmethod
+    def compute(hops: Optional[List[ConstantProductHop]], max_amount: int, cost: Optional[Fraction],
+                buy_candidates: Optional[RouteCandidates], sell_candidates: Optional[RouteCandidates]) -> ArbSwapPlan:
+        if hops is not None:
+            # 按环路各跳储备计算最优交易数额
+            sizing = optimal_trade_size(hops, max_amount=max_amount, cost=cost)
+            if sizing.amount <= 0:
+                raise Exception(f'无法套利')
+            hop_outs, amount = [], sizing.amount
+            for hop in hops:
+                amount = hop.exchange(amount)
+                hop_outs.append(amount)
+            return ArbSwapPlan(amount=sizing.amount, hop_outs=hop_outs)
+        buy = [*buy_candidates.rank(max_amount), *buy_candidates.fallback_choices(max_amount)]
+        if not buy:
+            raise Exception(f'未发现买入路线')
+        # 卖出候选按预筛的买入输出排序，只有不能向量报价的买入路线时按最大数额近似
+        sell_amount = buy[0].out_amount if len(buy[0].amounts) > 1 else max_amount
+        sell = [*sell_candidates.rank(sell_amount), *sell_candidates.fallback_choices(sell_amount)]
+        if not sell:
+            raise Exception(f'未发现卖出路线')
+        return ArbSwapPlan(amount=max_amount, buy=buy, sell=sell)
 
     @catch_exceptions(option='执行套利交易')
-    async def run(self, params: ArbSwapParams) -> ArbSwapPayload:
-
-        a_2_b_swap_routes = dex_loader.get_most_height_value_route(params.source_mint, params.destination_mint,
-                                                                   amount=params.amount)
-        out_amount = a_2_b_swap_routes[-1].trade_output_override.estimated_out
-        b_2_a_swap_routes = dex_loader.get_most_height_value_route(params.destination_mint, params.source_mint,
-                                                                   out_amount)
-        swap_routes: List[SwapRoute] = [*a_2_b_swap_routes, *b_2_a_swap_routes]
+    async def finish(self, params: ArbSwapParams, plan: ArbSwapPlan) -> ArbSwapPayload:
+        amount = plan.amount
+        if params.cycle is not None:
+            swap_routes: List[SwapRoute] = dex_loader.get_cycle_swap_routes(params.cycle, amount, plan.hop_outs)
+        else:
+            buy = dex_loader.resolve_choice(plan.buy, amount)
+            if buy is None:
+                raise Exception(f'未发现买入路线')
+            sell = dex_loader.resolve_choice(plan.sell, buy.out_amount)
+            if sell is None:
+                raise Exception(f'未发现卖出路线')
+            swap_routes: List[SwapRoute] = [
+                *dex_loader.get_choice_swap_routes(buy),
+                *dex_loader.get_choice_swap_routes(sell)
+            ]
         min_gas_fee = calculate_min_gas_fee()
-        expected_profit = calculate_expected_profit(params.amount, swap_routes[-1].trade_output_override.estimated_out,
+        expected_profit = calculate_expected_profit(amount, swap_routes[-1].trade_output_override.estimated_out,
                                                     min_gas_fee)
         logger.info(f'期待收益=>{expected_profit}')
         if expected_profit < 0:
@@ -94,7 +166,7 @@ class ArbSwapTask(AsyncTask[V]):
         source_token_account = dex_loader.wallet.get_associated_token_account(params.source_mint)
         # 借钱
         flash_borrow_instruction = flashloan.create_borrow_instruction(
-            params.amount, source_token_account
+            amount, source_token_account
         )
         main_instructions.append(flash_borrow_instruction)
 
@@ -104,11 +176,11 @@ class ArbSwapTask(AsyncTask[V]):
             'user_transfer_authority': dex_loader.wallet.public_key,
             'destination_token_account': source_token_account
         }
-        min_out_amount = calculate_min_out_amount(params.amount, min_gas_fee)
+        min_out_amount = calculate_min_out_amount(amount, min_gas_fee)
         swap_instruction = jupiter.build_swap_route_instruction(
             swap_leg=swap_leg,
             accounts=accounts,
-            in_amount=params.amount,
+            in_amount=amount,
             quoted_out_amount=min_out_amount,
             remaining_accounts=remaining_accounts
         )
@@ -116,7 +188,7 @@ class ArbSwapTask(AsyncTask[V]):
 
         # 还钱
         flash_repay_instruction = flashloan.create_repay_instruction(
-            params.amount, source_token_account, dex_loader.wallet.public_key
+            amount, source_token_account, dex_loader.wallet.public_key
         )
         main_instructions.append(flash_repay_instruction)
 
@@ -11,11 +11,14 @@ Change Log  :
 
 """
 from dataclasses import dataclass
+from typing import Optional, Tuple
 
 from solders.pubkey import Pubkey
 
-from core.base_task import TaskParams, AsyncTask, TaskReq, TaskResp, TaskPayload, V
+from core.base_amm import Amm
+from core.base_task import TaskParams, CpuBoundTask, TaskReq, TaskResp, TaskPayload, V
 from core.constants import SwapMode
+from core.math import TokenSwapConstantProduct
 from core.types.dex import QuoteParams, Quote
 from dex.loader import dex_loader
 from logger import catch_exceptions
@@ -43,15 +46,55 @@ class CalulateQuoteParams(TaskParams):
     swap_mode: SwapMode
 
 
-class CalculateQuoteTask(AsyncTask[V]):
+class CalculateQuoteTask(CpuBoundTask[V]):
 
-    @catch_exceptions(option='获取报价')
-    async def run(self, params: CalulateQuoteParams) -> CalulateQuotePayload:
+    @staticmethod
+    def _get_pool(params: CalulateQuoteParams) -> Amm:
         amm = dex_loader.get_pool(params.pool_id)
         if not amm:
             raise Exception(f'交易池{params.pool_id}未发现')
         if not amm.is_initialized:
             raise Exception(f'交易池{params.pool_id}未完全初始化')
+        return amm
+
+    def snapshot(self, params: CalulateQuoteParams) -> Optional[Tuple]:
+        """
+        恒定乘积池只需计算器、两侧储备和方向即可报价，其他Pool在事件循环中直接报价
+        """
+        amm = self._get_pool(params)
+        calculator = getattr(amm, 'calculator', None)
+        coin_reserve = getattr(amm, 'coin_reserve', None)
+        pc_reserve = getattr(amm, 'pc_reserve', None)
+        if not isinstance(calculator, TokenSwapConstantProduct) or not coin_reserve or not pc_reserve \
+                or not getattr(amm, 'is_tradeable', False):
+            return None
+        return (calculator, coin_reserve, pc_reserve, 1 if amm.coin_mint == params.source_mint else 0,
+                params.amount, params.swap_mode, params.source_mint, amm.fee_pct.value)
+
+    @staticmethod
+    def compute(calculator: TokenSwapConstantProduct, coin_reserve: int, pc_reserve: int, coin_mint: int,
+                amount: int, swap_mode: SwapMode, fee_mint: Pubkey, fee_pct: float) -> CalulateQuotePayload:
+        if swap_mode == SwapMode.ExactIn:
+            result = calculator.exchange([coin_reserve, pc_reserve], amount, coin_mint)
+            in_amount, out_amount = amount, result.expected_output_amount
+        else:
+            result = calculator.exchange_for_exact_output([coin_reserve, pc_reserve], amount, coin_mint)
+            in_amount, out_amount = result.expected_input_amount, amount
+        return CalulateQuotePayload(
+            not_enough_liquidity=False,
+            min_in_amount=0,
+            min_out_amount=0,
+            in_amount=in_amount,
+            out_amount=out_amount,
+            fee_amount=result.fees,
+            fee_mint=fee_mint,
+            fee_pct=fee_pct,
+            price_impact_pct=result.price_impact
+        )
+
+    @catch_exceptions(option='获取报价')
+    async def run_inline(self, params: CalulateQuoteParams) -> CalulateQuotePayload:
+        amm = self._get_pool(params)
         quote = amm.get_quote(quote_params=QuoteParams(
             source_mint=params.source_mint,
             destination_mint=params.destination_mint,
@@ -63,8 +106,8 @@ class CalculateQuoteTask(AsyncTask[V]):
             min_in_amount=quote.min_in_amount,
             min_out_amount=quote.min_out_amount,
             in_amount=quote.in_amount,
-            out_amount=quote.min_out_amount,
-            fee_amount=quote.fee_mint,
+            out_amount=quote.out_amount,
+            fee_amount=quote.fee_amount,
             fee_mint=quote.fee_mint,
             fee_pct=quote.fee_pct,
             price_impact_pct=quote.price_impact_pct
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 23:58
+@Author     : lkkings
+@FileName:  : RPC批量测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+import base64
+import json
+import time
+
+from solders.pubkey import Pubkey
+from solders.rpc.requests import GetMultipleAccounts, GetBalance, GetLatestBlockhash
+from solders.rpc.responses import GetMultipleAccountsResp, GetBalanceResp, GetLatestBlockhashResp
+
+from clients.rpc import CoalescingAsyncHttpProvider
+
+
+def answer(body) -> dict:
+    """
+    离线模拟节点的JSON-RPC响应
+    """
+    request = json.loads(body.to_json())
+    if request['method'] == 'getMultipleAccounts':
+        value = [{'data': [base64.b64encode(bytes(Pubkey.from_string(key))[:8]).decode(), 'base64'],
+                  'executable': False, 'lamports': 1, 'owner': '11111111111111111111111111111111',
+                  'rentEpoch': 0, 'space': 8} for key in request['params'][0]]
+    elif request['method'] == 'getLatestBlockhash':
+        value = {'blockhash': '11111111111111111111111111111111', 'lastValidBlockHeight': 5}
+    else:
+        value = 5
+    return {'jsonrpc': '2.0', 'id': request['id'], 'result': {'context': {'slot': 77}, 'value': value}}
+
+
+class OfflineProvider(CoalescingAsyncHttpProvider):
+    """
+    不发网络请求，记录每次发出的调用
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__('http://offline', **kwargs)
+        self.sent = []
+
+    async def make_request_unparsed(self, body) -> str:
+        self.sent.append([json.loads(body.to_json())['method']])
+        await asyncio.sleep(0.002)
+        return json.dumps(answer(body))
+
+    async def make_batch_request_unparsed(self, bodies) -> str:
+        self.sent.append([json.loads(body.to_json())['method'] for body in bodies])
+        await asyncio.sleep(0.002)
+        return json.dumps([answer(body) for body in bodies])
+
+
+if __name__ == '__main__':
+    async def test():
+        provider = OfflineProvider(requests_per_second=20, max_batch_size=10, flush_window_ms=5)
+        provider.start_requests()
+
+        # 高优先级请求不等待攒批窗口
+        start_time = time.monotonic()
+        await provider.make_request(GetLatestBlockhash(), GetLatestBlockhashResp)
+        assert time.monotonic() - start_time < 0.05
+
+        # 同一批内重叠的 getMultipleAccounts 合并为一个去重调用，各调用方拿到自己的账户
+        keys = [Pubkey.new_unique() for _ in range(90)]
+        groups = [keys[:40], keys[20:60], keys[60:90]]
+        responses = await asyncio.gather(*(provider.make_request(GetMultipleAccounts(group), GetMultipleAccountsResp)
+                                           for group in groups))
+        for group, response in zip(groups, responses):
+            assert [bytes(account.data) for account in response.value] == [bytes(key)[:8] for key in group]
+        assert provider.sent[-1] == ['getMultipleAccounts'], provider.sent
+
+        # 请求在攒批窗口边界陆续到达，每个请求都能得到响应，不会因等待超时丢失
+        async def late_request(delay: float):
+            await asyncio.sleep(delay)
+            return await provider.make_request(GetBalance(Pubkey.new_unique()), GetBalanceResp)
+
+        responses = await asyncio.wait_for(asyncio.gather(*(late_request(i * 0.005) for i in range(40))), 30)
+        assert all(response.value == 5 for response in responses)
+
+        # 令牌按批内调用数消耗：60个不可合并的调用、每秒20个，补足40个令牌至少需要约2秒
+        await asyncio.sleep(1)
+        provider.sent.clear()
+        start_time = time.monotonic()
+        await asyncio.gather(*(provider.make_request(GetBalance(Pubkey.new_unique()), GetBalanceResp)
+                               for _ in range(60)))
+        elapsed = time.monotonic() - start_time
+        assert max(len(calls) for calls in provider.sent) <= 10
+        assert elapsed >= 1.8, elapsed
+        print(f'60个调用分 {len(provider.sent)} 批发出 耗时 {elapsed:.2f}s')
+
+    asyncio.run(test())
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 02:40
+@Author     : lkkings
+@FileName:  : RPC节点池测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+from solders.pubkey import Pubkey
+from solders.rpc.requests import GetBalance, GetLatestBlockhash, GetMultipleAccounts
+from solders.rpc.responses import GetBalanceResp, GetLatestBlockhashResp, GetMultipleAccountsResp
+
+from clients.rpc import RpcPoolProvider
+
+# 节点 -> (响应延迟, 是否出错)
+ENDPOINTS = {'http://bad': (0.0, True), 'http://slow': (0.1, False), 'http://fast': (0.01, False)}
+
+
+def answer(body) -> dict:
+    request = json.loads(body.to_json())
+    if request['method'] == 'getMultipleAccounts':
+        value = [None for _ in request['params'][0]]
+    elif request['method'] == 'getLatestBlockhash':
+        value = {'blockhash': '11111111111111111111111111111111', 'lastValidBlockHeight': 5}
+    else:
+        value = 5
+    return {'jsonrpc': '2.0', 'id': request['id'], 'result': {'context': {'slot': 77}, 'value': value}}
+
+
+def offline(pool: RpcPoolProvider, sent: Dict[str, List[str]]):
+    """
+    替换各节点的HTTP发送，按 ENDPOINTS 模拟延迟和错误，记录发往各节点的方法
+    """
+    for endpoint in pool.endpoints:
+        uri = endpoint.provider.endpoint_uri
+
+        async def send(bodies, uri=uri):
+            delay, error = ENDPOINTS[uri]
+            sent.setdefault(uri, []).extend(json.loads(body.to_json())['method'] for body in bodies)
+            await asyncio.sleep(delay)
+            if error:
+                raise ConnectionError(f'{uri} 不可用')
+            return [answer(body) for body in bodies]
+
+        async def single(body, send=send):
+            return json.dumps((await send([body]))[0])
+
+        async def batch(bodies, send=send):
+            return json.dumps(await send(bodies))
+
+        endpoint.provider.make_request_unparsed = single
+        endpoint.provider.make_batch_request_unparsed = batch
+
+
+if __name__ == '__main__':
+    async def test():
+        sent: Dict[str, List[str]] = {}
+        pool = RpcPoolProvider(list(ENDPOINTS), hedge=True)
+        offline(pool, sent)
+        pool.start_requests()
+
+        # 出错的节点很快被判为不健康并排到最后，之后请求发往延迟最低的节点
+        failures = 0
+        for _ in range(10):
+            try:
+                await pool.make_request(GetBalance(Pubkey.new_unique()), GetBalanceResp)
+            except Exception:
+                failures += 1
+        assert 0 < failures < 10
+        ranked = [endpoint.provider.endpoint_uri for endpoint in pool.ranked()]
+        assert ranked == ['http://fast', 'http://slow', 'http://bad'], pool.stats()
+        assert not pool.ranked()[-1].healthy
+
+        # 对冲请求同时发往最快的两个节点，以较快的结果为准，落后的一方被取消且不计入统计
+        slow = next(endpoint for endpoint in pool.endpoints if endpoint.provider.endpoint_uri == 'http://slow')
+        slow_requests, slow_latency = slow.requests, slow.latency
+        sent.clear()
+        start_time = time.monotonic()
+        await pool.make_request(GetLatestBlockhash(), GetLatestBlockhashResp)
+        assert time.monotonic() - start_time < 0.08
+        assert sent == {'http://fast': ['getLatestBlockhash'], 'http://slow': ['getLatestBlockhash']}, sent
+        await asyncio.sleep(0.15)
+        assert (slow.requests, slow.latency) == (slow_requests, slow_latency)
+
+        # 批量账户读取不对冲，只发往最快的节点
+        sent.clear()
+        await pool.make_request(GetMultipleAccounts([Pubkey.new_unique()]), GetMultipleAccountsResp)
+        assert sent == {'http://fast': ['getMultipleAccounts']}, sent
+
+        # 关闭对冲后时延敏感请求也只发往一个节点
+        pool.hedge = False
+        sent.clear()
+        await pool.make_request(GetLatestBlockhash(), GetLatestBlockhashResp)
+        assert sent == {'http://fast': ['getLatestBlockhash']}, sent
+        print(pool.stats())
+
+    asyncio.run(test())
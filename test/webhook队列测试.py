@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 00:55
+@Author     : lkkings
+@FileName:  : webhook队列测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+from typing import List, Dict
+
+from core.webhook_queue import WebhookQueue, DROP_OLDEST, DROP_NEWEST
+
+
+def items(*signatures: str) -> List[Dict]:
+    return [{'signature': signature} for signature in signatures]
+
+
+def buffered(queue: WebhookQueue) -> List[str]:
+    return [item['signature'] for _, item in queue._buffer]
+
+
+async def ignore(_items: List[Dict]):
+    pass
+
+
+if __name__ == '__main__':
+    # 丢弃最新：缓冲区满时新条目被丢弃，且丢弃的条目重试推送时仍可入队
+    queue = WebhookQueue(ignore, capacity=3, drop_policy=DROP_NEWEST)
+    assert queue.put(items('a', 'b', 'a', 'c', 'd')) == {'accepted': 3, 'duplicates': 1, 'dropped': 1}
+    assert buffered(queue) == ['a', 'b', 'c']
+    queue._take()
+    assert queue.put(items('d', 'b')) == {'accepted': 1, 'duplicates': 1, 'dropped': 0}
+    assert buffered(queue) == ['d']
+
+    # 丢弃最旧：挤出最旧条目，被挤出的条目重试推送时仍可入队
+    queue = WebhookQueue(ignore, capacity=3, drop_policy=DROP_OLDEST)
+    assert queue.put(items('a', 'b', 'c', 'd')) == {'accepted': 4, 'duplicates': 0, 'dropped': 1}
+    assert buffered(queue) == ['b', 'c', 'd']
+    assert queue.put(items('a', 'c')) == {'accepted': 1, 'duplicates': 1, 'dropped': 1}
+    assert buffered(queue) == ['c', 'd', 'a']
+
+    # 去重集合有界，按插入顺序淘汰；无签名的条目不去重
+    queue = WebhookQueue(ignore, capacity=100, dedupe_size=2)
+    queue.put(items('a', 'b', 'c'))
+    assert queue.put(items('a', 'c')) == {'accepted': 1, 'duplicates': 1, 'dropped': 0}
+    assert queue.put([{}, {}])['accepted'] == 2
+
+    # 消费协程按批取出全部条目，处理失败计入 failed 不影响后续批次
+    async def test():
+        handled = []
+
+        async def handler(batch: List[Dict]):
+            if batch[0]['signature'] == 'bad':
+                raise ValueError('bad')
+            handled.append([item['signature'] for item in batch])
+
+        queue = WebhookQueue(handler, capacity=100, consumers=2, batch_size=4)
+        await queue.start()
+        queue.put(items('bad', *(str(i) for i in range(10))))
+        await asyncio.sleep(0.01)
+        await queue.close()
+        assert all(len(batch) <= 4 for batch in handled)
+        stats = queue.stats()
+        assert stats['processed'] + stats['failed'] == 11 and stats['failed'] == 4 and stats['depth'] == 0, stats
+        print(f'webhook队列统计 {stats}')
+
+    asyncio.run(test())
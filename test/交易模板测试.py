@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 03:10
+@Author     : lkkings
+@FileName:  : 交易模板测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import random
+import time
+from typing import List
+
+from solders.address_lookup_table_account import AddressLookupTableAccount
+from solders.hash import Hash
+from solders.instruction import Instruction, AccountMeta
+from solders.keypair import Keypair
+from solders.message import MessageV0
+from solders.pubkey import Pubkey
+from solders.system_program import transfer, TransferParams
+from solders.transaction import VersionedTransaction
+
+from core.transaction_template import TransactionTemplate, TransactionTemplateCache, TRANSFER_LAMPORTS_OFFSET, U64
+
+
+def compile_tx(payer: Keypair, instructions: List[Instruction], lookup_tables: List[AddressLookupTableAccount],
+               blockhash: Hash) -> VersionedTransaction:
+    return VersionedTransaction(MessageV0.try_compile(payer.pubkey(), instructions, lookup_tables, blockhash), [payer])
+
+
+def with_amount(instruction: Instruction, offset: int, amount: int) -> Instruction:
+    data = bytes(instruction.data)
+    return Instruction(instruction.program_id, data[:offset] + U64.pack(amount) + data[offset + U64.size:],
+                       instruction.accounts)
+
+
+def random_instruction(accounts: List[Pubkey]) -> Instruction:
+    metas = [AccountMeta(account, False, random.random() < 0.5)
+             for account in random.sample(accounts, random.randint(1, 8))]
+    return Instruction(Pubkey.new_unique(), bytes(random.getrandbits(8) for _ in range(random.randint(0, 40))), metas)
+
+
+if __name__ == '__main__':
+    random.seed(11)
+    payer = Keypair()
+    checked = 0
+    for case in range(40):
+        accounts = [Pubkey.new_unique() for _ in range(random.choice((10, 40, 140)))]
+        lookup_tables = [AddressLookupTableAccount(Pubkey.new_unique(), random.sample(accounts, len(accounts) // 2))] \
+            if case % 2 else []
+        receivers = [Pubkey.new_unique() for _ in range(2)]
+        instructions = [
+            random_instruction(accounts),
+            transfer(TransferParams(from_pubkey=payer.pubkey(), to_pubkey=receivers[0], lamports=1)),
+            random_instruction(accounts),
+            transfer(TransferParams(from_pubkey=payer.pubkey(), to_pubkey=receivers[1], lamports=1)),
+        ]
+        amount_slots = [(1, TRANSFER_LAMPORTS_OFFSET), (3, TRANSFER_LAMPORTS_OFFSET)]
+        template = TransactionTemplate(payer, instructions, lookup_tables, amount_slots)
+        for _ in range(3):
+            blockhash = Hash.new_unique()
+            amounts = [random.randint(0, 2 ** 64 - 1), random.randint(0, 10 ** 9)]
+            expected = compile_tx(payer, [instructions[0], with_amount(instructions[1], TRANSFER_LAMPORTS_OFFSET,
+                                                                       amounts[0]),
+                                          instructions[2], with_amount(instructions[3], TRANSFER_LAMPORTS_OFFSET,
+                                                                       amounts[1])], lookup_tables, blockhash)
+            tx = template.build(blockhash, amounts)
+            # 与重新编译并签名的交易逐字节一致
+            assert bytes(tx) == bytes(expected), case
+            assert tx.verify_with_results() == [True]
+            # 区块哈希和数额都不变时复用上一次的交易
+            assert template.build(blockhash, amounts) is tx
+            checked += 1
+
+    # 没有数额的模板
+    instructions = [random_instruction([Pubkey.new_unique() for _ in range(6)])]
+    template = TransactionTemplate(payer, instructions, [])
+    blockhash = Hash.new_unique()
+    assert bytes(template.build(blockhash)) == bytes(compile_tx(payer, instructions, [], blockhash))
+
+    cache = TransactionTemplateCache()
+    created = []
+    factory = lambda: created.append(1) or TransactionTemplate(payer, instructions, [])
+    assert cache.get('tip', factory) is cache.get('tip', factory) and len(created) == 1
+
+    instructions = [transfer(TransferParams(from_pubkey=payer.pubkey(), to_pubkey=Pubkey.new_unique(), lamports=1))
+                    for _ in range(2)]
+    template = TransactionTemplate(payer, instructions, [], [(0, TRANSFER_LAMPORTS_OFFSET), (1, TRANSFER_LAMPORTS_OFFSET)])
+    start_time = time.perf_counter()
+    for i in range(1000):
+        template.build(blockhash, [i, i])
+    template_us = (time.perf_counter() - start_time) * 1000
+    start_time = time.perf_counter()
+    for i in range(1000):
+        compile_tx(payer, [with_amount(instruction, TRANSFER_LAMPORTS_OFFSET, i) for instruction in instructions],
+                   [], blockhash)
+    compile_us = (time.perf_counter() - start_time) * 1000
+    print(f'{checked} 笔交易与重新编译逐字节一致 模板 {template_us:.0f}µs/笔 重新编译 {compile_us:.0f}µs/笔')
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 00:20
+@Author     : lkkings
+@FileName:  : 任务合并测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+import time
+
+from dataclasses import dataclass
+from typing import Hashable
+
+from core.base_task import AsyncTask, TaskParams, TaskReq, TaskExpiredError
+from core.worker import Worker
+from task.account_update_task import AccountUpdateTask, AccountUpdateParams, AccountUpdatePayload
+
+runs = []
+
+
+class OfflineAccountUpdateTask(AccountUpdateTask):
+    """
+    沿用账户更新任务的合并逻辑，执行时只记录合并后的账户
+    """
+
+    async def run(self, params: AccountUpdateParams) -> AccountUpdatePayload:
+        runs.append(list(params.update_accounts))
+        await asyncio.sleep(0.02)
+        return AccountUpdatePayload({})
+
+
+@dataclass
+class KeyedParams(TaskParams):
+    key: str
+
+
+class KeyedTask(AsyncTask):
+    max_concurrency = 1
+
+    def coalesce_key(self) -> Hashable:
+        return self.params.key
+
+    async def run(self, params: KeyedParams) -> None:
+        runs.append(params.key)
+
+
+if __name__ == '__main__':
+    async def test():
+        worker = Worker(max_thread_num=4)
+        submitted = [AccountUpdateParams(['a', 'b']), AccountUpdateParams(['b', 'c']), AccountUpdateParams(['d'])]
+        futures = [worker.run_task(OfflineAccountUpdateTask(TaskReq(params, i))) for i, params in enumerate(submitted)]
+        await worker.start()
+        responses = await asyncio.gather(*futures)
+        # 等待期间的三次提交合并为一次执行，账户去重且保持提交顺序，每个提交方都拿到结果
+        assert runs == [['a', 'b', 'c', 'd']], runs
+        assert all(resp.error is None for resp in responses)
+        assert worker.stats()['coalesced'] == 2
+        # 提交方的参数对象不被修改
+        assert [params.update_accounts for params in submitted] == [['a', 'b'], ['b', 'c'], ['d']]
+
+        # 执行开始后不再接受合并，之后的提交形成新任务
+        first = worker.run_task(OfflineAccountUpdateTask(AccountUpdateParams(['x'])))
+        await asyncio.sleep(0.005)
+        rest = [worker.run_task(OfflineAccountUpdateTask(AccountUpdateParams([account]))) for account in 'yz']
+        await asyncio.gather(first, *rest)
+        assert runs[1:] == [['x'], ['y', 'z']], runs
+        await worker.stop()
+
+        # 合并延长的截止时间同样决定出队顺序与过期判断
+        runs.clear()
+        worker = Worker(max_thread_num=1)
+        now = time.monotonic()
+        extended = worker.run_task(OfflineAccountUpdateTask(AccountUpdateParams(['e']), deadline=now + 0.01))
+        merged = worker.run_task(OfflineAccountUpdateTask(AccountUpdateParams(['f']), deadline=now + 5))
+        await asyncio.sleep(0.03)
+        await worker.start()
+        responses = await asyncio.gather(extended, merged)
+        assert all(resp.error is None for resp in responses), [resp.error for resp in responses]
+        assert runs == [['e', 'f']], runs
+        assert worker.stats()['expired'] == 0
+
+        # 延长截止时间的任务按新的截止时间排在后面
+        runs.clear()
+        worker.run_task(KeyedTask(KeyedParams('extended'), deadline=now + 1))
+        worker.run_task(KeyedTask(KeyedParams('extended'), deadline=now + 10))
+        await worker.run_task(KeyedTask(KeyedParams('other'), deadline=now + 5))
+        await asyncio.sleep(0.01)
+        assert runs == ['other', 'extended'], runs
+
+        short = worker.run_task(OfflineAccountUpdateTask(AccountUpdateParams(['g']), deadline=time.monotonic()))
+        await asyncio.sleep(0.01)
+        assert isinstance((await short).error, TaskExpiredError)
+        await worker.stop()
+        print(f'合并执行 {runs} 统计 {worker.stats()}')
+
+    asyncio.run(test())
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 23:50
+@Author     : lkkings
+@FileName:  : 分片测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import random
+from typing import Dict, List, Tuple
+
+from solders.pubkey import Pubkey
+
+from core.sharding import partition_pools, cycle_owner
+
+
+def iter_cycles(pools: List[Tuple[str, str, str]], anchor: str, max_legs: int):
+    """
+    暴力枚举从锚定代币出发、不重复经过代币的环路，返回 (代币序列, Pool序列)
+    """
+    adjacency: Dict[str, List[Tuple[str, str]]] = {}
+    for pool_id, mint_a, mint_b in pools:
+        adjacency.setdefault(mint_a, []).append((pool_id, mint_b))
+        adjacency.setdefault(mint_b, []).append((pool_id, mint_a))
+
+    def walk(mints, pool_ids):
+        for pool_id, other in adjacency.get(mints[-1], ()):
+            if pool_id in pool_ids:
+                continue
+            if other == anchor:
+                if len(pool_ids) >= 2:
+                    yield [*mints, anchor], [*pool_ids, pool_id]
+            elif other not in mints and len(pool_ids) + 1 < max_legs:
+                yield from walk([*mints, other], [*pool_ids, pool_id])
+
+    yield from walk([anchor], [])
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    anchor = str(Pubkey.new_unique())
+    mints = [str(Pubkey.new_unique()) for _ in range(40)]
+    pools = []
+    for _ in range(300):
+        mint_a, mint_b = random.sample([anchor, *mints], 2)
+        pools.append((str(Pubkey.new_unique()), mint_a, mint_b))
+
+    for shard_count in (1, 2, 3, 4, 8):
+        shards = partition_pools(pools, anchor, shard_count)
+        counts = {}
+        duplicated = 0
+        for cycle_mints, cycle_pools in iter_cycles(pools, anchor, 4):
+            legs = len(cycle_pools)
+            counts[legs] = counts.get(legs, 0) + 1
+            visible = [i for i, shard in enumerate(shards) if set(cycle_pools) <= shard]
+            owner = cycle_owner(cycle_mints, anchor, shard_count)
+            # 归属分片必须能完整看到环路，其余分片即使可见也不执行
+            assert owner in visible, (cycle_mints, owner, visible)
+            assert cycle_owner(cycle_mints[::-1], anchor, shard_count) == owner, '反向环路归属不一致'
+            duplicated += len(visible) > 1
+        print(f'分片数 {shard_count} 环路(按腿数) {dict(sorted(counts.items()))} 多分片可见 {duplicated} '
+              f'每个环路仅由一个可见分片执行')
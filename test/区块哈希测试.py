@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 02:55
+@Author     : lkkings
+@FileName:  : 区块哈希测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+import json
+from typing import List, Optional, Tuple
+
+from solders.hash import Hash
+
+import clients.blockhash
+from clients.blockhash import BlockhashService
+from clients.rpc import connection
+
+# 依次返回的 (区块哈希, 最后有效区块高度)，None 表示请求失败
+responses: List[Optional[Tuple[Hash, int]]] = []
+requests = []
+
+
+async def single(body) -> str:
+    request = json.loads(body.to_json())
+    requests.append(request['method'])
+    response = responses.pop(0) if len(responses) > 1 else responses[0]
+    if response is None:
+        raise ConnectionError('offline')
+    blockhash, height = response
+    return json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': {
+        'context': {'slot': 1}, 'value': {'blockhash': str(blockhash), 'lastValidBlockHeight': height}}})
+
+
+async def wait_until(predicate, timeout: float = 2):
+    for _ in range(int(timeout / 0.01)):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    assert predicate()
+
+
+if __name__ == '__main__':
+    async def test():
+        for endpoint in connection._provider.endpoints:
+            endpoint.provider.make_request_unparsed = single
+        await connection.initialize()
+        service = BlockhashService(refresh_interval=0.02)
+        try:
+            service.blockhash
+            assert False, '未启动时不能读取'
+        except Exception:
+            pass
+
+        first, second, older = Hash.new_unique(), Hash.new_unique(), Hash.new_unique()
+        # 启动时先同步取得一次，之后后台刷新；乱序返回的旧区块哈希不覆盖新的；刷新失败时保留上一次结果
+        responses.extend([(first, 100), (second, 120), (older, 110), None])
+        await service.start()
+        assert service.running and service.blockhash == first and service.last_valid_block_height == 100
+        await wait_until(lambda: len(requests) >= 5)
+        assert service.blockhash == second and service.last_valid_block_height == 120
+        assert set(requests) == {'getLatestBlockhash'}
+
+        # 长时间未刷新成功后不再提供过期的区块哈希
+        clients.blockhash.BLOCKHASH_MAX_AGE = 0.1
+        await asyncio.sleep(0.15)
+        try:
+            service.blockhash
+            assert False, '过期的区块哈希不能使用'
+        except Exception as e:
+            assert '未更新' in str(e), e
+        responses[:] = [(Hash.new_unique(), 130)]
+        await wait_until(lambda: service.last_valid_block_height == 130)
+        assert service.blockhash == responses[0][0]
+
+        await service.close()
+        assert not service.running
+        # 关闭前已进入RPC队列的请求仍会发出
+        await asyncio.sleep(0.05)
+        count = len(requests)
+        await asyncio.sleep(0.1)
+        assert len(requests) == count, '关闭后不再刷新'
+        print(f'刷新 {count} 次')
+
+    asyncio.run(test())
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 01:25
+@Author     : lkkings
+@FileName:  : 区块引擎测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+from typing import List, Dict, Optional
+
+from clients.jito import JitoClient, BundleTracker
+
+# 各区块引擎的响应延迟(秒)，None 表示不可用
+LATENCY: Dict[str, Optional[float]] = {'阿姆斯特丹': 0.05, '法兰克福': 0.01, '纽约': 0.03, '东京': None, '盐湖城': 0.02}
+
+
+class TX:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __bytes__(self):
+        return self.data
+
+
+class OfflineJitoClient(JitoClient):
+    """
+    不发网络请求，按引擎名模拟延迟；纽约拒绝重复提交，东京不可用
+    """
+
+    def __init__(self, fanout: int):
+        super().__init__(fanout)
+        self.names = {engine.url: engine.name for engine in self.engines}
+        self.sent: List[str] = []
+        self.status_urls: List[str] = []
+        self.bundle_tracker = BundleTracker(self, min_interval=0.005, max_interval=0.01, timeout=1)
+
+    async def _probe_engine(self, engine):
+        if LATENCY[engine.name] is None:
+            engine.observe(0.0, True)
+        else:
+            engine.observe(LATENCY[engine.name], False)
+
+    async def send_rpc_json(self, method: str, params: List, path=None, url: str = None):
+        name = self.names[url]
+        if method == 'getInflightBundleStatuses':
+            self.status_urls.append(name)
+            return {'context': {'slot': 1}, 'value': [{'bundle_id': bundle_id, 'status': 'Landed', 'landed_slot': 7}
+                                                     for bundle_id in params[0]]}
+        self.sent.append(name)
+        if LATENCY[name] is None:
+            raise ConnectionError(f'{name} 不可用')
+        if name == '纽约':
+            raise ValueError('bundle already submitted')
+        await asyncio.sleep(LATENCY[name])
+        return 'BUNDLE'
+
+
+if __name__ == '__main__':
+    async def test():
+        client = OfflineJitoClient(fanout=3)
+        for _ in range(3):
+            await client._probe_engines()
+        client._select_best_engine()
+        # 健康引擎按延迟升序，不可用的引擎排在最后
+        assert [engine.name for engine in client.ranked] == ['法兰克福', '盐湖城', '纽约', '阿姆斯特丹', '东京']
+        assert client.names[client._url] == '法兰克福'
+
+        # 并发发送到排名前3的引擎，以最先接受的引擎为准，其他引擎拒绝重复提交不影响结果
+        assert await client.send_bundle([TX(b'x')]) == 'BUNDLE'
+        assert sorted(client.sent) == sorted(['法兰克福', '盐湖城', '纽约'])
+        # 状态只在接受该捆绑包的引擎查询
+        result = await client.wait_down('BUNDLE')
+        assert result.status == 'Landed' and result.landed_slot == 7
+        assert set(client.status_urls) == {'法兰克福'}
+        await asyncio.sleep(0.05)
+        assert client.engines[2].error_rate > 0, '拒绝重复提交计入引擎错误率'
+
+        # 最快的引擎变得不可用后由其他引擎接受，查询跟随接受的引擎
+        LATENCY['法兰克福'] = None
+        client.sent.clear()
+        client.status_urls.clear()
+        assert await client.send_bundle([TX(b'y')]) == 'BUNDLE'
+        assert (await client.wait_down('BUNDLE')).status == 'Landed'
+        assert set(client.status_urls) == {'盐湖城'}, client.status_urls
+
+        # 所有引擎都拒绝时抛出错误
+        client.fanout = 1
+        client._url = client.engines[3].url
+        try:
+            await client.send_bundle([TX(b'z')])
+            assert False, '应抛出错误'
+        except ConnectionError:
+            pass
+        await client.bundle_tracker.close()
+        print([(engine.name, round(engine.latency, 3), round(engine.error_rate, 2)) for engine in client.ranked])
+
+    asyncio.run(test())
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 11:05
+@Author     : lkkings
+@FileName:  : 批量报价测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import random
+import time
+from types import SimpleNamespace
+
+from solders.pubkey import Pubkey
+
+import dex.orca
+from core.math import TokenSwapConstantProduct, Fraction, ZERO_FRACTION
+from core.types.dex import Market, QuoteParams
+from dex.batch_quote import batch_quoter
+from dex.loader import dex_loader
+from dex.route_index import route_index
+
+
+class ConstantProductPool:
+    """
+    离线测试用的恒定乘积池，报价与 RaydiumAmm.get_quote 一样走 TokenSwapConstantProduct.exchange
+    """
+
+    def __init__(self, pool_id: str, coin_mint: str, pc_mint: str, coin_reserve: int, pc_reserve: int,
+                 calculator: TokenSwapConstantProduct):
+        self.id = pool_id
+        self.coin_mint = Pubkey.from_string(coin_mint)
+        self.pc_mint = Pubkey.from_string(pc_mint)
+        self.coin_reserve = coin_reserve
+        self.pc_reserve = pc_reserve
+        self.calculator = calculator
+        self.is_tradeable = True
+
+    def get_quote(self, quote_params: QuoteParams):
+        output_index = 1 if self.coin_mint == quote_params.source_mint else 0
+        result = self.calculator.exchange([self.coin_reserve, self.pc_reserve], quote_params.amount, output_index)
+        return SimpleNamespace(out_amount=int(result.expected_output_amount))
+
+
+def exact_out(reserve_in: int, reserve_out: int, fee: Fraction, amount: int) -> int:
+    fee_amount = amount * fee.numerator // fee.denominator or 1
+    net_amount = amount - fee_amount
+    return reserve_out * net_amount // (reserve_in + net_amount)
+
+
+if __name__ == '__main__':
+    random.seed(1)
+    fee = Fraction(25, 10000)
+    input_fee_calculator = TokenSwapConstantProduct(fee, ZERO_FRACTION)
+    output_fee_calculator = TokenSwapConstantProduct(fee, ZERO_FRACTION, fees_on_input=False)
+    base_mint = str(Pubkey.new_unique())
+    mints = [base_mint, *(str(Pubkey.new_unique()) for _ in range(15))]
+    pools = {}
+    markets = []
+    for i in range(120):
+        mint_a, mint_b = random.sample(mints, 2)
+        # 一半的池储备超过2^53，float64 无法精确表示
+        scale = 10 ** 18 if i % 2 else 10 ** 12
+        calculator = output_fee_calculator if i % 10 == 0 else input_fee_calculator
+        pool = ConstantProductPool(str(Pubkey.new_unique()), mint_a, mint_b,
+                                   random.randint(scale, 50 * scale), random.randint(scale, 50 * scale), calculator)
+        pools[pool.id] = pool
+        markets.append(Market(pool.id, mint_a, '', mint_b, '', 'Test'))
+    dex_loader.base_mint = base_mint
+    dex_loader.dexs.append(SimpleNamespace(pools=pools))
+    route_index.build(markets, [base_mint])
+    batch_quoter.build(route_index.markets, dex_loader.get_pool)
+    assert batch_quoter.fallback.sum() == sum(pool.calculator is output_fee_calculator for pool in pools.values())
+
+    # 单跳精确报价与整数公式一致
+    for pool in pools.values():
+        if pool.calculator is input_fee_calculator:
+            amount = random.randint(10 ** 6, 10 ** 15)
+            quote = pool.get_quote(QuoteParams(source_mint=pool.coin_mint, amount=amount))
+            assert quote.out_amount == exact_out(pool.coin_reserve, pool.pc_reserve, fee, amount), pool.id
+
+    # 预筛+精确复算选出的路由与全部候选精确报价的最优结果一致，且不能向量报价的池参与选路
+    checked = fallback_selected = 0
+    start_time = time.time()
+    for source_mint in mints:
+        for destination_mint in mints:
+            if source_mint == destination_mint:
+                continue
+            candidates = dex_loader.get_route_candidates(source_mint, destination_mint)
+            for amount in (10 ** 9, 10 ** 15):
+                for lowest in (False, True):
+                    choice = dex_loader.select_route(candidates, amount, lowest)
+                    every_choice = [*candidates.rank(amount, lowest, limit=None),
+                                    *candidates.fallback_choices(amount)]
+                    expected = dex_loader.resolve_choice(every_choice, amount, lowest)
+                    assert (choice is None) == (expected is None), (source_mint, destination_mint, amount)
+                    if choice is None:
+                        continue
+                    assert choice.out_amount == expected.out_amount, (choice, expected)
+                    assert choice.amounts == dex_loader.quote_choice(choice, amount).amounts
+                    fallback_selected += any(batch_quoter.fallback[row] for row in choice.rows)
+                    checked += 1
+    print(f'精确选路 {checked} 次一致 选中不可向量报价的池 {fallback_selected} 次 '
+          f'耗时 {(time.time() - start_time) * 1000:.2f}ms')
+    assert fallback_selected > 0
+
+    low_value = dex_loader.get_value_mint_amount(mints[1], 10 ** 12)
+    high_value = dex_loader.get_value_mint_amount(mints[1], 10 ** 12, is_negative=False)
+    assert 0 <= low_value <= high_value
+    print(f'价值 最低:{low_value} 最高:{high_value}')
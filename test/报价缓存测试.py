@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 03:55
+@Author     : lkkings
+@FileName:  : 报价缓存测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import dex.orca
+from clients.jupiter import jupiter_client, QuoteCache
+from dex.loader import dex_loader
+
+calls = []
+
+
+async def offline_request(url: str, method: str = 'GET', **kwargs):
+    """
+    报价按输入数额的2倍返回，路由经过 Pool P1 和 P2
+    """
+    calls.append(url)
+    if url.endswith('/v6/quote'):
+        params = kwargs['params']
+        return {'inputMint': params['inputMint'], 'outputMint': params['outputMint'],
+                'inAmount': str(params['amount']), 'outAmount': str(params['amount'] * 2),
+                'routePlan': [{'swapInfo': {'ammKey': 'P1'}}, {'swapInfo': {'ammKey': 'P2'}}]}
+    return {'setupInstructions': [], 'swapInstruction': None, 'addressLookupTableAddresses': []}
+
+
+if __name__ == '__main__':
+    async def test():
+        jupiter_client.make_request = offline_request
+        cache = jupiter_client.quote_cache = QuoteCache(ttl=1, bucket_bps=5)
+
+        first = await jupiter_client.quote('A', 'B', 1_000_000, 1)
+        # 同一数额分桶内、不小于缓存报价输入数额的请求复用缓存
+        assert cache.bucket(1_000_020) == cache.bucket(1_000_000)
+        assert await jupiter_client.quote('A', 'B', 1_000_020, 1) is first and len(calls) == 1
+        # 缓存报价的输入数额超过请求数额时不能复用
+        assert cache.bucket(999_990) == cache.bucket(1_000_000)
+        smaller = await jupiter_client.quote('A', 'B', 999_990, 1)
+        assert smaller['inAmount'] == '999990' and len(calls) == 2
+        # 不同代币对、滑点或分桶各自缓存
+        await jupiter_client.quote('A', 'B', 2_000_000, 1)
+        await jupiter_client.quote('B', 'A', 1_000_000, 1)
+        await jupiter_client.quote('A', 'B', 1_000_000, 2)
+        assert len(calls) == 5
+
+        # 交换指令按报价内容缓存
+        await jupiter_client._get_swap(smaller, 'payer', False, 300, 0)
+        assert (await jupiter_client._get_swap(smaller, 'payer', False, 300, 1))[0] == 1 and len(calls) == 6
+        await jupiter_client._get_swap(smaller, 'other', False, 300, 0)
+        assert len(calls) == 7
+
+        # Pool状态更新时，路由经过该Pool的报价和交换指令全部失效，其他Pool的更新不影响
+        dex_loader.notify_pools_updated([SimpleNamespace(id='P3')])
+        await jupiter_client.quote('A', 'B', 999_990, 1)
+        assert len(calls) == 7
+        dex_loader.notify_pools_updated([SimpleNamespace(id='P2')])
+        assert cache._entries == {} and cache._keys_by_amm == {}
+        await jupiter_client.quote('A', 'B', 999_990, 1)
+        await jupiter_client._get_swap(smaller, 'payer', False, 300, 0)
+        assert len(calls) == 9
+
+        # 过期的条目不再返回，并从Pool索引中移除
+        cache = QuoteCache(ttl=0.01)
+        cache.put('key', {'inAmount': '1'}, ('P1',))
+        time.sleep(0.02)
+        assert cache.get('key') is None and cache._keys_by_amm == {}
+        # ttl 为0时不缓存
+        cache = QuoteCache(ttl=0)
+        cache.put('key', {'inAmount': '1'}, ('P1',))
+        assert cache.get('key') is None
+
+        # 条目数超过上限时先丢弃最早写入的
+        cache = QuoteCache(ttl=10)
+        for i in range(QuoteCache.MAX_ENTRIES + 10):
+            cache.put(i, {'inAmount': '1'}, (f'P{i}',))
+        assert len(cache._entries) <= QuoteCache.MAX_ENTRIES and cache.get(0) is None
+        assert cache.get(QuoteCache.MAX_ENTRIES + 9) is not None
+        assert len(cache._keys_by_amm) == len(cache._entries)
+        print(f'报价缓存统计 {jupiter_client.quote_cache.stats()}')
+
+    asyncio.run(test())
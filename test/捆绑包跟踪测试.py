@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 01:10
+@Author     : lkkings
+@FileName:  : 捆绑包跟踪测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+import time
+from typing import List, Dict
+
+import clients.jito
+from clients.jito import BundleTracker, BUNDLE_STATUS_BATCH_SIZE
+
+
+class OfflineJitoClient:
+    """
+    按登记后经过的时间返回捆绑包状态：
+    L*: 0.05s 后 Landed；F*: 0.05s 后 Failed；I*: 一直查询不到；P*: 一直 Pending
+    """
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.calls: List[List[str]] = []
+        self.urls: List[str] = []
+        self.broken = False
+
+    def accepted_engine(self, bundle_id: str) -> str:
+        return 'http://engine-b' if bundle_id.endswith('b') else 'http://engine-a'
+
+    async def get_inflight_bundle_statuses(self, bundle_ids: List[str], url: str = None) -> Dict:
+        self.calls.append(list(bundle_ids))
+        self.urls.append(url)
+        if self.broken:
+            raise ConnectionError('offline')
+        elapsed = time.monotonic() - self.start
+        value = []
+        for bundle_id in bundle_ids:
+            assert self.accepted_engine(bundle_id) == url, '只能在接受捆绑包的引擎查询'
+            kind = bundle_id[0]
+            if kind == 'I':
+                value.append(None)
+            elif kind in 'LF' and elapsed > 0.05:
+                value.append({'bundle_id': bundle_id, 'status': 'Landed' if kind == 'L' else 'Failed',
+                              'landed_slot': 100 if kind == 'L' else None})
+            else:
+                value.append({'bundle_id': bundle_id, 'status': 'Pending', 'landed_slot': None})
+        return {'context': {'slot': 1}, 'value': value}
+
+
+if __name__ == '__main__':
+    clients.jito.BUNDLE_INVALID_GRACE = 0.15
+
+    async def test():
+        client = OfflineJitoClient()
+        tracker = BundleTracker(client, min_interval=0.005, max_interval=0.02, timeout=0.3)
+        bundle_ids = [f'{kind}{i}{engine}' for kind in 'LFIP' for i in range(4) for engine in 'ab']
+        # 重复登记返回同一个 future
+        assert tracker.track(bundle_ids[0]) is tracker.track(bundle_ids[0])
+        futures = {bundle_id: tracker.track(bundle_id) for bundle_id in bundle_ids}
+        results = {bundle_id: await future for bundle_id, future in futures.items()}
+        for bundle_id, result in results.items():
+            expected = {'L': 'Landed', 'F': 'Failed', 'I': 'Invalid', 'P': 'Timeout'}[bundle_id[0]]
+            assert result.status == expected, (bundle_id, result)
+            assert result.landed_slot == (100 if expected == 'Landed' else None)
+        # 查询不到的捆绑包在宽限期内保持待定，超时的不早于超时时间结束
+        assert min(results[bundle_id].latency for bundle_id in bundle_ids if bundle_id[0] == 'I') > 0.15
+        assert min(results[bundle_id].latency for bundle_id in bundle_ids if bundle_id[0] == 'P') > 0.3
+        # 每批不超过上限且同一批只包含同一引擎接受的捆绑包
+        assert max(len(call) for call in client.calls) <= BUNDLE_STATUS_BATCH_SIZE
+        assert all(len({client.accepted_engine(bundle_id) for bundle_id in call}) == 1 for call in client.calls)
+        assert sum(sum(counts.values()) for counts in tracker.stats()['latency_histogram'].values()) == len(bundle_ids)
+        assert tracker.pending == 0
+
+        # 状态接口出错时跟踪任务不退出，仍按超时结束
+        client.broken = True
+        result = await asyncio.wait_for(tracker.track('P9a'), 2)
+        assert result.status == 'Timeout', result
+
+        # 关闭时取消未完成的 future
+        pending = tracker.track('P10a')
+        await tracker.close()
+        assert pending.cancelled() and tracker.pending == 0
+        print(f'查询 {len(client.calls)} 次 {tracker.stats()}')
+
+    asyncio.run(test())
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 16:40
+@Author     : lkkings
+@FileName:  : 最优数额测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import random
+from typing import List, Tuple
+
+from core.math import TokenSwapConstantProduct, Fraction, ZERO_FRACTION
+from core.sizing import ConstantProductHop, optimal_trade_size, simulate, QuoteSizer
+
+
+def scan(hops: List[ConstantProductHop], center: int, cost: Fraction, max_amount: int = None) -> Tuple[int, int]:
+    """
+    在 (0, 2*center] 内等距扫描，返回 (数额, 收益) 的最优值
+    """
+    best_amount, best_profit = 0, 0
+    for i in range(1, 2001):
+        amount = center * i // 1000
+        if amount <= 0 or (max_amount is not None and amount > max_amount):
+            continue
+        profit = simulate(hops, amount) - amount - amount * cost.numerator // cost.denominator
+        if profit > best_profit:
+            best_amount, best_profit = amount, profit
+    return best_amount, best_profit
+
+
+if __name__ == '__main__':
+    calculator = TokenSwapConstantProduct(Fraction(25, 10000), ZERO_FRACTION)
+    hops = [
+        ConstantProductHop(calculator, 1_000_000_000_000, 1_030_000_000_000),
+        ConstantProductHop(calculator, 2_000_000_000_000, 2_000_000_000_000),
+        ConstantProductHop(calculator, 500_000_000_000, 500_000_000_000),
+    ]
+    cost = Fraction(5, 10000)
+    result = optimal_trade_size(hops, cost=cost)
+    print(f'解析解 数额:{result.amount} 输出:{result.out_amount} 收益:{result.profit}')
+    best_amount, best_profit = scan(hops, result.amount, cost)
+    print(f'扫描解 数额:{best_amount} 收益:{best_profit}')
+    assert result.out_amount == simulate(hops, result.amount)
+    assert result.profit >= best_profit > 0
+
+    # 随机环路：解析解不差于扫描解，受资金上限约束，无利可图时返回0
+    random.seed(7)
+    profitable = 0
+    for _ in range(200):
+        legs = random.choice((2, 3, 4))
+        hops = []
+        for _ in range(legs):
+            reserve = random.randint(10 ** 9, 10 ** 13)
+            hops.append(ConstantProductHop(calculator, reserve, int(reserve * random.uniform(0.98, 1.03))))
+        cost = Fraction(random.choice((0, 5, 9)), 10000)
+        result = optimal_trade_size(hops, cost=cost)
+        if result.amount == 0:
+            # 无利可图：在合理范围内扫描也找不到正收益
+            assert scan(hops, hops[0].reserve_in // 10, cost)[1] <= 0
+            continue
+        profitable += 1
+        assert result.profit == result.out_amount - result.amount - result.amount * cost.numerator // cost.denominator
+        assert result.profit >= scan(hops, result.amount, cost)[1], hops
+        max_amount = result.amount // 3
+        capped = optimal_trade_size(hops, max_amount=max_amount, cost=cost)
+        assert capped.amount <= max_amount
+        assert capped.profit >= scan(hops, max_amount // 2, cost, max_amount)[1]
+
+    # 只有整条路径报价时，拟合的虚拟池数额经过几轮报价后接近解析解
+    hops = [ConstantProductHop(calculator, 10 ** 12, 103 * 10 ** 10), ConstantProductHop(calculator, 10 ** 12, 10 ** 12)]
+    exact = optimal_trade_size(hops)
+    sizer = QuoteSizer(max_amount=10 ** 12)
+    for _ in range(4):
+        amount = sizer.next_amount()
+        sizer.observe(amount, simulate(hops, amount))
+    assert abs(sizer.next_amount() - exact.amount) <= exact.amount // 100, (sizer.next_amount(), exact.amount)
+    print(f'随机环路 {profitable} 个有利可图，解析解均不差于扫描解')
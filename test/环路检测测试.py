@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 01:55
+@Author     : lkkings
+@FileName:  : 环路检测测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import math
+import random
+from typing import Set, FrozenSet, List
+
+from core.types.dex import Market
+from dex.batch_quote import batch_quoter
+from dex.cycle_detector import cycle_detector, rotate_cycle
+from dex.route_index import route_index
+
+
+def rate(row: int, from_a: bool) -> float:
+    reserve_a, reserve_b = batch_quoter.reserve_a[row], batch_quoter.reserve_b[row]
+    return (1 - batch_quoter.fee_rate[row]) * (reserve_b / reserve_a if from_a else reserve_a / reserve_b)
+
+
+def brute_cycles(row: int, max_legs: int, min_ratio: float) -> Set[FrozenSet[int]]:
+    """
+    暴力枚举经过市场 row 的全部简单环路，返回收益率超过 min_ratio 的环路(市场集合)
+    """
+    market = route_index.markets[row]
+    found = set()
+
+    def walk(start: str, mints: List[str], rows: List[int], from_a: List[bool]):
+        node = mints[-1]
+        if node == start:
+            if math.prod(rate(r, f) for r, f in zip(rows, from_a)) > min_ratio:
+                found.add(frozenset(rows))
+            return
+        if len(rows) == max_legs:
+            return
+        for other_row, other in enumerate(route_index.markets):
+            if other_row in rows or node not in (other.tokenMintA, other.tokenMintB) \
+                    or other.tokenMintA == other.tokenMintB:
+                continue
+            next_mint = other.tokenMintB if other.tokenMintA == node else other.tokenMintA
+            if next_mint != start and next_mint in mints:
+                continue
+            walk(start, [*mints, next_mint], [*rows, other_row], [*from_a, other.tokenMintA == node])
+
+    walk(market.tokenMintA, [market.tokenMintA, market.tokenMintB], [row], [True])
+    walk(market.tokenMintB, [market.tokenMintB, market.tokenMintA], [row], [False])
+    return found
+
+
+if __name__ == '__main__':
+    random.seed(5)
+    mints = [f'M{i}' for i in range(25)]
+    markets = []
+    for i in range(90):
+        mint_a, mint_b = random.sample(mints, 2)
+        markets.append(Market(str(i), mint_a, '', mint_b, '', 'Test'))
+    route_index.build(markets, ['M0'])
+    batch_quoter.build(route_index.markets, lambda _: None)
+    # 储备按统一价格设置并加入小幅扰动，初始状态下基本没有套利环路
+    price = {mint: random.uniform(0.5, 2) for mint in mints}
+    for row, market in enumerate(route_index.markets):
+        reserve_a = random.uniform(1e6, 1e9)
+        batch_quoter.reserve_a[row] = reserve_a
+        batch_quoter.reserve_b[row] = reserve_a * price[market.tokenMintA] / price[market.tokenMintB] * \
+            random.uniform(0.99, 1.01)
+        batch_quoter.fee_rate[row] = 0.0025
+        batch_quoter.quotable[row] = True
+    cycle_detector.build()
+    notified = []
+    cycle_detector.add_listener(notified.extend)
+    min_ratio = math.exp(-cycle_detector.threshold)
+
+    expected_total = found_total = returned = 0
+    for row in range(30):
+        batch_quoter.reserve_b[row] *= 1.02
+        cycles = cycle_detector.on_pools_updated([row])
+        returned += len(cycles)
+        expected = brute_cycles(row, cycle_detector.max_legs, min_ratio)
+        found = {frozenset(batch_quoter.market_rows[market.id] for market in cycle.markets) for cycle in cycles}
+        # 找到的环路都是经过更新市场的简单套利环路，收益率与逐跳计算一致
+        assert found <= expected, (row, found - expected)
+        for cycle in cycles:
+            assert cycle.mints[0] == cycle.mints[-1] and len(set(cycle.mints[:-1])) == len(cycle.markets)
+            ratio = math.prod(rate(batch_quoter.market_rows[market.id], from_a)
+                              for market, from_a in zip(cycle.markets, cycle.from_a))
+            assert abs(ratio - cycle.profit_ratio) < 1e-9, (ratio, cycle.profit_ratio)
+            rotated = rotate_cycle(cycle, cycle.mints[1])
+            assert rotated.mints[0] == cycle.mints[1] and rotated.markets[-1] is cycle.markets[0]
+        # 存在套利环路时至少找到一个
+        assert bool(found) == bool(expected), row
+        expected_total += len(expected)
+        found_total += len(found)
+    # 监听者收到每次更新发现的全部环路
+    assert len(notified) == returned > 0
+
+    # Pool恢复后重算，不再有利可图的旧环路被移除
+    for row in range(30):
+        batch_quoter.reserve_b[row] /= 1.02
+    cycle_detector.on_pools_updated(range(30))
+    for cycle in cycle_detector.cycles.values():
+        ratio = math.prod(rate(batch_quoter.market_rows[market.id], from_a)
+                          for market, from_a in zip(cycle.markets, cycle.from_a))
+        assert ratio > min_ratio, cycle.key
+    print(f'暴力枚举套利环路 {expected_total} 个 增量检测找到 {found_total} 个 当前环路 {len(cycle_detector.cycles)} 个')
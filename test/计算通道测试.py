@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/18 23:55
+@Author     : lkkings
+@FileName:  : 计算通道测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+import os
+import pickle
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Tuple, List
+
+import numpy as np
+
+from core.base_task import TaskParams, CpuBoundTask, TaskPayload
+from core.constants import COMPUTE_MIN_WORK
+from core.worker import Worker
+from dex.batch_quote import RouteCandidates, ReserveSlice, RouteChoice
+
+
+def random_slice(size: int) -> ReserveSlice:
+    return ReserveSlice(np.random.uniform(1e9, 1e12, size), np.random.uniform(1e9, 1e12, size),
+                        np.full(size, 0.0025), np.ones(size, dtype=bool), np.zeros(size, dtype=bool))
+
+
+def random_candidates(size: int) -> RouteCandidates:
+    direct, hops = max(1, size // 20), size - max(1, size // 20)
+    return RouteCandidates(np.arange(direct), np.ones(direct, dtype=bool), random_slice(direct),
+                           np.arange(hops), np.ones(hops, dtype=bool), random_slice(hops),
+                           np.arange(hops), np.ones(hops, dtype=bool), random_slice(hops))
+
+
+@dataclass
+class RankParams(TaskParams):
+    candidates: RouteCandidates
+    amount: int
+
+
+@dataclass
+class RankPayload(TaskPayload):
+    choices: List[RouteChoice]
+    pid: int
+
+
+class RankTask(CpuBoundTask):
+    def snapshot(self, params: RankParams) -> Tuple:
+        return params.candidates, params.amount
+
+    def work_size(self, snapshot: Tuple) -> int:
+        return len(snapshot[0])
+
+    @staticmethod
+    def compute(candidates: RouteCandidates, amount: int) -> RankPayload:
+        return RankPayload(candidates.rank(amount), os.getpid())
+
+
+def median_us(func, repeat: int = 30) -> float:
+    samples = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start_time)
+    return statistics.median(samples) * 10 ** 6
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+
+    async def test():
+        worker = Worker(compute_workers=1, compute_executor='process')
+        await worker.start()
+        for size in (100, COMPUTE_MIN_WORK - 1, COMPUTE_MIN_WORK, 5000):
+            candidates = random_candidates(size)
+            resp = await worker.run_task(RankTask(RankParams(candidates, 10 ** 9)))
+            assert resp.error is None, resp.error
+            inline = RankTask.compute(candidates, 10 ** 9)
+            assert resp.payload.choices == inline.choices
+            # 低于 COMPUTE_MIN_WORK 在事件循环中计算，否则在进程池中计算
+            assert (resp.payload.pid != os.getpid()) == (size >= COMPUTE_MIN_WORK), size
+        await worker.stop()
+
+    asyncio.run(test())
+
+    # 校准 COMPUTE_MIN_WORK：内联计算耗时对比进程池往返中事件循环侧的序列化耗时
+    for size in (100, 1000, 5000, 20000):
+        candidates = random_candidates(size)
+        result = RankTask.compute(candidates, 10 ** 9)
+        inline_us = median_us(lambda: RankTask.compute(candidates, 10 ** 9))
+        pickle_us = median_us(lambda: pickle.loads(pickle.dumps((candidates, 10 ** 9)))) + \
+            median_us(lambda: pickle.loads(pickle.dumps(result)))
+        print(f'候选路由 {size:6d} 内联 {inline_us:8.0f}µs 序列化 {pickle_us:8.0f}µs')
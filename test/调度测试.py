@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 00:40
+@Author     : lkkings
+@FileName:  : 调度测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+
+from core.base_task import AsyncTask, TaskParams, TaskExpiredError
+from core.worker import Worker
+
+order = []
+running = {}
+
+
+@dataclass
+class OrderParams(TaskParams):
+    n: int
+
+
+class RecordTask(AsyncTask):
+    delay = 0.0
+
+    async def run(self, params: OrderParams) -> int:
+        name = type(self).__name__
+        running[name] = running.get(name, 0) + 1
+        order.append((name, params.n))
+        assert running[name] <= (self.max_concurrency or 8), f'{name} 超过并发上限'
+        await asyncio.sleep(self.delay)
+        running[name] -= 1
+        return params.n
+
+
+class SlowTask(RecordTask):
+    priority = 1
+    max_concurrency = 1
+    delay = 0.05
+
+
+class FastTask(RecordTask):
+    priority = 5
+    max_concurrency = 2
+    delay = 0.01
+
+
+class ShortLivedTask(RecordTask):
+    priority = 0
+    ttl = 0.02
+
+
+if __name__ == '__main__':
+    async def test():
+        worker = Worker(max_thread_num=8)
+        slow = [worker.run_task(SlowTask(OrderParams(i))) for i in range(3)]
+        fast = [worker.run_task(FastTask(OrderParams(i))) for i in range(4)]
+        short_lived = worker.run_task(ShortLivedTask(OrderParams(0)))
+        late = worker.run_task(SlowTask(OrderParams(99), deadline=time.monotonic() + 0.01))
+        # 调度器启动前 ttl 与截止时间都已经过去
+        await asyncio.sleep(0.03)
+        await worker.start()
+        responses = await asyncio.gather(*slow, *fast)
+        assert [resp.payload for resp in responses] == [0, 1, 2, 0, 1, 2, 3]
+        # 过期任务不执行，以 TaskExpiredError 结束
+        assert isinstance((await short_lived).error, TaskExpiredError)
+        assert isinstance((await late).error, TaskExpiredError)
+        assert ('ShortLivedTask', 0) not in order and ('SlowTask', 99) not in order
+        assert worker.stats()['expired'] == 2
+        # 优先级高的先出队；SlowTask 达到并发上限时不阻塞 FastTask
+        assert order[0] == ('SlowTask', 0), order
+        assert order.index(('FastTask', 3)) < order.index(('SlowTask', 1)), order
+        # 同类任务按截止时间出队，无截止时间的排在最后
+        order.clear()
+        now = time.monotonic()
+        futures = [worker.run_task(SlowTask(OrderParams(n), deadline=deadline))
+                   for n, deadline in ((0, None), (1, now + 3), (2, now + 1), (3, now + 2))]
+        await asyncio.gather(*futures)
+        assert order == [('SlowTask', 2), ('SlowTask', 3), ('SlowTask', 1), ('SlowTask', 0)], order
+        await worker.stop()
+        print(f'调度统计 {worker.stats()}')
+
+    asyncio.run(test())
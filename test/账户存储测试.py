@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 02:25
+@Author     : lkkings
+@FileName:  : 账户存储测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+from types import SimpleNamespace
+from typing import List
+
+from solders.pubkey import Pubkey
+
+import dex.orca
+from core.account_store import AccountStore, account_store
+from core.types.dex import AccountInfoMap
+from dex.loader import dex_loader
+
+OWNER = Pubkey.new_unique()
+
+
+def info(data: bytes) -> SimpleNamespace:
+    return SimpleNamespace(data=data, owner=OWNER)
+
+
+class RecordPool:
+    """
+    记录每次 update 收到的账户数据
+    """
+
+    def __init__(self, accounts: List[str]):
+        self.id = str(Pubkey.new_unique())
+        self.accounts_for_update = accounts
+        self.is_initialized = False
+        self.updates: List[AccountInfoMap] = []
+
+    def update(self, account_info_map: AccountInfoMap):
+        self.updates.append({address: bytes(record.data) for address, record in account_info_map.items()})
+
+
+if __name__ == '__main__':
+    store = AccountStore()
+    address = str(Pubkey.new_unique())
+    assert store.get(address) is None and store.get_slot(address) == -1
+    assert store.write(address, b'v1', OWNER, 10)
+    # 较旧slot的写入被拒绝，数据保持不变
+    assert not store.write(address, b'v0', OWNER, 9)
+    assert store.get(address).data == b'v1' and store.rejected == 1
+    # 内容相同只推进slot，不算变化
+    assert not store.write(address, b'v1', OWNER, 12)
+    assert store.get_slot(address) == 12
+    assert not store.write(address, b'v1.5', OWNER, 11) and store.rejected == 2
+    # 同一slot的新内容可以写入；字符串与 Pubkey 指向同一条记录
+    assert store.write(Pubkey.from_string(address), b'v2', OWNER, 12)
+    assert store.get(address) == (b'v2', OWNER, 12) and len(store) == 1
+    assert store.write_many({address: info(b'v3'), str(Pubkey.new_unique()): None}, 13) == [address]
+
+    # DexLoader 按slot写入账户存储，只更新数据变化的Pool，共享账户的Pool各更新一次
+    shared, a, b = (str(Pubkey.new_unique()) for _ in range(3))
+    pool_a, pool_b = RecordPool([shared, a]), RecordPool([shared, b])
+    dex_loader.dexs.append(SimpleNamespace(pools={pool_a.id: pool_a, pool_b.id: pool_b}))
+    updated = dex_loader.apply_account_updates({shared: info(b's1'), a: info(b'a1'), b: info(b'b1')}, 100)
+    assert set(updated) == {pool_a, pool_b}
+    assert pool_a.updates == [{shared: b's1', a: b'a1'}] and pool_b.updates == [{shared: b's1', b: b'b1'}]
+    assert pool_a.is_initialized and pool_b.is_initialized
+    # 迟到的旧slot响应不会覆盖新数据，也不触发更新
+    assert dex_loader.apply_account_updates({shared: info(b's0'), a: info(b'a0')}, 99) == []
+    assert account_store.get(shared).data == b's1'
+    # 只有 a 变化时只更新 pool_a，读取到的共享账户是存储中的最新值
+    assert dex_loader.apply_account_updates({shared: info(b's1'), a: info(b'a2')}, 101) == [pool_a]
+    assert pool_a.updates[-1] == {shared: b's1', a: b'a2'} and len(pool_b.updates) == 1
+    print(f'旧slot拒绝 {store.rejected + account_store.rejected} 次')
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 02:10
+@Author     : lkkings
+@FileName:  : 账户推送测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+import base64
+import json
+from typing import List, Dict
+
+import websockets
+from solders.pubkey import Pubkey
+
+from clients.account_stream import AccountStream
+
+# 每个连接收到的订阅账户
+subscriptions: List[List[str]] = []
+
+
+async def server(websocket, *_):
+    """
+    本地模拟节点：确认全部订阅后，在同一slot推送前两个账户的更新；第一个连接随后断开
+    """
+    subscribed = []
+    subscriptions.append(subscribed)
+    connection_no = len(subscriptions)
+    subscription_ids: Dict[int, str] = {}
+    while True:
+        try:
+            request = json.loads(await asyncio.wait_for(websocket.recv(), 0.3))
+        except asyncio.TimeoutError:
+            break
+        assert request['method'] == 'accountSubscribe'
+        subscription_ids[1000 + request['id']] = request['params'][0]
+        subscribed.append(request['params'][0])
+        await websocket.send(json.dumps({'jsonrpc': '2.0', 'result': 1000 + request['id'], 'id': request['id']}))
+    for subscription_id in list(subscription_ids)[:2]:
+        await websocket.send(json.dumps({'jsonrpc': '2.0', 'method': 'accountNotification', 'params': {
+            'subscription': subscription_id,
+            'result': {'context': {'slot': 10 * connection_no}, 'value': {
+                'lamports': 1, 'data': [base64.b64encode(b'data').decode(), 'base64'],
+                'owner': '11111111111111111111111111111111', 'executable': False, 'rentEpoch': 0, 'space': 4}}}}))
+    await asyncio.sleep(0.2)
+    if connection_no == 1:
+        await websocket.close()
+    else:
+        await asyncio.sleep(5)
+
+
+class OfflineAccountStream(AccountStream):
+    """
+    用记录代替HTTP快照补齐
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.resynced: List[List[str]] = []
+
+    async def _resync(self, addresses: List[Pubkey]):
+        self.resynced.append(sorted(str(address) for address in addresses))
+
+
+if __name__ == '__main__':
+    async def test():
+        keys = [str(Pubkey.new_unique()) for _ in range(5)]
+        received = []
+        async with websockets.serve(server, '127.0.0.1', 0) as websocket_server:
+            port = websocket_server.sockets[0].getsockname()[1]
+            stream = OfflineAccountStream(f'ws://127.0.0.1:{port}', max_subscriptions=3)
+            stream.add_handler(lambda account_info_map, slot: received.append((slot, sorted(account_info_map))))
+            await stream.start(keys)
+            await asyncio.sleep(2)
+            await stream.close()
+        # 5个账户按每连接3个分为2片，断开的连接重连后重新订阅同一片账户
+        assert len(subscriptions) == 3, subscriptions
+        shards = [sorted(keys)[:3], sorted(keys)[3:]]
+        assert sorted(map(sorted, subscriptions[:2])) == sorted(shards)
+        assert sorted(subscriptions[2]) == sorted(subscriptions[0])
+        # 每次连接成功后都用快照补齐一次
+        assert sorted(stream.resynced) == sorted([*shards, sorted(subscriptions[0])])
+        # 同一slot连续到达的两条推送合并为一次回调
+        for connection_no, subscribed in enumerate(subscriptions, 1):
+            assert (10 * connection_no, sorted(subscribed[:2])) in received, (connection_no, received)
+        assert len(received) == 3, received
+        assert not stream.running
+        print(f'连接 {len(subscriptions)} 次 推送回调 {received}')
+
+    asyncio.run(test())
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 01:40
+@Author     : lkkings
+@FileName:  : 路由索引测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import random
+import time
+from collections import Counter
+from typing import List
+
+from core.types.dex import Market
+from dex.route_index import route_index
+
+
+def brute_direct(markets: List[Market], source: str, destination: str) -> Counter:
+    return Counter(market.id for market in markets
+                   if {market.tokenMintA, market.tokenMintB} == {source, destination} and source != destination)
+
+
+def brute_2_hop(markets: List[Market], source: str, destination: str) -> Counter:
+    """
+    暴力枚举 source -> mid -> destination 的全部市场组合
+    """
+    routes = Counter()
+    if source == destination:
+        return routes
+    for hop1 in markets:
+        if source not in (hop1.tokenMintA, hop1.tokenMintB) or hop1.tokenMintA == hop1.tokenMintB:
+            continue
+        mid = hop1.tokenMintB if hop1.tokenMintA == source else hop1.tokenMintA
+        for hop2 in markets:
+            if {hop2.tokenMintA, hop2.tokenMintB} == {mid, destination} and mid != destination:
+                routes[(hop1.id, hop2.id, mid)] += 1
+    return routes
+
+
+if __name__ == '__main__':
+    random.seed(3)
+    mints = [f'M{i}' for i in range(40)]
+    anchors = mints[:2]
+    markets = []
+    for i in range(300):
+        mint_a, mint_b = random.sample(mints, 2)
+        markets.append(Market(str(i), mint_a, '', mint_b, '', 'Test'))
+    # 两端相同的市场不参与路由，重复的市场ID只保留一个
+    markets.append(Market('self', 'M3', '', 'M3', '', 'Test'))
+    markets.append(markets[0])
+    start_time = time.time()
+    route_index.build(markets, anchors)
+    print(f'构建耗时 {(time.time() - start_time) * 1000:.2f}ms 2跳路由:{len(route_index.route_dest)}')
+    unique = markets[:-1]
+
+    checked = 0
+    for source in mints:
+        for destination in mints:
+            source_id, destination_id = route_index.mint_id(source), route_index.mint_id(destination)
+            direct = Counter(route_index.markets[i].id
+                             for i in route_index.get_direct_markets(source_id, destination_id))
+            assert direct == brute_direct(unique, source, destination), (source, destination)
+            hop1, hop2, mid = route_index.get_2_hop_routes(source_id, destination_id)
+            routes = Counter((route_index.markets[i].id, route_index.markets[j].id, route_index.mints[k])
+                             for i, j, k in zip(hop1, hop2, mid))
+            assert routes == brute_2_hop(unique, source, destination), (source, destination)
+            checked += 1
+    # 未知代币返回空结果
+    assert len(route_index.get_direct_markets(route_index.mint_id('unknown'), 0)) == 0
+    assert len(route_index.get_2_hop_routes(0, route_index.mint_id('unknown'))[0]) == 0
+    print(f'{checked} 个代币对的直连与2跳路由与暴力搜索一致')
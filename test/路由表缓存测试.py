@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 03:40
+@Author     : lkkings
+@FileName:  : 路由表缓存测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import asyncio
+import base64
+import json
+import os
+import os.path as osp
+import struct
+from typing import Dict, List
+
+from solders.pubkey import Pubkey
+
+import dex.lookup_table_provider
+from cache import Cache, temp_dir
+from clients.rpc import connection
+from dex.lookup_table_provider import LookupTableProvider
+
+INITIAL_LUT = 'Gr8rXuDwE2Vd2F5tifkPyMaUR67636YgrZEjkJf9RR9V'
+# 模拟链上的路由表账户
+chain: Dict[str, bytes] = {}
+# (方法, 是否只读取部分数据)
+calls = []
+
+
+def lut_data(last_extended_slot: int, addresses: List[Pubkey]) -> bytes:
+    # 类型(u32) + deactivation_slot(u64) + last_extended_slot(u64) + start_index(u8) + authority(1+32) + padding(2)
+    return struct.pack('<IQQB', 1, 2 ** 64 - 1, last_extended_slot, 0) + b'\x00' * 35 + \
+        b''.join(bytes(address) for address in addresses)
+
+
+def account(data: bytes) -> dict:
+    return {'data': [base64.b64encode(data).decode(), 'base64'], 'executable': False, 'lamports': 1,
+            'owner': '11111111111111111111111111111111', 'rentEpoch': 0, 'space': len(data)}
+
+
+def answer(body) -> dict:
+    request = json.loads(body.to_json())
+    method, params = request['method'], request['params']
+    data_slice = params[1].get('dataSlice') if len(params) > 1 and isinstance(params[1], dict) else None
+    calls.append((method, data_slice is not None))
+    if method == 'getMultipleAccounts':
+        value = []
+        for key in params[0]:
+            data = chain.get(key)
+            if data is not None and data_slice:
+                data = data[data_slice['offset']:data_slice['offset'] + data_slice['length']]
+            value.append(None if data is None else account(data))
+    else:
+        value = account(chain[params[0]])
+    return {'jsonrpc': '2.0', 'id': request['id'], 'result': {'context': {'slot': 1}, 'value': value}}
+
+
+async def single(body) -> str:
+    return json.dumps(answer(body))
+
+
+async def batch(bodies) -> str:
+    return json.dumps([answer(body) for body in bodies])
+
+
+if __name__ == '__main__':
+    dex.lookup_table_provider.LOOKUP_TABLE_CACHE = 'lookup_tables_test'
+    cache_path = osp.join(temp_dir, 'lookup_tables_test.obj')
+    if osp.exists(cache_path):
+        os.remove(cache_path)
+
+    async def test():
+        for endpoint in connection._provider.endpoints:
+            endpoint.provider.make_request_unparsed = single
+            endpoint.provider.make_batch_request_unparsed = batch
+        await connection.initialize()
+        addresses = [Pubkey.new_unique() for _ in range(10)]
+        extended, closed = Pubkey.new_unique(), Pubkey.new_unique()
+        chain[INITIAL_LUT] = lut_data(5, addresses[:3])
+        chain[str(extended)] = lut_data(7, addresses[3:6])
+        chain[str(closed)] = lut_data(8, addresses[6:8])
+
+        provider = LookupTableProvider()
+        await provider.initialize()
+        # 后台获取不阻塞调用方，已缓存的路由表不重复获取
+        provider.prefetch([extended, closed, INITIAL_LUT])
+        await asyncio.sleep(0.1)
+        assert set(provider.lookup_tables) == {INITIAL_LUT, str(extended), str(closed)}
+        assert provider.compute_ideal_lookup_tables_for_addresses(addresses[3:6])[0].key == extended
+
+        # 刷新只读取 last_extended_slot；扩展的路由表重新获取，关闭的路由表移除
+        chain[str(extended)] = lut_data(9, addresses[3:9])
+        del chain[str(closed)]
+        calls.clear()
+        await provider.refresh()
+        assert calls[0] == ('getMultipleAccounts', True), calls
+        assert len(provider.lookup_tables[str(extended)].addresses) == 6
+        assert str(closed) not in provider.lookup_tables
+        assert [lut.key for lut in provider.compute_ideal_lookup_tables_for_addresses(addresses[6:9])] == [extended]
+        await provider.close()
+
+        # 关闭时保存，重启后从本地缓存加载，不再请求节点
+        loaded = LookupTableProvider()
+        loaded.load()
+        assert {key: len(lut.addresses) for key, lut in loaded.lookup_tables.items()} == \
+               {INITIAL_LUT: 3, str(extended): 6}
+        assert loaded._last_extended_slots == {INITIAL_LUT: 5, str(extended): 9}
+        calls.clear()
+        assert (await loaded.get_lookup_table(extended)).key == extended and calls == []
+
+        # 写入中途失败不破坏已有缓存，也不留下临时文件
+        try:
+            Cache('lookup_tables_test', {'broken': lambda: None}).write()
+            assert False, '不可序列化的对象应写入失败'
+        except Exception:
+            pass
+        assert Cache.read('lookup_tables_test').value.keys() == {INITIAL_LUT, str(extended)}
+        assert not [name for name in os.listdir(temp_dir) if name.endswith('.tmp')]
+        os.remove(cache_path)
+        print(f'缓存路由表 {len(loaded.lookup_tables)} 个')
+
+    asyncio.run(test())
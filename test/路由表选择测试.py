@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+@Description:
+@Date       : 2026/10/19 03:25
+@Author     : lkkings
+@FileName:  : 路由表选择测试.py
+@Github     : https://github.com/lkkings
+@Mail       : lkkings888@gmail.com
+-------------------------------------------------
+Change Log  :
+
+"""
+import random
+import time
+from typing import Dict, List, Set
+
+from solders.address_lookup_table_account import AddressLookupTableAccount
+from solders.instruction import Instruction, AccountMeta
+from solders.pubkey import Pubkey
+
+from dex.lookup_table_provider import LookupTableProvider, MIN_ADDRESSES_TO_INCLUDE_TABLE, MAX_TABLE_COUNT
+
+
+def previous_select(tables: Dict[str, Set[Pubkey]], addresses: List[Pubkey]) -> List[str]:
+    """
+    原实现：按包含的地址数一次性排序后依次选取，不随已覆盖的地址重新排序
+    """
+    remaining = {address for address in set(addresses) if any(address in table for table in tables.values())}
+    intersections = sorted(((lut_key, len(remaining & table)) for lut_key, table in tables.items()),
+                           key=lambda item: item[1], reverse=True)
+    selected = []
+    for lut_key, size in intersections:
+        if size < MIN_ADDRESSES_TO_INCLUDE_TABLE or len(selected) >= MAX_TABLE_COUNT or len(remaining) <= 1:
+            break
+        matches = remaining & tables[lut_key]
+        if len(matches) >= MIN_ADDRESSES_TO_INCLUDE_TABLE:
+            selected.append(lut_key)
+            remaining -= matches
+    return selected
+
+
+def covered(tables: List[Set[Pubkey]], addresses: List[Pubkey]) -> int:
+    return len(set(addresses).intersection(set().union(*tables)))
+
+
+def instruction(addresses: List[Pubkey], signers: Set[Pubkey] = frozenset()) -> Instruction:
+    return Instruction(Pubkey.new_unique(), b'', [AccountMeta(address, address in signers, True)
+                                                  for address in addresses])
+
+
+if __name__ == '__main__':
+    random.seed(1)
+    universe = [Pubkey.new_unique() for _ in range(3000)]
+    provider = LookupTableProvider()
+    tables: Dict[str, Set[Pubkey]] = {}
+    for _ in range(300):
+        lut_address = Pubkey.new_unique()
+        # 相邻的路由表大量重叠，先选中的表会让后面的表覆盖数下降
+        start = random.randrange(len(universe))
+        addresses = random.sample([universe[(start + i) % len(universe)] for i in range(120)], 64)
+        provider.update_cache(lut_address, AddressLookupTableAccount(lut_address, addresses))
+        tables[str(lut_address)] = set(addresses)
+
+    better = 0
+    start_time = time.time()
+    for case in range(300):
+        center = random.randrange(len(universe))
+        addresses = [universe[(center + random.randint(0, 200)) % len(universe)] for _ in range(30)] + \
+                    [Pubkey.new_unique() for _ in range(3)]
+        selected = provider.compute_ideal_lookup_tables_for_instructions([instruction(addresses)])
+        new_cover = covered([set(lut.addresses) for lut in selected], addresses)
+        old_cover = covered([tables[lut_key] for lut_key in previous_select(tables, addresses)], addresses)
+        # 选出的表数量不超过上限，每张表至少覆盖两个地址，覆盖数不少于原实现
+        assert len(selected) <= MAX_TABLE_COUNT
+        assert new_cover >= old_cover, (case, new_cover, old_cover)
+        better += new_cover > old_cover
+        assert provider.compute_ideal_lookup_tables_for_addresses(addresses) == selected
+    print(f'300 组账户覆盖数均不少于原实现，其中 {better} 组更多 耗时 {(time.time() - start_time) * 1000:.0f}ms')
+
+    # 签名账户不能通过路由表加载，不计入覆盖
+    lut_address = Pubkey.new_unique()
+    signer, first, second = Pubkey.new_unique(), Pubkey.new_unique(), Pubkey.new_unique()
+    provider.update_cache(lut_address, AddressLookupTableAccount(lut_address, [signer, first]))
+    assert provider.compute_ideal_lookup_tables_for_instructions([instruction([signer, first], {signer})]) == []
+    assert [lut.key for lut in provider.compute_ideal_lookup_tables_for_addresses([signer, first])] == [lut_address]
+
+    # 路由表扩展后缓存的选表结果失效；关闭的路由表不再被选中
+    provider.update_cache(lut_address, AddressLookupTableAccount(lut_address, [signer, first, second]))
+    selected = provider.compute_ideal_lookup_tables_for_instructions([instruction([signer, first, second], {signer})])
+    assert [lut.key for lut in selected] == [lut_address]
+    provider.remove_from_cache(str(lut_address))
+    assert provider.compute_ideal_lookup_tables_for_addresses([signer, first, second]) == []